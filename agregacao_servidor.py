@@ -0,0 +1,34 @@
+"""
+Modulação calculada direto do banco, sem o armazenamento local
+O servidor soma as usinas do recorte em cada instante (trafega uma linha por
+semi-hora e fonte, não uma por usina). No cliente as fontes passam pelo mesmo
+esquema compacto do armazenamento, pelo mesmo alinhamento e tratamento de
+outliers da análise principal e pelo motor de modulação, então o resultado é
+o mesmo de calcular_modulacao sobre a série completa gravada. A interpolação
+dos outliers não vai para o SQL: ela é feita pela posição na série combinada,
+que inclui instantes presentes só no outro banco
+"""
+import numpy as np
+
+from alinhamento import alinhar_fontes
+from armazenamento import de_colunar, para_colunar
+from fontes_dados import consultar_recorte
+from grade_temporal import media_nan
+from modulacao import calcular_modulacao, series_com_previsao
+from outliers import configurar_detectores, limiar_outlier, tratar_outliers_referencia
+
+def modulacao_do_servidor(backend, recorte, nomes_detectores=('limiar',), nivel='mes'):
+    """
+    Modulação média por hora de cada mês (nivel='mes') ou ano (nivel='ano')
+    do recorte, a partir das somas semi-horárias consultadas no banco e com a
+    referência tratada pelos detectores `nomes_detectores`
+    """
+    dfs = {nome_fonte: de_colunar(para_colunar(df)) for nome_fonte, df in consultar_recorte(backend, recorte).items()}
+    df = dfs['restricao_eolica']
+    if 'renovaveis' in dfs:
+        df = alinhar_fontes([df, dfs['renovaveis']])
+
+    media = media_nan(df['geracao_referencia_total'].to_numpy(dtype=np.float32), eixo=0)
+    detectores = configurar_detectores(nomes_detectores, limiar_outlier(recorte, media))
+    df = tratar_outliers_referencia(df, detectores)
+    return calcular_modulacao(df, nivel, series_com_previsao(recorte['coluna_previsao']))
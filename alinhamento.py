@@ -0,0 +1,132 @@
+"""
+Alinhamento e reamostragem de séries em qualquer resolução nativa
+As fontes podem chegar a 10 min (SCADA), 30 min ou de hora em hora. Cada
+uma é levada à grade alvo (30 min) por uma regra de agregação explícita
+quando é mais fina, ou repetida nas posições que cobre quando é mais grossa,
+e as fontes são juntas por junções as-of sobre os instantes em segundos
+(int64). Tudo parte de vetores já ordenados: a união dos instantes e as
+junções usam a ordenação estável do NumPy (timsort), que só intercala as
+sequências ordenadas, então o custo cresce linearmente com o número de
+linhas, mesmo com fontes de frequência mais alta
+"""
+import numpy as np
+import pandas as pd
+
+from grade_temporal import PASSO_SEGUNDOS, para_segundos
+
+# Regras de agregação aceitas na reamostragem (todas ignoram NaN)
+REGRAS_AGREGACAO = ('media', 'soma', 'minimo', 'maximo', 'primeiro', 'ultimo')
+
+# Potência (MW) de um intervalo mais longo é a média dos intervalos que ele contém
+REGRA_PADRAO = 'media'
+
+def resolucao_nativa(segundos):
+    """Passo mais frequente (segundos) entre instantes ordenados; 0 se não houver dois distintos"""
+    passos = np.diff(segundos)
+    passos = passos[passos > 0]
+    if len(passos) == 0:
+        return 0
+    valores, contagens = np.unique(passos, return_counts=True)
+    return int(valores[np.argmax(contagens)])
+
+def uniao_ordenada(*sequencias):
+    """União sem repetição de vetores int64 ordenados (intercalação linear)"""
+    todos = np.concatenate(sequencias)
+    todos = todos[np.argsort(todos, kind='stable')]
+    return todos[np.r_[True, todos[1:] != todos[:-1]]] if len(todos) else todos
+
+def juntar_asof(alvo, origem, tolerancia=0):
+    """
+    Para cada instante de `alvo` (ordenado), a posição do último instante de
+    `origem` (ordenado) que não o ultrapassa, a no máximo `tolerancia` segundos;
+    -1 onde não houver. Com tolerância 0 é a junção exata por instante
+    """
+    # Na ordenação estável, a origem vem antes do alvo quando os instantes empatam
+    ordem = np.argsort(np.r_[origem, alvo], kind='stable')
+    do_alvo = ordem >= len(origem)
+    ultima_origem = np.maximum.accumulate(np.where(do_alvo, -1, ordem))
+
+    posicoes = np.empty(len(alvo), dtype=np.int64)
+    posicoes[ordem[do_alvo] - len(origem)] = ultima_origem[do_alvo]
+    encontrados = posicoes >= 0
+    distancia = alvo[encontrados] - origem[posicoes[encontrados]]
+    posicoes[np.flatnonzero(encontrados)[distancia > tolerancia]] = -1
+    return posicoes
+
+def agregar_blocos(valores, inicios, regra):
+    """Agrega um vetor em blocos consecutivos (que começam em `inicios`) ignorando NaN"""
+    validos = ~np.isnan(valores)
+    contagens = np.add.reduceat(validos.astype(np.int64), inicios)
+    if regra in ('media', 'soma'):
+        somas = np.add.reduceat(np.where(validos, valores, 0.0).astype(np.float64), inicios)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resultado = somas / contagens if regra == 'media' else somas
+    elif regra == 'minimo':
+        resultado = np.fmin.reduceat(valores, inicios)
+    elif regra == 'maximo':
+        resultado = np.fmax.reduceat(valores, inicios)
+    elif regra in ('primeiro', 'ultimo'):
+        posicoes = np.arange(len(valores))
+        if regra == 'primeiro':
+            escolhida = np.minimum.reduceat(np.where(validos, posicoes, len(valores) - 1), inicios)
+        else:
+            escolhida = np.maximum.reduceat(np.where(validos, posicoes, 0), inicios)
+        resultado = valores[escolhida]
+    else:
+        raise ValueError(f"Regra de agregação desconhecida: {regra} (use {', '.join(REGRAS_AGREGACAO)})")
+    return np.where(contagens > 0, resultado, np.nan)
+
+def reamostrar(segundos, valores, passo=PASSO_SEGUNDOS, regras=None):
+    """
+    Leva uma série ordenada (segundos e dict coluna -> vetor) à grade de `passo`.
+    Cada instante da grade rotula o intervalo [t, t + passo). Série mais fina:
+    os registros de cada intervalo são agregados pela regra da coluna (padrão
+    'media'). Série mais grossa: cada registro é repetido nas posições da grade
+    que ele cobre. Já na resolução da grade: devolvida sem alteração.
+    Retorna (segundos, valores) na grade e a resolução nativa detectada
+    """
+    regras = regras or {}
+    resolucao = resolucao_nativa(segundos)
+    if resolucao == 0 or resolucao == passo:
+        return segundos, valores, resolucao
+
+    if resolucao < passo:
+        blocos = segundos // passo
+        inicios = np.flatnonzero(np.r_[True, blocos[1:] != blocos[:-1]])
+        valores = {coluna: agregar_blocos(vetor, inicios, regras.get(coluna, REGRA_PADRAO)).astype(vetor.dtype)
+                   for coluna, vetor in valores.items()}
+        return blocos[inicios] * passo, valores, resolucao
+
+    # Mais grossa: as posições cobertas por cada registro, via junção as-of
+    base = segundos // passo * passo
+    grade = uniao_ordenada(*(base + deslocamento for deslocamento in range(0, resolucao, passo)))
+    posicoes = juntar_asof(grade, segundos, tolerancia=resolucao - 1)
+    grade = grade[posicoes >= 0]
+    posicoes = posicoes[posicoes >= 0]
+    return grade, {coluna: vetor[posicoes] for coluna, vetor in valores.items()}, resolucao
+
+def alinhar_fontes(dfs, passo=PASSO_SEGUNDOS, regras=None, coluna_tempo='timestamp'):
+    """
+    Junta DataFrames ordenados por instante (um por fonte, em qualquer
+    resolução) numa tabela na grade de `passo`: a união dos instantes de
+    todas as fontes, com NaN onde uma fonte não tem valor. Para fontes já na
+    resolução da grade equivale a pd.merge(..., how='outer', sort=True)
+    """
+    reamostradas = []
+    for df in dfs:
+        colunas = [coluna for coluna in df.columns if coluna != coluna_tempo]
+        reamostradas.append(reamostrar(para_segundos(df[coluna_tempo].to_numpy()),
+                                       {coluna: df[coluna].to_numpy() for coluna in colunas}, passo, regras)[:2])
+
+    instantes = uniao_ordenada(*(segundos for segundos, _ in reamostradas))
+    tipo_tempo = dfs[0][coluna_tempo].to_numpy().dtype if dfs else np.dtype('datetime64[s]')
+    resultado = {coluna_tempo: instantes.astype('datetime64[s]').astype(tipo_tempo)}
+    for segundos, valores in reamostradas:
+        posicoes = juntar_asof(instantes, segundos)
+        encontrados = posicoes >= 0
+        for coluna, vetor in valores.items():
+            tipo = vetor.dtype if vetor.dtype.kind == 'f' else np.float64
+            alinhado = np.full(len(instantes), np.nan, dtype=tipo)
+            alinhado[encontrados] = vetor[posicoes[encontrados]]
+            resultado[coluna] = alinhado
+    return pd.DataFrame(resultado)
@@ -0,0 +1,159 @@
+"""
+Defasagem entre a previsão e a geração (real e de referência) por correlação
+cruzada via FFT sobre a grade densa de 30 min
+Cada mês vira uma linha de uma matriz meses × semi-horas (NaN nas lacunas) e
+todas as linhas, de todas as faixas horárias, são correlacionadas de uma vez
+com FFTs em lote. As lacunas entram como máscara: para cada defasagem a
+correlação de Pearson usa só os pares válidos (somas de pares, de x, de y,
+de x², de y² e de xy, cada uma uma correlação por FFT). Somando essas parcelas
+de todos os meses sai a curva do histórico inteiro.
+Defasagem positiva k: a geração em t + k se alinha à previsão em t, ou seja,
+a geração realizada vem depois da prevista (previsão adiantada)
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from grade_temporal import PASSO_SEGUNDOS, PONTOS_POR_DIA, criar_grade
+from modulacao import OBSERVADAS
+from processamento_particionado import iterar_particoes
+
+# Maior defasagem analisada, nos dois sentidos
+DEFASAGEM_MAXIMA_HORAS = 24
+
+# Faixas horárias (hora da previsão) analisadas além do dia inteiro
+FAIXAS_HORARIAS = {
+    'dia inteiro': (0, 24),
+    '00h-06h': (0, 6),
+    '06h-12h': (6, 12),
+    '12h-18h': (12, 18),
+    '18h-24h': (18, 24)
+}
+
+# Posições de um mês de 31 dias na grade
+PONTOS_POR_MES = 31 * PONTOS_POR_DIA
+
+def matrizes_mensais(dir_completos, colunas):
+    """
+    Lê a série completa partição a partição e monta, por coluna, a matriz
+    meses × 1488 semi-horas (a partir da meia-noite do dia 1, NaN no resto)
+    """
+    rotulos = []
+    linhas = {coluna: [] for coluna in colunas}
+    for ano, mes, df in iterar_particoes(dir_completos, colunas):
+        if len(df) == 0:
+            continue
+        grade = criar_grade(df, colunas)
+        deslocamento = (grade['inicio'] - int(pd.Timestamp(year=ano, month=mes, day=1).timestamp())) // PASSO_SEGUNDOS
+        for coluna in colunas:
+            linha = np.full(PONTOS_POR_MES, np.nan, dtype=np.float64)
+            linha[deslocamento:deslocamento + grade['n']] = grade['valores'][coluna]
+            linhas[coluna].append(linha)
+        rotulos.append(f"{ano}-{mes:02d}")
+    return rotulos, {coluna: np.array(linhas[coluna]).reshape(-1, PONTOS_POR_MES) for coluna in colunas}
+
+def parcelas_correlacao(x, y, mascara_x, defasagem_maxima):
+    """
+    Parcelas da correlação de Pearson mascarada para as defasagens
+    −L..L (último eixo), em lote sobre os eixos anteriores: contagem de pares
+    e somas de x, y, x², y² e xy. Vale c[k] = Σₜ a[t]·b[t + k]
+    """
+    validos_x = ~np.isnan(x) & mascara_x
+    validos_y = ~np.isnan(y)
+    x = np.where(validos_x, x, 0.0)
+    y = np.where(validos_y, y, 0.0)
+
+    n = x.shape[-1]
+    tamanho = 1 << int(np.ceil(np.log2(2 * n)))
+    espectros = {}
+
+    def espectro(nome, valores):
+        if nome not in espectros:
+            espectros[nome] = np.fft.rfft(valores, tamanho)
+        return espectros[nome]
+
+    def correlacionar(nome_a, a, nome_b, b):
+        c = np.fft.irfft(np.conj(espectro(nome_a, a)) * espectro(nome_b, b), tamanho)
+        return np.concatenate([c[..., -defasagem_maxima:], c[..., :defasagem_maxima + 1]], axis=-1)
+
+    mx, my = validos_x.astype(np.float64), validos_y.astype(np.float64)
+    return {
+        'n': np.rint(correlacionar('mx', mx, 'my', my)),
+        'x': correlacionar('x', x, 'my', my),
+        'y': correlacionar('mx', mx, 'y', y),
+        'xx': correlacionar('xx', x ** 2, 'my', my),
+        'yy': correlacionar('mx', mx, 'yy', y ** 2),
+        'xy': correlacionar('x', x, 'y', y)
+    }
+
+def correlacao(parcelas, minimo_pares=PONTOS_POR_DIA):
+    """Correlação de Pearson de cada defasagem (NaN com menos de `minimo_pares` pares)"""
+    n = parcelas['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariancia = parcelas['xy'] - parcelas['x'] * parcelas['y'] / n
+        variancia_x = parcelas['xx'] - parcelas['x'] ** 2 / n
+        variancia_y = parcelas['yy'] - parcelas['y'] ** 2 / n
+        r = covariancia / np.sqrt(variancia_x * variancia_y)
+    return np.where((n >= minimo_pares) & (variancia_x > 0) & (variancia_y > 0), r, np.nan)
+
+def analisar_defasagem(dir_completos, coluna_previsao, defasagem_maxima_horas=DEFASAGEM_MAXIMA_HORAS):
+    """
+    Curvas de correlação previsão × geração por par, período (cada mês e
+    'todos') e faixa horária. Retorna (resumo, curvas): o resumo tem a melhor
+    defasagem (h), a correlação nela e sem defasagem; as curvas, a correlação
+    de cada defasagem
+    """
+    colunas = [coluna_previsao] + list(OBSERVADAS.values())
+    rotulos, matrizes = matrizes_mensais(dir_completos, colunas)
+    if not rotulos:
+        return pd.DataFrame(), pd.DataFrame()
+
+    defasagem_maxima = int(defasagem_maxima_horas * 3600 // PASSO_SEGUNDOS)
+    defasagens_h = np.arange(-defasagem_maxima, defasagem_maxima + 1) * PASSO_SEGUNDOS / 3600
+    horas = np.arange(PONTOS_POR_MES) % PONTOS_POR_DIA * PASSO_SEGUNDOS // 3600
+    mascaras = np.array([(horas >= inicio) & (horas < fim) for inicio, fim in FAIXAS_HORARIAS.values()])
+
+    # Centradas pela média global (uma só constante): a soma das parcelas dos meses continua exata
+    previsao = matrizes[coluna_previsao] - np.nanmean(matrizes[coluna_previsao])
+    resumo, curvas = [], []
+    for par, coluna in OBSERVADAS.items():
+        observado = matrizes[coluna] - np.nanmean(matrizes[coluna])
+        # Lote faixas × meses × semi-horas
+        parcelas = parcelas_correlacao(previsao[None], observado[None], mascaras[:, None, :], defasagem_maxima)
+        por_mes = correlacao(parcelas)
+        historico = correlacao({chave: valores.sum(axis=1) for chave, valores in parcelas.items()})
+        for i_faixa, faixa in enumerate(FAIXAS_HORARIAS):
+            periodos = [('todos', historico[i_faixa])] + list(zip(rotulos, por_mes[i_faixa]))
+            for periodo, r in periodos:
+                curvas.append(pd.DataFrame({'par': par, 'periodo': periodo, 'faixa': faixa,
+                                            'defasagem_h': defasagens_h, 'correlacao': r}))
+                if np.isfinite(r).any():
+                    melhor = np.nanargmax(r)
+                    resumo.append([par, periodo, faixa, defasagens_h[melhor], r[melhor], r[defasagem_maxima]])
+
+    resumo = pd.DataFrame(resumo, columns=['par', 'periodo', 'faixa', 'melhor_defasagem_h',
+                                           'correlacao_maxima', 'correlacao_sem_defasagem'])
+    return resumo, pd.concat(curvas, ignore_index=True)
+
+def grafico_defasagem(curvas, coluna_previsao, arquivo, titulo_base=''):
+    """Curvas de correlação do histórico inteiro (dia inteiro e por faixa horária) de cada par"""
+    fig, eixos = plt.subplots(1, len(OBSERVADAS), figsize=(16, 6), sharey=True)
+    for ax, par in zip(np.atleast_1d(eixos), OBSERVADAS):
+        for faixa in FAIXAS_HORARIAS:
+            curva = curvas[(curvas['par'] == par) & (curvas['periodo'] == 'todos') & (curvas['faixa'] == faixa)]
+            destaque = faixa == 'dia inteiro'
+            ax.plot(curva['defasagem_h'], curva['correlacao'], label=faixa,
+                    linewidth=2.5 if destaque else 1.2, color='black' if destaque else None,
+                    alpha=1.0 if destaque else 0.8)
+        ax.axvline(0, color='gray', linestyle='--', linewidth=1)
+        ax.set_title(f"{coluna_previsao} × {OBSERVADAS[par]}", fontsize=12, fontweight='bold')
+        ax.set_xlabel('Defasagem (h) - positiva: geração depois da previsão', fontsize=10)
+        ax.grid(True, alpha=0.3)
+        ax.set_xlim(-DEFASAGEM_MAXIMA_HORAS, DEFASAGEM_MAXIMA_HORAS)
+    np.atleast_1d(eixos)[0].set_ylabel('Correlação', fontsize=11, fontweight='bold')
+    np.atleast_1d(eixos)[0].legend(fontsize=9, loc='lower left')
+    fig.suptitle(f"{titulo_base}Correlação cruzada previsão × geração (histórico inteiro)",
+                 fontsize=14, fontweight='bold')
+    plt.tight_layout()
+    plt.savefig(arquivo, dpi=150, bbox_inches='tight')
+    plt.close()
@@ -0,0 +1,414 @@
+"""
+Armazenamento colunar particionado (Parquet) dos dados da análise
+Cada dataset é um diretório particionado por ano/mês (ano=AAAA/mes=MM),
+com o instante em int64 (segundos desde a época) e os valores em float32
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Diretório raiz dos datasets
+DIR_DADOS = 'resultados/dados'
+
+# Versão do esquema gravado; mudá-la invalida os caches existentes
+VERSAO_ESQUEMA = 1
+
+# Arquivo de manifesto de cada dataset
+ARQUIVO_MANIFESTO = '_manifesto.json'
+
+# Arquivo de progresso de uma extração em andamento (removido ao concluir)
+ARQUIVO_PROGRESSO = '_progresso.json'
+
+# Esquema das partições (ano=AAAA/mes=MM)
+PARTICIONAMENTO = ds.partitioning(
+    pa.schema([('ano', pa.int32()), ('mes', pa.int32())]),
+    flavor='hive'
+)
+
+def caminho_dataset(nome, dir_dados=DIR_DADOS):
+    """Diretório de um dataset"""
+    return f"{dir_dados}/{nome}"
+
+def caminho_particao(diretorio, ano, mes):
+    """Arquivo Parquet de uma partição ano/mês"""
+    return f"{diretorio}/ano={ano}/mes={mes:02d}/parte.parquet"
+
+def para_colunar(df):
+    """
+    Converte o DataFrame para o esquema do armazenamento:
+    timestamp em int64 (segundos) e valores em float32
+    """
+    colunar = pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    })
+    for coluna in df.columns:
+        if coluna != 'timestamp':
+            colunar[coluna] = df[coluna].to_numpy(dtype=np.float32)
+    return colunar
+
+def de_colunar(df):
+    """Converte o timestamp int64 de volta para datetime64"""
+    df['timestamp'] = pd.to_datetime(df['timestamp'].to_numpy(), unit='s')
+    return df
+
+def gravar_particoes(df, diretorio, mesclar=True):
+    """
+    Grava o DataFrame (coluna 'timestamp' + valores) nas partições ano/mês.
+    Com `mesclar`, as linhas são combinadas com as já existentes na partição
+    (a versão nova de cada instante prevalece); senão a partição é substituída.
+    Partições cujo conteúdo não muda não são regravadas (mantêm o arquivo e o checksum).
+    Retorna quantos instantes repetidos no próprio DataFrame foram descartados
+    """
+    if len(df) == 0:
+        return 0
+
+    colunar = para_colunar(df)
+    duplicados = int(colunar['timestamp'].duplicated().sum())
+    instantes = pd.to_datetime(colunar['timestamp'].to_numpy(), unit='s')
+    chaves = instantes.year * 100 + instantes.month
+
+    for chave in np.unique(chaves):
+        ano, mes = divmod(int(chave), 100)
+        parte = colunar[chaves == chave]
+        arquivo = caminho_particao(diretorio, ano, mes)
+
+        if mesclar and os.path.exists(arquivo):
+            existente = pq.read_table(arquivo).to_pandas()
+            parte = pd.concat([existente, parte], ignore_index=True)
+
+        parte = parte.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+
+        conteudo = pa.BufferOutputStream()
+        pq.write_table(pa.Table.from_pandas(parte, preserve_index=False), conteudo)
+        conteudo = conteudo.getvalue().to_pybytes()
+        if mesmo_conteudo(arquivo, conteudo):
+            continue
+        gravar_atomico(arquivo, lambda destino: gravar_bytes(destino, conteudo))
+    return duplicados
+
+def mesmo_conteudo(arquivo, conteudo):
+    """Se o arquivo existe e tem exatamente estes bytes"""
+    if not os.path.exists(arquivo) or os.path.getsize(arquivo) != len(conteudo):
+        return False
+    with open(arquivo, 'rb') as f:
+        return f.read() == conteudo
+
+def gravar_bytes(arquivo, conteudo):
+    """Grava bytes em um arquivo"""
+    with open(arquivo, 'wb') as f:
+        f.write(conteudo)
+
+def gravar_atomico(arquivo, escrever):
+    """
+    Grava em um arquivo temporário e renomeia para o destino, para que uma
+    interrupção no meio da escrita nunca deixe um arquivo pela metade
+    """
+    diretorio, nome = os.path.split(arquivo)
+    os.makedirs(diretorio or '.', exist_ok=True)
+    # Prefixo '.' para que o leitor de datasets ignore temporários órfãos
+    temporario = os.path.join(diretorio, f".{nome}.tmp-{os.getpid()}")
+    try:
+        escrever(temporario)
+        os.replace(temporario, arquivo)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def gravar_json_atomico(arquivo, dados):
+    """Grava um JSON de forma atômica"""
+    def escrever(destino):
+        with open(destino, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, indent=2, ensure_ascii=False)
+    gravar_atomico(arquivo, escrever)
+
+def remover_dataset(diretorio):
+    """Apaga todas as partições de um dataset"""
+    if os.path.exists(diretorio):
+        shutil.rmtree(diretorio)
+
+def remover_particoes(diretorio, manter):
+    """Apaga as partições que não estão em `manter` ({(ano, mes)}); retorna as removidas"""
+    removidas = [particao for particao in listar_particoes(diretorio) if particao not in manter]
+    for ano, mes in removidas:
+        dir_ano = f"{diretorio}/ano={ano}"
+        shutil.rmtree(f"{dir_ano}/mes={mes:02d}")
+        if not os.listdir(dir_ano):
+            os.rmdir(dir_ano)
+    return removidas
+
+def listar_particoes(diretorio):
+    """Lista (ano, mes) das partições existentes, em ordem cronológica"""
+    if not os.path.isdir(diretorio):
+        return []
+
+    particoes = []
+    for dir_ano in os.listdir(diretorio):
+        if not dir_ano.startswith('ano='):
+            continue
+        for dir_mes in os.listdir(f"{diretorio}/{dir_ano}"):
+            if not dir_mes.startswith('mes='):
+                continue
+            ano, mes = int(dir_ano[4:]), int(dir_mes[4:])
+            if os.path.exists(caminho_particao(diretorio, ano, mes)):
+                particoes.append((ano, mes))
+    return sorted(particoes)
+
+def ler_dataset(diretorio, colunas=None, inicio=None, fim=None):
+    """
+    Lê um dataset como DataFrame com 'timestamp' em datetime64.
+    `colunas` restringe as colunas lidas (projeção); `inicio`/`fim` restringem
+    o intervalo [inicio, fim) e só as partições correspondentes são abertas
+    """
+    dataset = ds.dataset(diretorio, format='parquet', partitioning=PARTICIONAMENTO)
+
+    filtro = None
+    if inicio is not None:
+        inicio = pd.Timestamp(inicio)
+        filtro = (ds.field('ano') * 100 + ds.field('mes') >= inicio.year * 100 + inicio.month) & \
+                 (ds.field('timestamp') >= int(inicio.timestamp()))
+    if fim is not None:
+        fim = pd.Timestamp(fim)
+        filtro_fim = (ds.field('ano') * 100 + ds.field('mes') <= fim.year * 100 + fim.month) & \
+                     (ds.field('timestamp') < int(fim.timestamp()))
+        filtro = filtro_fim if filtro is None else filtro & filtro_fim
+
+    if colunas is not None:
+        colunas = ['timestamp'] + [coluna for coluna in colunas if coluna != 'timestamp']
+    else:
+        colunas = [coluna for coluna in dataset.schema.names if coluna not in ('ano', 'mes')]
+
+    tabela = dataset.to_table(columns=colunas, filter=filtro)
+    df = tabela.to_pandas().sort_values('timestamp', kind='stable').reset_index(drop=True)
+    return de_colunar(df)
+
+def ler_particao(diretorio, ano, mes, colunas=None):
+    """
+    Lê uma única partição (ano/mês) como DataFrame com 'timestamp' em datetime64.
+    Partição inexistente resulta em DataFrame vazio
+    """
+    arquivo = caminho_particao(diretorio, ano, mes)
+    if colunas is not None:
+        colunas = ['timestamp'] + [coluna for coluna in colunas if coluna != 'timestamp']
+    if not os.path.exists(arquivo):
+        return de_colunar(pd.DataFrame({coluna: pd.Series(dtype=np.int64 if coluna == 'timestamp' else np.float32)
+                                        for coluna in (colunas or ['timestamp'])}))
+    df = pq.read_table(arquivo, columns=colunas).to_pandas()
+    return de_colunar(df.sort_values('timestamp', kind='stable').reset_index(drop=True))
+
+def ultimo_instante(diretorio):
+    """Último instante gravado no dataset (lê só a última partição)"""
+    particoes = listar_particoes(diretorio)
+    if not particoes:
+        return None
+    ano, mes = particoes[-1]
+    instantes = pq.read_table(caminho_particao(diretorio, ano, mes), columns=['timestamp'])
+    return pd.to_datetime(int(pc.max(instantes['timestamp']).as_py()), unit='s')
+
+def hash_texto(*partes):
+    """Hash sha256 de textos (consultas SQL, listas de colunas), ignorando espaços extras"""
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(' '.join(str(parte).split()).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def hash_arquivo(arquivo):
+    """Hash sha256 do conteúdo de um arquivo"""
+    h = hashlib.sha256()
+    with open(arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def ler_manifesto(diretorio):
+    """Lê o manifesto do dataset (None se não existir ou estiver ilegível)"""
+    arquivo = f"{diretorio}/{ARQUIVO_MANIFESTO}"
+    if not os.path.exists(arquivo):
+        return None
+    try:
+        with open(arquivo, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def checksums_particoes(diretorio):
+    """Checksum de cada partição registrado no manifesto: {'AAAA-MM': sha256} (vazio sem manifesto)"""
+    return {particao: dados['sha256']
+            for particao, dados in (ler_manifesto(diretorio) or {}).get('particoes', {}).items()}
+
+def atualizar_por_particao(arquivo, chave, versao, parametros, checksums, resumir, ler, tabelar):
+    """
+    Resumos por partição guardados em Parquet, com a versão do formato, os
+    `parametros` ({nome: valor} que definem o resumo) e o checksum de cada
+    partição nos metadados `chave` do esquema. Reaproveita os resumos das
+    partições de `checksums` ({partição: sha256}) com o mesmo checksum, refaz
+    só os das novas ou alteradas com `resumir(particao)` e grava de forma
+    atômica se algo mudou. `ler(tabela, particoes)` devolve {partição: resumo}
+    de cada partição registrada (também das que não têm linhas na tabela) e
+    `tabelar(resumos)` monta a tabela a gravar.
+    Retorna ({partição: resumo} em ordem, número de partições refeitas)
+    """
+    anteriores, gravados = {}, {}
+    if os.path.exists(arquivo):
+        tabela = pq.read_table(arquivo)
+        metadados = json.loads((tabela.schema.metadata or {}).get(chave.encode('utf-8'), b'{}'))
+        if metadados.get('versao') == versao and all(metadados.get(nome) == valor
+                                                     for nome, valor in parametros.items()):
+            gravados = metadados['particoes']
+            anteriores = ler(tabela, sorted(gravados))
+
+    resumos = {}
+    refeitas = 0
+    for particao, checksum in sorted(checksums.items()):
+        if gravados.get(particao) == checksum:
+            resumos[particao] = anteriores[particao]
+        else:
+            resumos[particao] = resumir(particao)
+            refeitas += 1
+
+    if refeitas or set(resumos) != set(gravados):
+        metadados = {'versao': versao, **parametros,
+                     'particoes': {particao: checksums[particao] for particao in resumos}}
+        tabela = tabelar(resumos).replace_schema_metadata({chave: json.dumps(metadados)})
+        gravar_atomico(arquivo, lambda destino: pq.write_table(tabela, destino))
+    return resumos, refeitas
+
+def invalidar_manifesto(diretorio):
+    """Remove o manifesto; o dataset passa a ser considerado inválido"""
+    arquivo = f"{diretorio}/{ARQUIVO_MANIFESTO}"
+    if os.path.exists(arquivo):
+        os.remove(arquivo)
+
+def atualizar_manifesto(diretorio, hash_consulta):
+    """
+    Grava o manifesto do dataset: versão do esquema, hash da consulta de origem,
+    colunas, intervalo coberto, número de linhas e checksum de cada partição
+    """
+    particoes = {}
+    total_linhas = 0
+    for ano, mes in listar_particoes(diretorio):
+        arquivo = caminho_particao(diretorio, ano, mes)
+        linhas = pq.ParquetFile(arquivo).metadata.num_rows
+        particoes[f"{ano}-{mes:02d}"] = {'linhas': linhas, 'sha256': hash_arquivo(arquivo)}
+        total_linhas += linhas
+
+    inicio = fim = None
+    colunas = {}
+    if particoes:
+        ano, mes = listar_particoes(diretorio)[0]
+        primeira = pq.read_table(caminho_particao(diretorio, ano, mes))
+        inicio = pd.to_datetime(int(pc.min(primeira['timestamp']).as_py()), unit='s')
+        fim = ultimo_instante(diretorio)
+        colunas = {campo.name: str(campo.type) for campo in primeira.schema}
+
+    manifesto = {
+        'versao_esquema': VERSAO_ESQUEMA,
+        'hash_consulta': hash_consulta,
+        'colunas': colunas,
+        'inicio': inicio.strftime('%Y-%m-%d %H:%M:%S') if inicio is not None else None,
+        'fim': fim.strftime('%Y-%m-%d %H:%M:%S') if fim is not None else None,
+        'linhas': total_linhas,
+        'particoes': particoes,
+        'checksum': hash_texto(*(f"{chave}:{info['sha256']}" for chave, info in particoes.items())),
+        'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    gravar_json_atomico(f"{diretorio}/{ARQUIVO_MANIFESTO}", manifesto)
+    return manifesto
+
+def ler_progresso(diretorio):
+    """Lê o progresso da extração interrompida do dataset (None se não houver)"""
+    arquivo = f"{diretorio}/{ARQUIVO_PROGRESSO}"
+    if not os.path.exists(arquivo):
+        return None
+    try:
+        with open(arquivo, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def registrar_progresso(diretorio, hash_consulta, modo, inicio, concluido_ate, fatias_concluidas):
+    """
+    Registra até onde a extração já foi gravada. As fatias são gravadas em ordem
+    cronológica, então tudo antes de `concluido_ate` está no armazenamento
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    gravar_json_atomico(f"{diretorio}/{ARQUIVO_PROGRESSO}", {
+        'hash_consulta': hash_consulta,
+        'modo': modo,
+        'inicio': inicio.strftime('%Y-%m-%d %H:%M:%S'),
+        'concluido_ate': concluido_ate.strftime('%Y-%m-%d %H:%M:%S'),
+        'fatias_concluidas': fatias_concluidas,
+        'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+def remover_progresso(diretorio):
+    """Remove o progresso ao fim de uma extração completa"""
+    arquivo = f"{diretorio}/{ARQUIVO_PROGRESSO}"
+    if os.path.exists(arquivo):
+        os.remove(arquivo)
+
+def verificar_dataset(diretorio, hash_consulta=None, colunas=None):
+    """
+    Confere o dataset contra o manifesto. Retorna None se estiver íntegro,
+    ou o motivo pelo qual não pode ser usado
+    """
+    manifesto = ler_manifesto(diretorio)
+    if manifesto is None:
+        return 'sem manifesto'
+    if manifesto.get('versao_esquema') != VERSAO_ESQUEMA:
+        return f"versão de esquema {manifesto.get('versao_esquema')} (atual: {VERSAO_ESQUEMA})"
+    if hash_consulta is not None and manifesto.get('hash_consulta') != hash_consulta:
+        return 'consulta de origem alterada'
+    if colunas is not None and set(colunas) - set(manifesto.get('colunas', {})):
+        return f"colunas ausentes: {sorted(set(colunas) - set(manifesto.get('colunas', {})))}"
+
+    particoes = {f"{ano}-{mes:02d}": (ano, mes) for ano, mes in listar_particoes(diretorio)}
+    if set(particoes) != set(manifesto.get('particoes', {})):
+        return 'partições diferentes das registradas'
+    for chave, (ano, mes) in particoes.items():
+        if hash_arquivo(caminho_particao(diretorio, ano, mes)) != manifesto['particoes'][chave]['sha256']:
+            return f"checksum divergente na partição {chave}"
+    return None
+
+def avaliar_cache(diretorio, hash_consulta, validade_horas):
+    """
+    Decide o que fazer com o cache de uma fonte:
+    'reconstruir' se estiver ausente, corrompido ou com esquema/consulta diferentes,
+    'incremental' se estiver íntegro mas mais antigo que `validade_horas`,
+    'reutilizar' caso contrário. Uma extração interrompida da mesma consulta
+    tem precedência: 'retomar' a partir da última fatia concluída.
+    Retorna (decisão, motivo)
+    """
+    progresso = ler_progresso(diretorio)
+    if progresso is not None and progresso.get('hash_consulta') == hash_consulta:
+        return 'retomar', f"extração interrompida, concluída até {progresso['concluido_ate']}"
+
+    motivo = verificar_dataset(diretorio, hash_consulta)
+    if motivo is not None:
+        return 'reconstruir', motivo
+
+    manifesto = ler_manifesto(diretorio)
+    idade = datetime.now() - datetime.strptime(manifesto['atualizado_em'], '%Y-%m-%d %H:%M:%S')
+    idade_horas = idade.total_seconds() / 3600
+    if idade_horas > validade_horas:
+        return 'incremental', f"atualizado há {idade_horas:.1f} h"
+    return 'reutilizar', f"atualizado há {idade_horas:.1f} h"
+
+def exigir_dataset(diretorio, colunas):
+    """
+    Garante que o dataset está íntegro e tem as colunas esperadas antes de
+    ser lido por outro script; caso contrário interrompe com mensagem clara
+    """
+    motivo = verificar_dataset(diretorio, colunas=colunas)
+    if motivo is not None:
+        raise SystemExit(f"Dataset {diretorio} inválido ({motivo}). "
+                         "Execute comparacao_eolica_ne.py para regenerá-lo.")
@@ -2,19 +2,33 @@
 Script para comparar o mesmo mês entre diferentes anos
 Gera gráficos de modulação e tabelas comparativas
 """
+import argparse
 import os
-import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
-print("="*80)
-print("COMPARAÇÃO ENTRE ANOS - MESMO MÊS")
-print("="*80)
-
-# Carregar dados
-print("\nCarregando dados...")
-df_ne = pd.read_csv('resultados/dados_completos.csv')
-df_ne['timestamp'] = pd.to_datetime(df_ne['timestamp'])
+from agregacao_servidor import modulacao_do_servidor
+from armazenamento import caminho_dataset, exigir_dataset, ler_dataset
+from fontes_dados import (AGRUPAMENTOS, DIR_SQLITE_PADRAO, SUBSISTEMA_PADRAO, SUBSISTEMAS, criar_backend,
+                          criar_recorte, diretorio_saida)
+from grade_temporal import criar_grade, fatia_mes, instantes, meses
+from indice_prefixos import modulacao_mensal, obter_indice_prefixos
+from modelos_graficos import DATA_PROVISORIA, atualizar_linhas, criar_figura, obter_modelo, reescalar, salvar_modelo
+from modulacao import N_HORAS, modulacao_diaria, series_com_previsao
+from outliers import DETECTORES
+from processamento_particionado import iterar_particoes
+from quantis import atualizar_digests, envelopes_mensais
+from renderizacao import ARQUIVO_REGISTRO, agendar, concluir, criar_agendador
+from tabelas_svg import gravar_tabela_svg
+from utilitarios import relatar_memoria
+
+# Cor de cada ano nos gráficos de comparação
+CORES_ANOS = {
+    2021: '#FF6B6B',
+    2022: '#4ECDC4',
+    2023: '#45B7D1',
+    2024: '#FFA07A',
+    2025: '#98D8C8'
+}
 
 MESES_NOMES = {
     1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
@@ -22,138 +36,34 @@ MESES_NOMES = {
     9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
 }
 
-def calcular_modulacao(df, tem_previsao=True):
-    """Calcula modulação para cada ano-mês"""
-    df['ano'] = df['timestamp'].dt.year
-    df['mes'] = df['timestamp'].dt.month
-    df['hora'] = df['timestamp'].dt.hour
-    df['minuto'] = df['timestamp'].dt.minute
-    df['hora_decimal'] = df['hora'] + df['minuto'] / 60.0
-    df['data'] = df['timestamp'].dt.date
-
-    # Calcular médias diárias
-    if tem_previsao:
-        cols_geracao = ['geracao_total', 'geracao_referencia_total', 'NE_UEE']
-        medias_diarias = df.groupby(['ano', 'mes', 'data']).agg({
-            'geracao_total': 'mean',
-            'geracao_referencia_total': 'mean',
-            'NE_UEE': 'mean'
-        }).reset_index()
-        medias_diarias.columns = ['ano', 'mes', 'data', 'media_dia_real', 'media_dia_ref', 'media_dia_prev']
-    else:
-        cols_geracao = ['geracao', 'geracao_referencia']
-        medias_diarias = df.groupby(['ano', 'mes', 'data']).agg({
-            'geracao': 'mean',
-            'geracao_referencia': 'mean'
-        }).reset_index()
-        medias_diarias.columns = ['ano', 'mes', 'data', 'media_dia_real', 'media_dia_ref']
-
-    # Merge
-    df = df.merge(medias_diarias, on=['ano', 'mes', 'data'], how='left')
-
-    # Calcular percentual
-    if tem_previsao:
-        df['pct_real'] = (df['geracao_total'] / df['media_dia_real']) * 100
-        df['pct_ref'] = (df['geracao_referencia_total'] / df['media_dia_ref']) * 100
-        df['pct_prev'] = (df['NE_UEE'] / df['media_dia_prev']) * 100
-    else:
-        df['pct_real'] = (df['geracao'] / df['media_dia_real']) * 100
-        df['pct_ref'] = (df['geracao_referencia'] / df['media_dia_ref']) * 100
-
-    # Arredondar hora
-    df['hora_int'] = df['hora_decimal'].round().astype(int)
-
-    # Calcular média por ano-mês-hora
-    if tem_previsao:
-        resultado = df.groupby(['ano', 'mes', 'hora_int']).agg({
-            'pct_real': 'mean',
-            'pct_ref': 'mean',
-            'pct_prev': 'mean'
-        }).reset_index()
-    else:
-        resultado = df.groupby(['ano', 'mes', 'hora_int']).agg({
-            'pct_real': 'mean',
-            'pct_ref': 'mean'
-        }).reset_index()
-
-    return resultado
-
-
-def calcular_modulacao_diaria_mes(df_mes):
-    """Calcula modulação diária para preservar série temporal do mês."""
-    df_mes = df_mes.copy().sort_values('timestamp')
-
-    df_mes['hora'] = df_mes['timestamp'].dt.hour
-    df_mes['minuto'] = df_mes['timestamp'].dt.minute
-    df_mes['hora_decimal'] = df_mes['hora'] + df_mes['minuto'] / 60.0
-    df_mes['data'] = df_mes['timestamp'].dt.date
-
-    agregacoes = {
-        'geracao_total': 'mean',
-        'geracao_referencia_total': 'mean'
-    }
-    tem_previsao = 'NE_UEE' in df_mes.columns and df_mes['NE_UEE'].notna().any()
-    if tem_previsao:
-        agregacoes['NE_UEE'] = 'mean'
-
-    medias_diarias = df_mes.groupby('data').agg(agregacoes).reset_index()
-    renomear = {
-        'geracao_total': 'media_dia_real',
-        'geracao_referencia_total': 'media_dia_ref'
-    }
-    if tem_previsao:
-        renomear['NE_UEE'] = 'media_dia_prev'
-    medias_diarias = medias_diarias.rename(columns=renomear)
-
-    df_mes = df_mes.merge(medias_diarias, on='data', how='left')
-
-    df_mes['pct_real'] = np.where(
-        df_mes['media_dia_real'] != 0,
-        (df_mes['geracao_total'] / df_mes['media_dia_real']) * 100,
-        np.nan
-    )
-    df_mes['pct_ref'] = np.where(
-        df_mes['media_dia_ref'] != 0,
-        (df_mes['geracao_referencia_total'] / df_mes['media_dia_ref']) * 100,
-        np.nan
-    )
-
-    if tem_previsao:
-        df_mes['pct_prev'] = np.where(
-            df_mes['media_dia_prev'] != 0,
-            (df_mes['NE_UEE'] / df_mes['media_dia_prev']) * 100,
-            np.nan
-        )
-
-    return df_mes
-
-
-def criar_modulacao_por_ano_uniforme(df, output_dir):
-    """Gera gráficos de modulação por ano com escala uniforme por mês."""
+def modulacao_do_mes(grade, fatia, series):
+    """Modulação de um mês; a previsão é omitida se não houver nenhum valor"""
+    modulacao = modulacao_diaria(grade, fatia, series)
+    if 'pct_prev' in modulacao and not np.isfinite(modulacao['pct_prev']).any():
+        del modulacao['pct_prev']
+    return modulacao
+
+def criar_modulacao_por_ano_uniforme(meses_da_grade, output_dir, agendador=None, coluna_previsao='NE_UEE'):
+    """
+    Gera gráficos de modulação por ano com escala uniforme por mês.
+    `meses_da_grade()` gera (ano, mes, grade, fatia) de cada mês; é percorrido
+    duas vezes (escala de cada mês, depois os gráficos), sem guardar os meses.
+    Cada gráfico é uma tarefa do `agendador` (serial se não for informado).
+    Sem `coluna_previsao`, só real e referência
+    """
     print("\nGerando modulação por ano com escala uniforme...")
 
     os.makedirs(output_dir, exist_ok=True)
+    series = series_com_previsao(coluna_previsao)
 
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['ano'] = df['timestamp'].dt.year
-    df['mes'] = df['timestamp'].dt.month
-
-    modulacoes_por_periodo = {}
     limites_por_mes = {}
 
-    for (ano, mes), df_periodo in df.groupby(['ano', 'mes']):
-        if df_periodo.empty:
+    for ano, mes, grade, fatia in meses_da_grade():
+        if not grade['presente'][fatia].any():
             continue
 
-        df_modulacao = calcular_modulacao_diaria_mes(df_periodo)
-        modulacoes_por_periodo[(ano, mes)] = df_modulacao
-
-        colunas_pct = ['pct_real', 'pct_ref']
-        if 'pct_prev' in df_modulacao.columns:
-            colunas_pct.append('pct_prev')
-
-        valores_pct = df_modulacao[colunas_pct].to_numpy().flatten()
+        modulacao = modulacao_do_mes(grade, fatia, series)
+        valores_pct = np.concatenate([pct.ravel() for pct in modulacao.values()])
         valores_pct = valores_pct[np.isfinite(valores_pct)]
         max_pct = valores_pct.max() if valores_pct.size else 0
 
@@ -166,326 +76,322 @@ def criar_modulacao_por_ano_uniforme(df, output_dir):
 
     arquivos_gerados = 0
     meses_com_registro = set()
+    if agendador is None:
+        agendador = criar_agendador()
 
-    for (ano, mes), df_modulacao in modulacoes_por_periodo.items():
-        meses_com_registro.add(mes)
-        y_max = limites_por_mes.get(mes, 120)
-
-        fig, ax = plt.subplots(figsize=(14, 8))
-
-        ax.plot(df_modulacao['timestamp'], df_modulacao['pct_real'],
-                label='Geração Real', color='#2196F3', linewidth=1.5, alpha=0.8)
-        ax.plot(df_modulacao['timestamp'], df_modulacao['pct_ref'],
-                label='Geração Referência', color='#FF9800', linewidth=1.5, alpha=0.8)
-
-        if 'pct_prev' in df_modulacao.columns:
-            ax.plot(df_modulacao['timestamp'], df_modulacao['pct_prev'],
-                    label='Previsão NE_UEE', color='#4CAF50', linewidth=2, alpha=0.9)
-
-        ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7,
-                   label='Média Diária (100%)')
-
-        ax.set_xlabel('Data', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração (% da Média Diária)', fontsize=12, fontweight='bold')
-        ax.set_title(
-            f"Modulação Diária - {ano}-{mes:02d} ({MESES_NOMES.get(mes, mes)})",
-            fontsize=16, fontweight='bold', pad=20
-        )
-        ax.legend(fontsize=11, loc='upper left')
-        ax.grid(True, alpha=0.3)
-        ax.set_ylim(0, y_max)
-        ax.set_xlim(df_modulacao['timestamp'].min(), df_modulacao['timestamp'].max())
-        plt.xticks(rotation=45)
-
-        plt.tight_layout()
-
-        filename = f"{output_dir}/{ano}-{mes:02d}_modulacao_uniforme.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
+    for ano, mes, grade, fatia in meses_da_grade():
+        if not grade['presente'][fatia].any():
+            continue
 
+        meses_com_registro.add(mes)
+        agendar(agendador, grafico_modulacao_uniforme, ano, mes, instantes(grade, fatia),
+                modulacao_do_mes(grade, fatia, series), limites_por_mes.get(mes, 120), output_dir,
+                coluna_previsao, arquivos=[f"{output_dir}/{ano}-{mes:02d}_modulacao_uniforme.png"])
         arquivos_gerados += 1
-        print(f"  Salvo: {filename}")
 
     return arquivos_gerados, meses_com_registro
 
-def criar_graficos_comparacao(modulacao, output_dir, nome_arquivo, titulo_base=""):
-    """Cria gráficos comparando anos para cada mês - apenas NE"""
+def modelo_modulacao_uniforme(coluna_previsao):
+    """Modelo do gráfico de modulação de um ano-mês (escala uniforme); sem `coluna_previsao`, sem a previsão"""
+    fig, ax = criar_figura((14, 8))
+    linhas = {}
+    linhas['pct_real'], = ax.plot(DATA_PROVISORIA, [np.nan],
+                                  label='Geração Real', color='#2196F3', linewidth=1.5, alpha=0.8)
+    linhas['pct_ref'], = ax.plot(DATA_PROVISORIA, [np.nan],
+                                 label='Geração Referência', color='#FF9800', linewidth=1.5, alpha=0.8)
+
+    if coluna_previsao is not None:
+        linhas['pct_prev'], = ax.plot(DATA_PROVISORIA, [np.nan],
+                                      label=f'Previsão {coluna_previsao}', color='#4CAF50', linewidth=2, alpha=0.9)
+
+    ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7,
+               label='Média Diária (100%)')
+
+    ax.set_xlabel('Data', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Geração (% da Média Diária)', fontsize=12, fontweight='bold')
+    titulo = ax.set_title('', fontsize=16, fontweight='bold', pad=20)
+    ax.legend(fontsize=11, loc='upper left')
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    return {'fig': fig, 'ax': ax, 'linhas': linhas, 'titulo': titulo}
+
+def grafico_modulacao_uniforme(ano, mes, tempo, modulacao, y_max, output_dir, coluna_previsao='NE_UEE'):
+    """Gráfico de modulação de um ano-mês com o eixo Y até `y_max` (a escala do mês)"""
+    modelo = obter_modelo(modelo_modulacao_uniforme, coluna_previsao if 'pct_prev' in modulacao else None)
+    atualizar_linhas(modelo, {chave: (tempo, pct.ravel()) for chave, pct in modulacao.items()})
+    modelo['titulo'].set_text(f"Modulação Diária - {ano}-{mes:02d} ({MESES_NOMES.get(mes, mes)})")
+    reescalar(modelo['ax'], xlim=(tempo[0], tempo[-1]), ylim=(0, y_max))
+
+    filename = f"{output_dir}/{ano}-{mes:02d}_modulacao_uniforme.png"
+    salvar_modelo(modelo, filename)
+
+    print(f"  Salvo: {filename}")
+
+def criar_graficos_comparacao(modulacao, output_dir, nome_arquivo, titulo_base="", envelopes=None, agendador=None,
+                              coluna_previsao='NE_UEE'):
+    """
+    Cria gráficos comparando anos para cada mês de um recorte; sem
+    `coluna_previsao`, sem o gráfico e a tabela da previsão. Com `envelopes`
+    (quantis.envelopes_mensais), os gráficos de modulação mostram também a
+    faixa P10-P90 e a mediana do mês em todos os anos. Cada mês é uma tarefa
+    do `agendador` (serial se não for informado), só com as linhas do mês.
+    Retorna o número de arquivos agendados e os meses comparados
+    """
 
     os.makedirs(output_dir, exist_ok=True)
+    if agendador is None:
+        agendador = criar_agendador()
 
-    # Para cada mês (1 a 12)
-    cores_anos = {
-        2021: '#FF6B6B',
-        2022: '#4ECDC4',
-        2023: '#45B7D1',
-        2024: '#FFA07A',
-        2025: '#98D8C8'
-    }
+    tipos = [tipo for tipo, (chave, *_) in {**GRAFICOS_COMPARACAO, **TABELAS_COMPARACAO}.items()
+             if chave != 'pct_prev' or coluna_previsao is not None]
+    arquivos_gerados = 0
+    meses_comparados = []
 
+    # Para cada mês (1 a 12)
     for mes in range(1, 13):
         df_mes = modulacao[modulacao['mes'] == mes]
 
         if len(df_mes) == 0:
             continue
 
-        anos_disponiveis = sorted(df_mes['ano'].unique())
-
-        if len(anos_disponiveis) < 2:
+        if df_mes['ano'].nunique() < 2:
             continue  # Precisa de pelo menos 2 anos para comparar
 
-        # === GRÁFICO DE MODULAÇÃO - GERAÇÃO REAL ===
-        fig, ax = plt.subplots(figsize=(14, 8))
-
-        for ano in anos_disponiveis:
-            df_ano = df_mes[df_mes['ano'] == ano].sort_values('hora_int')
-            cor = cores_anos.get(ano, '#333333')
-            ax.plot(df_ano['hora_int'], df_ano['pct_real'],
-                    label=f'{ano}', color=cor, linewidth=2.5, marker='o', markersize=4, alpha=0.8)
-
-        ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7, label='Média Diária (100%)')
-
-        ax.set_xlabel('Hora do Dia', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração Real (% da Média Diária)', fontsize=12, fontweight='bold')
-        ax.set_title(f'{titulo_base} - Modulação Geração Real - {MESES_NOMES[mes]} (Comparação entre Anos)',
-                     fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=11, loc='best', ncol=2)
-        ax.grid(True, alpha=0.3)
-        ax.set_xlim(0, 24)
-        ax.set_ylim(bottom=0)
-        ax.set_xticks(range(0, 25, 2))
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_real.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  Salvo: {filename}")
-
-        # === GRÁFICO DE MODULAÇÃO - GERAÇÃO REFERÊNCIA ===
-        fig, ax = plt.subplots(figsize=(14, 8))
-
-        for ano in anos_disponiveis:
-            df_ano = df_mes[df_mes['ano'] == ano].sort_values('hora_int')
-            cor = cores_anos.get(ano, '#333333')
-            ax.plot(df_ano['hora_int'], df_ano['pct_ref'],
-                    label=f'{ano}', color=cor, linewidth=2.5, marker='s', markersize=4, alpha=0.8)
-
-        ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7, label='Média Diária (100%)')
-
-        ax.set_xlabel('Hora do Dia', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração Referência (% da Média Diária)', fontsize=12, fontweight='bold')
-        ax.set_title(f'{titulo_base} - Modulação Geração Referência - {MESES_NOMES[mes]} (Comparação entre Anos)',
-                     fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=11, loc='best', ncol=2)
-        ax.grid(True, alpha=0.3)
-        ax.set_xlim(0, 24)
-        ax.set_ylim(bottom=0)
-        ax.set_xticks(range(0, 25, 2))
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_ref.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  Salvo: {filename}")
+        envelopes_mes = None if envelopes is None else envelopes[envelopes['mes'] == mes]
+        arquivos = [f"{output_dir}/{nome_arquivo}_{mes:02d}_{tipo}.{'svg' if tipo in TABELAS_COMPARACAO else 'png'}"
+                    for tipo in tipos]
+        agendar(agendador, criar_graficos_mes, df_mes, mes, output_dir, nome_arquivo, titulo_base, envelopes_mes,
+                coluna_previsao, arquivos=arquivos)
+        arquivos_gerados += len(arquivos)
+        meses_comparados.append(mes)
+
+    return arquivos_gerados, meses_comparados
+
+# Gráficos de linhas da comparação entre anos: arquivo -> (série, marcador, rótulo do eixo Y, título)
+GRAFICOS_COMPARACAO = {
+    'real': ('pct_real', 'o', 'Geração Real (% da Média Diária)', 'Modulação Geração Real'),
+    'ref': ('pct_ref', 's', 'Geração Referência (% da Média Diária)', 'Modulação Geração Referência'),
+    'prev': ('pct_prev', '^', 'Previsão {previsao} (% da Média Diária)', 'Modulação Previsão'),
+    'horario': ('pct_real', None, 'Geração (% da Média Diária)', 'Dados Horários do Mês')
+}
 
-        # === GRÁFICO DE PREVISÃO ===
-        fig, ax = plt.subplots(figsize=(14, 8))
+# Tabelas da comparação entre anos: arquivo -> (série, cor do cabeçalho, cor da coluna das horas)
+TABELAS_COMPARACAO = {
+    'tabela_real': ('pct_real', '#2196F3', '#1976D2'),
+    'tabela_ref': ('pct_ref', '#FF9800', '#F57C00'),
+    'tabela_prev': ('pct_prev', '#4CAF50', '#388E3C')
+}
 
+def modelo_comparacao(tipo, anos, com_envelope, coluna_previsao='NE_UEE'):
+    """
+    Modelo de um gráfico de linhas da comparação entre anos (GRAFICOS_COMPARACAO):
+    uma linha por ano e, com `com_envelope`, a faixa P10-P90 e a mediana de
+    todos os anos atrás delas
+    """
+    _, marcador, rotulo_y, _ = GRAFICOS_COMPARACAO[tipo]
+    rotulo_y = rotulo_y.format(previsao=coluna_previsao)
+    fig, ax = criar_figura((14, 8))
+    envelope = None
+    linhas = {}
+    horas = np.arange(N_HORAS)
+    if com_envelope:
+        envelope = ax.fill_between(horas, np.zeros(N_HORAS), np.zeros(N_HORAS), color='#9E9E9E', alpha=0.2,
+                                   label='P10-P90 (todos os anos)', zorder=0)
+        linhas['mediana'], = ax.plot(horas, np.zeros(N_HORAS), color='#616161', linestyle=':', linewidth=2,
+                                     label='Mediana (todos os anos)', zorder=1)
+
+    for ano in anos:
+        cor = CORES_ANOS.get(ano, '#333333')
+        if marcador is None:
+            linhas[ano], = ax.plot(horas, np.zeros(N_HORAS), label=f'{ano} - Real', color=cor, linewidth=2,
+                                   alpha=0.7, linestyle='-')
+        else:
+            linhas[ano], = ax.plot(horas, np.zeros(N_HORAS), label=f'{ano}', color=cor, linewidth=2.5,
+                                   marker=marcador, markersize=4, alpha=0.8)
+
+    ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7, label='Média Diária (100%)')
+
+    ax.set_xlabel('Hora do Dia', fontsize=12, fontweight='bold')
+    ax.set_ylabel(rotulo_y, fontsize=12, fontweight='bold')
+    titulo = ax.set_title('', fontsize=16, fontweight='bold', pad=20)
+    ax.legend(fontsize=10 if marcador is None else 11, loc='best', ncol=2)
+    ax.grid(True, alpha=0.3)
+    ax.set_xticks(range(0, 25, 2))
+    return {'fig': fig, 'ax': ax, 'linhas': linhas, 'envelope': envelope, 'titulo': titulo}
+
+def criar_graficos_mes(df_mes, mes, output_dir, nome_arquivo, titulo_base="", envelopes=None,
+                       coluna_previsao='NE_UEE'):
+    """
+    As 7 visualizações da comparação entre anos de um mês: modulação e tabela
+    de cada série e o gráfico horário do mês inteiro (5 sem `coluna_previsao`).
+    Com `envelopes` (as linhas do mês em quantis.envelopes_mensais), os gráficos
+    de modulação mostram a faixa P10-P90 e a mediana do mês em todos os anos
+    """
+    anos_disponiveis = sorted(df_mes['ano'].unique())
+
+    # === GRÁFICOS DE MODULAÇÃO (REAL, REFERÊNCIA, PREVISÃO) E HORÁRIO DO MÊS INTEIRO ===
+    for tipo, (chave, _, _, nome) in GRAFICOS_COMPARACAO.items():
+        if chave == 'pct_prev' and coluna_previsao is None:
+            continue
+        envelope = None
+        if envelopes is not None and tipo != 'horario':
+            envelope = envelopes[envelopes['chave'] == chave].sort_values('hora_int')
+            envelope = envelope if len(envelope) else None
+
+        modelo = obter_modelo(modelo_comparacao, tipo, tuple(anos_disponiveis), envelope is not None,
+                              coluna_previsao)
+        dados = {}
         for ano in anos_disponiveis:
             df_ano = df_mes[df_mes['ano'] == ano].sort_values('hora_int')
-            if 'pct_prev' in df_ano.columns:
-                cor = cores_anos.get(ano, '#333333')
-                ax.plot(df_ano['hora_int'], df_ano['pct_prev'],
-                        label=f'{ano}', color=cor, linewidth=2.5, marker='^', markersize=4, alpha=0.8)
-
-        ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7, label='Média Diária (100%)')
-
-        ax.set_xlabel('Hora do Dia', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Previsão NE_UEE (% da Média Diária)', fontsize=12, fontweight='bold')
-        ax.set_title(f'{titulo_base} - Modulação Previsão - {MESES_NOMES[mes]} (Comparação entre Anos)',
-                     fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=11, loc='best', ncol=2)
-        ax.grid(True, alpha=0.3)
-        ax.set_xlim(0, 24)
-        ax.set_ylim(bottom=0)
-        ax.set_xticks(range(0, 25, 2))
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_prev.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  Salvo: {filename}")
-
-        # === TABELA REAL ===
-        fig, ax = plt.subplots(figsize=(12, 10))
-        ax.axis('tight')
-        ax.axis('off')
-
-        table_data_real = [['Hora'] + [str(ano) for ano in anos_disponiveis]]
-        for hora in range(25):
-            row = [f'{hora:02d}:00']
-            for ano in anos_disponiveis:
-                df_ano_hora = df_mes[(df_mes['ano'] == ano) & (df_mes['hora_int'] == hora)]
-                if len(df_ano_hora) > 0:
-                    row.append(f"{df_ano_hora['pct_real'].iloc[0]:.1f}%")
-                else:
-                    row.append('-')
-            table_data_real.append(row)
-
-        table = ax.table(cellText=table_data_real, cellLoc='center', loc='center',
-                        colWidths=[0.15] + [0.85/len(anos_disponiveis)]*len(anos_disponiveis))
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1, 2.5)
-
-        for i in range(len(anos_disponiveis) + 1):
-            cell = table[(0, i)]
-            cell.set_facecolor('#2196F3')
-            cell.set_text_props(weight='bold', color='white', fontsize=11)
-
-        for i in range(1, len(table_data_real)):
-            cell = table[(i, 0)]
-            cell.set_facecolor('#1976D2')
-            cell.set_text_props(weight='bold', color='white', fontsize=10)
-            for j in range(1, len(anos_disponiveis) + 1):
-                cell = table[(i, j)]
-                cell.set_facecolor('#f0f0f0' if i % 2 == 0 else 'white')
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_tabela_real.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
+            valores = df_ano[chave].to_numpy() if chave in df_ano.columns else np.full(len(df_ano), np.nan)
+            dados[ano] = (df_ano['hora_int'].to_numpy(), valores)
+        if envelope is not None:
+            horas = envelope['hora_int'].to_numpy()
+            modelo['envelope'].set_data(horas, envelope['p10'].to_numpy(), envelope['p90'].to_numpy())
+            dados['mediana'] = (horas, envelope['p50'].to_numpy())
+        atualizar_linhas(modelo, dados)
+        modelo['titulo'].set_text(f'{titulo_base} - {nome} - {MESES_NOMES[mes]} (Comparação entre Anos)')
+        colecoes = () if modelo['envelope'] is None else (modelo['envelope'],)
+        reescalar(modelo['ax'], xlim=(0, 24), ylim=(0, None), colecoes=colecoes)
+
+        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_{tipo}.png"
+        salvar_modelo(modelo, filename)
         print(f"  Salvo: {filename}")
 
-        # === TABELA REFERÊNCIA ===
-        fig, ax = plt.subplots(figsize=(12, 10))
-        ax.axis('tight')
-        ax.axis('off')
-
-        table_data_ref = [['Hora'] + [str(ano) for ano in anos_disponiveis]]
-        for hora in range(25):
-            row = [f'{hora:02d}:00']
-            for ano in anos_disponiveis:
-                df_ano_hora = df_mes[(df_mes['ano'] == ano) & (df_mes['hora_int'] == hora)]
-                if len(df_ano_hora) > 0:
-                    row.append(f"{df_ano_hora['pct_ref'].iloc[0]:.1f}%")
-                else:
-                    row.append('-')
-            table_data_ref.append(row)
-
-        table = ax.table(cellText=table_data_ref, cellLoc='center', loc='center',
-                        colWidths=[0.15] + [0.85/len(anos_disponiveis)]*len(anos_disponiveis))
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1, 2.5)
-
-        for i in range(len(anos_disponiveis) + 1):
-            cell = table[(0, i)]
-            cell.set_facecolor('#FF9800')
-            cell.set_text_props(weight='bold', color='white', fontsize=11)
-
-        for i in range(1, len(table_data_ref)):
-            cell = table[(i, 0)]
-            cell.set_facecolor('#F57C00')
-            cell.set_text_props(weight='bold', color='white', fontsize=10)
-            for j in range(1, len(anos_disponiveis) + 1):
-                cell = table[(i, j)]
-                cell.set_facecolor('#f0f0f0' if i % 2 == 0 else 'white')
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_tabela_ref.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  Salvo: {filename}")
+    # === TABELAS (REAL, REFERÊNCIA, PREVISÃO) ===
+    cabecalho = ['Hora'] + [str(ano) for ano in anos_disponiveis]
+    rotulos = [f'{hora:02d}:00' for hora in range(N_HORAS)]
+    coluna_ano = np.searchsorted(anos_disponiveis, df_mes['ano'].to_numpy())
+    hora = df_mes['hora_int'].to_numpy()
+    for tipo, (chave, cor_cabecalho, cor_horas) in TABELAS_COMPARACAO.items():
+        if chave == 'pct_prev' and coluna_previsao is None:
+            continue
+        # Matriz horas × anos (NaN onde o ano não tem a hora)
+        valores = np.full((N_HORAS, len(anos_disponiveis)), np.nan)
+        if chave in df_mes.columns:
+            valores[hora, coluna_ano] = df_mes[chave].to_numpy()
 
-        # === TABELA PREVISÃO ===
-        fig, ax = plt.subplots(figsize=(12, 10))
-        ax.axis('tight')
-        ax.axis('off')
-
-        table_data_prev = [['Hora'] + [str(ano) for ano in anos_disponiveis]]
-        for hora in range(25):
-            row = [f'{hora:02d}:00']
-            for ano in anos_disponiveis:
-                df_ano_hora = df_mes[(df_mes['ano'] == ano) & (df_mes['hora_int'] == hora)]
-                if len(df_ano_hora) > 0 and 'pct_prev' in df_ano_hora.columns:
-                    row.append(f"{df_ano_hora['pct_prev'].iloc[0]:.1f}%")
-                else:
-                    row.append('-')
-            table_data_prev.append(row)
-
-        table = ax.table(cellText=table_data_prev, cellLoc='center', loc='center',
-                        colWidths=[0.15] + [0.85/len(anos_disponiveis)]*len(anos_disponiveis))
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1, 2.5)
-
-        for i in range(len(anos_disponiveis) + 1):
-            cell = table[(0, i)]
-            cell.set_facecolor('#4CAF50')
-            cell.set_text_props(weight='bold', color='white', fontsize=11)
-
-        for i in range(1, len(table_data_prev)):
-            cell = table[(i, 0)]
-            cell.set_facecolor('#388E3C')
-            cell.set_text_props(weight='bold', color='white', fontsize=10)
-            for j in range(1, len(anos_disponiveis) + 1):
-                cell = table[(i, j)]
-                cell.set_facecolor('#f0f0f0' if i % 2 == 0 else 'white')
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_tabela_prev.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
+        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_{tipo}.svg"
+        gravar_tabela_svg(filename, cabecalho, rotulos, valores, cor_cabecalho, cor_horas)
         print(f"  Salvo: {filename}")
 
-        # === GRÁFICO HORÁRIO DO MÊS INTEIRO ===
-        fig, ax = plt.subplots(figsize=(14, 8))
+def parse_args():
+    """
+    Argumentos de linha de comando
+    """
+    parser = argparse.ArgumentParser(description='Comparação entre anos - mesmo mês')
+    parser.add_argument('--subsistema', choices=list(SUBSISTEMAS), default=SUBSISTEMA_PADRAO,
+                        help=f'Subsistema comparado, lido de resultados/<subsistema>/ (padrão: {SUBSISTEMA_PADRAO}, '
+                             'em resultados/)')
+    parser.add_argument('--agrupamento', choices=list(AGRUPAMENTOS),
+                        help='Compara um estado ou usina do subsistema (sem previsão); exige --grupo')
+    parser.add_argument('--grupo', help='Estado ou usina comparado com --agrupamento')
+    parser.add_argument('--agregacao-servidor', action='store_true',
+                        help='Calcula a modulação por ano/mês/hora a partir das somas semi-horárias '
+                             'consultadas no banco, em vez do índice de prefixos do armazenamento')
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default='mysql',
+                        help='Banco usado com --agregacao-servidor: RDS (config_db.py) ou réplica SQLite local')
+    parser.add_argument('--dir-sqlite', default=DIR_SQLITE_PADRAO,
+                        help=f'Diretório dos bancos SQLite locais (padrão: {DIR_SQLITE_PADRAO})')
+    parser.add_argument('--detectores', nargs='+', choices=list(DETECTORES), default=['limiar'],
+                        help='Detectores de outliers da referência com --agregacao-servidor (os mesmos '
+                             'usados em comparacao_eolica_ne.py; padrão: limiar)')
+    parser.add_argument('--fora-da-memoria', action='store_true',
+                        help='Lê o armazenamento partição a partição, sem carregar a série inteira')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Processos que renderizam os gráficos, um mês por tarefa (padrão: 1, em série)')
+    parser.add_argument('--redesenhar', action='store_true',
+                        help='Renderiza todos os gráficos, mesmo os cujos dados não mudaram')
+    args = parser.parse_args()
+    if (args.agrupamento is None) != (args.grupo is None):
+        parser.error('--agrupamento e --grupo devem ser usados juntos')
+    return args
+
+def main():
+    """
+    Função principal
+    """
+    args = parse_args()
+    recorte = criar_recorte(args.subsistema, args.agrupamento, args.grupo)
+    series = series_com_previsao(recorte['coluna_previsao'])
+    dir_recorte = diretorio_saida(recorte)
+    dir_comparacao = f"{dir_recorte}/comparacao_anos"
+
+    print("="*80)
+    print(f"COMPARAÇÃO ENTRE ANOS - MESMO MÊS ({recorte['nome']} - {recorte['descricao']})")
+    print("="*80)
+
+    # Carregar dados
+    print("\nCarregando dados...")
+    dir_completos = caminho_dataset('completos', f"{dir_recorte}/dados")
+    exigir_dataset(dir_completos, ['timestamp'] + list(series))
+    if args.fora_da_memoria:
+        # Cada mês é lido da sua partição quando necessário
+        def meses_da_grade():
+            for ano, mes, df_mes in iterar_particoes(dir_completos, list(series)):
+                grade_mes = criar_grade(df_mes, list(series))
+                yield ano, mes, grade_mes, fatia_mes(grade_mes, ano, mes)
+    else:
+        df_recorte = ler_dataset(dir_completos, colunas=list(series))
+        grade = criar_grade(df_recorte, list(series))
+        del df_recorte
+
+        def meses_da_grade():
+            for ano, mes, fatia in meses(grade):
+                yield ano, mes, grade, fatia
+
+    # Processar dados do recorte
+    titulo_base = f"{recorte['nome']} Completo" if recorte['grupo'] is None else recorte['descricao']
+    print("\n" + "="*80)
+    print(f"PROCESSANDO: {titulo_base.upper()}")
+    print("="*80)
+    if args.agregacao_servidor:
+        print(f"Somando as usinas no servidor ({args.backend}) e calculando a modulação...")
+        modulacao = modulacao_do_servidor(criar_backend(args.backend, args.dir_sqlite), recorte, args.detectores)
+    else:
+        # Cada mês de cada ano sai do índice de prefixos gravado com a série completa
+        modulacao = modulacao_mensal(obter_indice_prefixos(dir_completos, series), series)
+    # Gráficos dos meses em paralelo com --jobs (cada tarefa recebe só os dados do mês);
+    # só são redesenhados os que têm dados ou parâmetros diferentes dos da última execução
+    agendador = criar_agendador(args.jobs, f"{dir_comparacao}/{ARQUIVO_REGISTRO}", args.redesenhar)
+    try:
+        dir_modulacao_uniforme = f"{dir_comparacao}/modulacao_uniforme"
+        total_mod_uniforme, meses_mod_uniforme = criar_modulacao_por_ano_uniforme(
+            meses_da_grade,
+            dir_modulacao_uniforme,
+            agendador,
+            recorte['coluna_previsao']
+        )
 
-        for ano in anos_disponiveis:
-            df_ano = df_mes[df_mes['ano'] == ano].sort_values('hora_int')
-            if 'pct_real' in df_ano.columns:
-                cor = cores_anos.get(ano, '#333333')
-                # Plotar todas as variáveis juntas
-                ax.plot(df_ano['hora_int'], df_ano['pct_real'],
-                        label=f'{ano} - Real', color=cor, linewidth=2, alpha=0.7, linestyle='-')
-
-        ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7, label='Média Diária (100%)')
-
-        ax.set_xlabel('Hora do Dia', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração (% da Média Diária)', fontsize=12, fontweight='bold')
-        ax.set_title(f'{titulo_base} - Dados Horários do Mês - {MESES_NOMES[mes]} (Comparação entre Anos)',
-                     fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=10, loc='best', ncol=2)
-        ax.grid(True, alpha=0.3)
-        ax.set_xlim(0, 24)
-        ax.set_ylim(bottom=0)
-        ax.set_xticks(range(0, 25, 2))
-
-        plt.tight_layout()
-        filename = f"{output_dir}/{nome_arquivo}_{mes:02d}_horario.png"
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  Salvo: {filename}")
+        # Envelopes P10/P50/P90 por mês e hora: sketches por partição, refeitos só onde a partição mudou
+        envelopes = envelopes_mensais(atualizar_digests(dir_completos, series))
+        os.makedirs(dir_comparacao, exist_ok=True)
+        envelopes.to_csv(f"{dir_comparacao}/envelopes_modulacao.csv", index=False, float_format='%.2f')
+        print(f"  Salvo: {dir_comparacao}/envelopes_modulacao.csv")
 
-# Processar dados NE
-print("\n" + "="*80)
-print("PROCESSANDO: NE COMPLETO")
-print("="*80)
-modulacao_ne = calcular_modulacao(df_ne, tem_previsao=True)
-dir_modulacao_uniforme = 'resultados/comparacao_anos/modulacao_uniforme'
-total_mod_uniforme, meses_mod_uniforme = criar_modulacao_por_ano_uniforme(
-    df_ne,
-    dir_modulacao_uniforme
-)
-criar_graficos_comparacao(modulacao_ne, 'resultados/comparacao_anos', 'ne',
-                          titulo_base='NE Completo')
-
-print("\n" + "="*80)
-print("ANÁLISE CONCLUÍDA COM SUCESSO!")
-print("="*80)
-print("\nArquivos salvos em: resultados/comparacao_anos/")
-print("  • 12 meses × 7 visualizações = 84 arquivos")
-print("  • 3 gráficos de modulação (Real, Ref, Prev)")
-print("  • 3 tabelas (Real, Ref, Prev)")
-print("  • 1 gráfico horário do mês inteiro")
-print(f"  • Modulação por ano (escala uniforme): {total_mod_uniforme} arquivos em {len(meses_mod_uniforme)} meses")
+        total_comparacao, meses_comparacao = criar_graficos_comparacao(
+            modulacao, dir_comparacao, recorte['subsistema'].lower(),
+            titulo_base=titulo_base, envelopes=envelopes, agendador=agendador,
+            coluna_previsao=recorte['coluna_previsao']
+        )
+    finally:
+        concluir(agendador)
+
+    print("\n" + "="*80)
+    print("ANÁLISE CONCLUÍDA COM SUCESSO!")
+    print("="*80)
+    print(f"\nArquivos salvos em: {dir_comparacao}/")
+    print(f"  • Comparação entre anos: {total_comparacao} arquivos em {len(meses_comparacao)} meses "
+          "(meses com ao menos 2 anos), por mês:")
+    if recorte['coluna_previsao'] is not None:
+        print("    - 3 gráficos de modulação (Real, Ref, Prev)")
+        print("    - 3 tabelas SVG (Real, Ref, Prev)")
+    else:
+        print("    - 2 gráficos de modulação (Real, Ref)")
+        print("    - 2 tabelas SVG (Real, Ref)")
+    print("    - 1 gráfico horário do mês inteiro")
+    print(f"  • Modulação por ano (escala uniforme): {total_mod_uniforme} arquivos em {len(meses_mod_uniforme)} meses")
+    relatar_memoria('análise')
+
+if __name__ == "__main__":
+    main()
@@ -1,156 +1,284 @@
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import pymysql
 
-# Importar configurações de banco de dados
-from config_db import DB_CONFIG_MIDDLE, DB_CONFIG_DESSEM
-
-def extrair_restricao_eolica():
+from alinhamento import alinhar_fontes
+from analise_defasagem import analisar_defasagem, grafico_defasagem
+from armazenamento import (atualizar_manifesto, avaliar_cache, caminho_dataset, checksums_particoes,
+                           gravar_particoes, hash_texto, invalidar_manifesto, ler_dataset, ler_manifesto,
+                           ler_progresso, registrar_progresso, remover_dataset, remover_particoes,
+                           remover_progresso, ultimo_instante)
+from decimacao import colunas_da_largura, decimar_series
+from fontes_dados import (AGRUPAMENTOS, DIR_SQLITE_PADRAO, ESPERA_INICIAL_PADRAO, SUBSISTEMA_PADRAO, SUBSISTEMAS,
+                          TAMANHO_BLOCO_PADRAO, TENTATIVAS_PADRAO, com_retentativas, consultar_limites,
+                          criar_backend, criar_pool_conexoes, criar_recorte, diretorio_saida, extrair_fatia,
+                          fechar_pool, fontes_do_recorte, listar_grupos)
+from grade_temporal import (criar_grade, dias, dias_com_dados, fatia_mes, instantes, matriz_dias, media_nan,
+                            medias_diarias, medias_mensais, meses, recortar_grade)
+from indice_prefixos import (assinatura_dataset, blocos_diarios, caminho_indice_prefixos,
+                             construir_indice_prefixos, gravar_indice_prefixos, indice_de_blocos)
+from metricas_previsao import atualizar_metricas, exportar_metricas
+from modelos_graficos import (DATA_PROVISORIA, DPI, atualizar_linhas, criar_figura, obter_modelo, reescalar,
+                              salvar_modelo)
+from modulacao import horas_com_registro, media_por_hora, modulacao_diaria, series_com_previsao
+from outliers import (ARQUIVO_CORRECOES, DETECTORES, configurar_detectores, limiar_outlier,
+                      tratar_outliers_referencia)
+from processamento_particionado import (contar_outliers, iterar_meses_combinados, media_referencia,
+                                        tratar_outliers_em_partes)
+from qualidade import ARQUIVO_QUALIDADE, construir_indice, descartar_dias, dias_invalidos, relatorio_cobertura
+from renderizacao import ARQUIVO_REGISTRO, agendar, concluir, criar_agendador
+from tabelas_svg import gravar_tabela_svg
+from utilitarios import memoria_dataframe_mb, relatar_memoria
+
+# Largura (polegadas) do gráfico da série completa, que define as colunas de pixel da decimação
+LARGURA_SERIE_COMPLETA = 24
+
+# Rótulos de mês no eixo X da série completa (acima disso, um rótulo a cada tantos meses)
+MESES_POR_ROTULO = 48
+
+# Janela de sobreposição padrão (horas) para recapturar correções tardias
+SOBREPOSICAO_HORAS_PADRAO = 48
+
+# Idade máxima (horas) do cache antes de estendê-lo incrementalmente
+VALIDADE_CACHE_HORAS_PADRAO = 24
+
+# Conexões simultâneas por banco ao extrair fatias mensais em paralelo
+CONEXOES_POR_FONTE_PADRAO = 4
+
+def colunas_do_recorte(recorte):
     """
-    Extrai dados de restrição eólica do NE (middle.tbl_restricao_eolica)
-    Agrega val_geracao e val_geracaoreferencia por semi-hora
+    Colunas da grade temporal (gráficos e médias diárias) e da série completa
+    tratada gravada no armazenamento; as diferenças só existem com previsão
     """
-    print("Conectando ao banco middle...")
-    conn = pymysql.connect(**DB_CONFIG_MIDDLE)
-
-    query = """
-    SELECT
-        din_instante,
-        SUM(val_geracao) as geracao_total,
-        SUM(val_geracaoreferencia) as geracao_referencia_total
-    FROM tbl_restricao_eolica
-    WHERE id_subsistema = 'NE'
-        AND din_instante IS NOT NULL
-        AND val_geracao IS NOT NULL
-    GROUP BY din_instante
-    ORDER BY din_instante
+    series = list(series_com_previsao(recorte['coluna_previsao']))
+    colunas_analise = list(series)
+    if recorte['coluna_previsao'] is not None:
+        colunas_analise += ['diferenca_geracao', 'diferenca_referencia']
+    return colunas_analise, ['timestamp'] + series
+
+def calcular_diferencas(df, coluna_previsao):
+    """Diferenças entre a geração (real e referência) e a previsão, se houver"""
+    if coluna_previsao is not None:
+        df['diferenca_geracao'] = df['geracao_total'] - df[coluna_previsao]
+        df['diferenca_referencia'] = df['geracao_referencia_total'] - df[coluna_previsao]
+    return df
+
+def fatias_mensais(inicio, fim):
     """
+    Divide [inicio, fim) em fatias que não atravessam a virada de mês
+    """
+    fronteiras = pd.date_range(inicio.to_period('M').to_timestamp(), fim, freq='MS')
+    fronteiras = [inicio] + [f for f in fronteiras if inicio < f < fim] + [fim]
+    return list(zip(fronteiras[:-1], fronteiras[1:]))
 
-    print("Extraindo dados de restrição eólica...")
-    df_restricao = pd.read_sql(query, conn)
-    conn.close()
-
-    df_restricao['din_instante'] = pd.to_datetime(df_restricao['din_instante'])
-    print(f"Total de registros (restrição eólica): {len(df_restricao)}")
-    print(f"Período: {df_restricao['din_instante'].min()} a {df_restricao['din_instante'].max()}")
-
-    return df_restricao
-
-def extrair_renovaveis():
+def mapear_em_ordem(executor, funcao, itens, janela):
     """
-    Extrai dados de previsão eólica NE (dessem.tbl_renovaveis)
-    Campo NE_UEE já contém o valor agregado do Nordeste
+    Como executor.map, mas com no máximo `janela` tarefas em andamento,
+    para que resultados prontos fora de ordem não se acumulem na memória
     """
-    print("\nConectando ao banco dessem...")
-    conn = pymysql.connect(**DB_CONFIG_DESSEM)
-
-    query = """
-    SELECT
-        timestamp,
-        NE_UEE
-    FROM tbl_renovaveis
-    WHERE timestamp IS NOT NULL
-        AND NE_UEE IS NOT NULL
-    ORDER BY timestamp
+    pendentes = []
+    for item in itens:
+        pendentes.append(executor.submit(funcao, *item))
+        if len(pendentes) >= janela:
+            yield pendentes.pop(0).result()
+    for futuro in pendentes:
+        yield futuro.result()
+
+def gravar_fonte_no_armazenamento(fonte, backend, diretorio, desde=None,
+                                  tamanho_bloco=TAMANHO_BLOCO_PADRAO, conexoes=CONEXOES_POR_FONTE_PADRAO,
+                                  tentativas=TENTATIVAS_PADRAO, espera_inicial=ESPERA_INICIAL_PADRAO,
+                                  checkpoint=None):
     """
-
-    print("Extraindo dados de previsão eólica...")
-    df_renovaveis = pd.read_sql(query, conn)
-    conn.close()
-
-    df_renovaveis['timestamp'] = pd.to_datetime(df_renovaveis['timestamp'])
-    print(f"Total de registros (previsão): {len(df_renovaveis)}")
-    print(f"Período: {df_renovaveis['timestamp'].min()} a {df_renovaveis['timestamp'].max()}")
-
-    return df_renovaveis
-
-def tratar_outliers_referencia(df):
+    Extrai uma fonte em fatias mensais buscadas em paralelo sobre um pequeno pool
+    de conexões e grava cada fatia na partição ano/mês correspondente, na ordem
+    cronológica, assim que fica pronta. Sem `desde`, o dataset é recriado; com
+    `desde`, as linhas novas são mescladas às partições existentes.
+    Cada fatia é repetida com espera exponencial em falhas transitórias e, com
+    `checkpoint` (hash_consulta, modo, inicio, fatias_concluidas), cada fatia
+    gravada é registrada no arquivo de progresso do dataset.
+    Retorna (linhas gravadas, último instante recebido)
     """
-    Trata outliers na geração de referência (valores muito baixos)
+    rotulo = f"{fonte['recorte']}/{fonte['nome']}"
+    pool = criar_pool_conexoes(conexoes)
+
+    try:
+        primeiro, ultimo = com_retentativas(consultar_limites, tentativas, espera_inicial)(
+            fonte, backend, pool)
+        if primeiro is None:
+            print(f"\nNenhum registro de {fonte['descricao']} ({fonte['recorte']}) no banco")
+            return 0, None
+
+        inicio = max(primeiro, desde) if desde is not None else primeiro
+        fim = ultimo + pd.Timedelta(seconds=1)
+        fatias = fatias_mensais(inicio, fim) if inicio < fim else []
+
+        if desde is None:
+            remover_dataset(diretorio)
+
+        print(f"\nExtraindo {fonte['descricao']} ({fonte['recorte']}) para {diretorio}: {inicio} a {ultimo} "
+              f"({len(fatias)} fatias, {conexoes} conexões)...")
+
+        if checkpoint is not None:
+            inicio_extracao = checkpoint.get('inicio') or inicio
+            fatias_concluidas = checkpoint.get('fatias_concluidas', 0)
+
+        n_linhas = 0
+        ultimo_instante_recebido = None
+        extrair = com_retentativas(extrair_fatia, tentativas, espera_inicial)
+        with ThreadPoolExecutor(max_workers=conexoes) as executor:
+            tarefas = ((fonte, backend, pool, ini, fim_fatia, tamanho_bloco) for ini, fim_fatia in fatias)
+            for (ini, fim_fatia), df_fatia in zip(fatias, mapear_em_ordem(executor, extrair, tarefas,
+                                                                          2 * conexoes)):
+                if len(df_fatia) > 0:
+                    duplicados = gravar_particoes(df_fatia, diretorio)
+                    n_linhas += len(df_fatia)
+                    ultimo_instante_recebido = df_fatia['timestamp'].max()
+                    aviso = f" ({duplicados} instantes duplicados descartados)" if duplicados else ""
+                    print(f"  [{rotulo}] {ini:%Y-%m}: {len(df_fatia)} linhas{aviso}")
+                if checkpoint is not None:
+                    fatias_concluidas += 1
+                    registrar_progresso(diretorio, checkpoint['hash_consulta'], checkpoint['modo'],
+                                        inicio_extracao, fim_fatia, fatias_concluidas)
+    finally:
+        fechar_pool(pool)
+
+    print(f"Total de registros ({fonte['descricao']}, {fonte['recorte']}): {n_linhas}")
+    return n_linhas, ultimo_instante_recebido
+
+def combinar_fontes(df_restricao, df_renovaveis):
     """
-    print("\nTratando outliers na geração de referência...")
-
-    # Definir threshold para outliers (< 1000 MW)
-    threshold = 1000
+    Junta restrição eólica e previsão por instante, na grade de 30 min qualquer
+    que seja a resolução de cada fonte (alinhar_fontes). O resultado mantém só o
+    instante (datetime64, int64 por baixo) e os valores em float32; campos de
+    calendário são derivados sob demanda (ou pela grade temporal)
+    """
+    return alinhar_fontes([df_restricao, df_renovaveis])
 
-    # Identificar outliers
-    mask_outliers = df['geracao_referencia_total'] < threshold
-    n_outliers = mask_outliers.sum()
+def hash_fonte(fonte, backend):
+    """
+    Hash da definição de uma fonte (backend, consultas, parâmetros e tipos), registrado
+    no manifesto do cache para invalidá-lo quando a origem ou a consulta mudarem
+    """
+    partes = [backend['nome'], fonte['query'], fonte['query_limites'], sorted(fonte['tipos'].items())]
+    if fonte['params']:
+        partes.append(fonte['params'])
+    return hash_texto(*partes)
 
-    print(f"Outliers detectados (< {threshold} MW): {n_outliers}")
+def ultimo_instante_registrado(diretorio):
+    """
+    Último instante carregado segundo o manifesto (watermark da fonte)
+    """
+    manifesto = ler_manifesto(diretorio)
+    if manifesto is None or manifesto.get('fim') is None:
+        return ultimo_instante(diretorio)
+    return pd.Timestamp(manifesto['fim'])
 
-    if n_outliers > 0:
-        # Criar cópia para tratamento
-        df_tratado = df.copy()
-
-        # Substituir outliers por interpolação linear
-        df_tratado.loc[mask_outliers, 'geracao_referencia_total'] = np.nan
-        df_tratado['geracao_referencia_total'] = df_tratado['geracao_referencia_total'].interpolate(
-            method='linear',
-            limit_direction='both'
-        )
-
-        # Verificar se ainda há NaN após interpolação
-        if df_tratado['geracao_referencia_total'].isna().any():
-            # Preencher com média móvel se interpolação falhou
-            df_tratado['geracao_referencia_total'] = df_tratado['geracao_referencia_total'].fillna(
-                df_tratado['geracao_referencia_total'].rolling(window=48, center=True, min_periods=1).mean()
-            )
-
-        # Estatísticas do tratamento
-        valores_corrigidos = df_tratado.loc[mask_outliers, 'geracao_referencia_total']
-        print(f"Valores corrigidos - Mínimo: {valores_corrigidos.min():.2f} MW")
-        print(f"Valores corrigidos - Máximo: {valores_corrigidos.max():.2f} MW")
-        print(f"Valores corrigidos - Média: {valores_corrigidos.mean():.2f} MW")
-
-        return df_tratado
+def atualizar_fonte(fonte, backend, diretorio, modo, sobreposicao, tamanho_bloco, conexoes,
+                    tentativas=TENTATIVAS_PADRAO, espera_inicial=ESPERA_INICIAL_PADRAO):
+    """
+    Atualiza o dataset de uma fonte ('incremental', 'reconstruir' ou 'retomar'
+    uma extração interrompida a partir da última fatia concluída)
+    e regrava seu manifesto
+    """
+    hash_consulta = hash_fonte(fonte, backend)
+    checkpoint = {'hash_consulta': hash_consulta, 'modo': modo, 'inicio': None, 'fatias_concluidas': 0}
+    desde = None
+    if modo == 'retomar':
+        progresso = ler_progresso(diretorio)
+        desde = pd.Timestamp(progresso['concluido_ate'])
+        checkpoint.update(modo=progresso['modo'], inicio=pd.Timestamp(progresso['inicio']),
+                          fatias_concluidas=progresso['fatias_concluidas'])
+        print(f"\n[{fonte['recorte']}/{fonte['nome']}] Retomando extração ({progresso['modo']}) a partir de {desde} "
+              f"({progresso['fatias_concluidas']} fatias já concluídas)")
+    elif modo == 'incremental':
+        watermark = ultimo_instante_registrado(diretorio)
+        if watermark is not None:
+            desde = watermark - sobreposicao
     else:
-        print("Nenhum outlier detectado.")
-        return df
-
-
-def calcular_modulacao_diaria(df_mes):
+        # Dataset inválido até a reconstrução terminar
+        invalidar_manifesto(diretorio)
+
+    gravar_fonte_no_armazenamento(fonte, backend, diretorio, desde, tamanho_bloco, conexoes,
+                                  tentativas, espera_inicial, checkpoint)
+    manifesto = atualizar_manifesto(diretorio, hash_consulta)
+    remover_progresso(diretorio)
+    return manifesto
+
+def atualizar_cache(backend, fontes, diretorios_fontes, modos, sobreposicao_horas=SOBREPOSICAO_HORAS_PADRAO,
+                    tamanho_bloco=TAMANHO_BLOCO_PADRAO, conexoes=CONEXOES_POR_FONTE_PADRAO,
+                    tentativas=TENTATIVAS_PADRAO, espera_inicial=ESPERA_INICIAL_PADRAO):
     """
-    Calcula a modulação diária (padrão intradiário)
-    Retorna percentual em relação à média diária para cada dia
+    Atualiza o armazenamento das fontes, em paralelo (cada fonte está em um banco
+    diferente), conforme o modo decidido para cada uma. No modo 'incremental'
+    extrai apenas os instantes posteriores ao watermark (menos a janela de
+    sobreposição, para recapturar correções tardias); no modo 'reconstruir'
+    reextrai todo o histórico; no modo 'retomar' continua uma extração
+    interrompida de onde parou; fontes em 'reutilizar' não são tocadas
     """
-    # Adicionar hora e minuto se não existir
-    if 'hora' not in df_mes.columns:
-        df_mes['hora'] = df_mes['timestamp'].dt.hour
-    if 'minuto' not in df_mes.columns:
-        df_mes['minuto'] = df_mes['timestamp'].dt.minute
-
-    # Criar coluna de hora decimal (0.0, 0.5, 1.0, 1.5, ...)
-    df_mes['hora_decimal'] = df_mes['hora'] + df_mes['minuto'] / 60.0
-
-    # Para cada dia, calcular a média diária
-    df_mes['data'] = df_mes['timestamp'].dt.date
-    medias_diarias = df_mes.groupby('data').agg({
-        'geracao_total': 'mean',
-        'geracao_referencia_total': 'mean',
-        'NE_UEE': 'mean'
-    }).reset_index()
-    medias_diarias.columns = ['data', 'media_dia_real', 'media_dia_ref', 'media_dia_prev']
-
-    # Merge com dados originais
-    df_mes = df_mes.merge(medias_diarias, on='data', how='left')
-
-    # Calcular percentual em relação à média do dia
-    df_mes['pct_real'] = (df_mes['geracao_total'] / df_mes['media_dia_real']) * 100
-    df_mes['pct_ref'] = (df_mes['geracao_referencia_total'] / df_mes['media_dia_ref']) * 100
-    df_mes['pct_prev'] = (df_mes['NE_UEE'] / df_mes['media_dia_prev']) * 100
-
-    # Retornar dataframe completo com modulação de cada dia
-    return df_mes
-
-def criar_plots_mensais(df, output_dir):
+    sobreposicao = pd.Timedelta(hours=sobreposicao_horas)
+    a_atualizar = {nome_fonte: modo for nome_fonte, modo in modos.items() if modo != 'reutilizar'}
+    if not a_atualizar:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(a_atualizar)) as executor:
+        futuros = [
+            executor.submit(atualizar_fonte, fontes[nome_fonte], backend, diretorios_fontes[nome_fonte], modo,
+                            sobreposicao, tamanho_bloco, conexoes, tentativas, espera_inicial)
+            for nome_fonte, modo in a_atualizar.items()
+        ]
+        for futuro in futuros:
+            futuro.result()
+
+def checksums_fontes(diretorios_fontes):
+    """Checksum de cada partição das fontes, segundo os manifestos: {fonte: {'AAAA-MM': sha256}}"""
+    return {nome_fonte: checksums_particoes(diretorio) for nome_fonte, diretorio in diretorios_fontes.items()}
+
+def avaliar_qualidade(fontes, diretorios_fontes, dir_dados, output_dir, cobertura_minima):
     """
-    Cria 4 visualizações por mês:
+    Atualiza o índice de qualidade das fontes (só as partições novas ou
+    alteradas são lidas), salva o relatório de cobertura por mês e fonte e
+    lista os meses com problemas.
+    Retorna os dias com cobertura abaixo de `cobertura_minima`, a descartar
+    """
+    print("\nAvaliando a qualidade dos dados...")
+    indice = construir_indice(diretorios_fontes, {nome_fonte: list(fonte['tipos'])
+                                                  for nome_fonte, fonte in fontes.items()},
+                              f"{dir_dados}/{ARQUIVO_QUALIDADE}")
+
+    relatorio = relatorio_cobertura(indice)
+    relatorio.to_csv(f"{output_dir}/cobertura.csv", index=False, float_format='%.2f')
+    problemas = relatorio[(relatorio['lacunas'] > 0) | (relatorio['fora_da_grade'] > 0) |
+                          (relatorio['somente_nesta_fonte'] > 0)]
+    for _, linha in problemas.iterrows():
+        detalhes = [f"{linha['lacunas']} lacunas"]
+        if linha['dias_sem_dados']:
+            detalhes.append(f"{linha['dias_sem_dados']} dias sem dados")
+        for coluna in ('fora_da_grade', 'suspeitas_horario_verao', 'somente_nesta_fonte'):
+            if linha[coluna]:
+                detalhes.append(f"{coluna.replace('_', ' ')}: {linha[coluna]}")
+        print(f"  {linha['mes']} {linha['fonte']}: {linha['cobertura_pct']:.1f}% ({', '.join(detalhes)})")
+    print(f"  {len(problemas)} de {len(relatorio)} meses/fonte com problemas; "
+          f"relatório em {output_dir}/cobertura.csv")
+
+    invalidos = dias_invalidos(indice, cobertura_minima)
+    if len(invalidos):
+        print(f"  {len(invalidos)} dias com cobertura abaixo de {cobertura_minima:.0%} serão descartados")
+    return invalidos
+
+def sufixo_titulo(recorte):
+    """Complemento dos títulos dos gráficos mensais fora do NE"""
+    return '' if recorte['nome'] == SUBSISTEMA_PADRAO else f" - {recorte['descricao']}"
+
+def criar_plots_mensais(grade, recorte, output_dir, agendador):
+    """
+    Cria 4 visualizações por mês (cada mês é uma tarefa do agendador, com a
+    fatia da grade temporal só das séries do recorte):
     1. Semi-horário: comparação temporal completa
     2. Diário: médias diárias
     3. Modulação diária: padrão intradiário médio
@@ -159,190 +287,157 @@ def criar_plots_mensais(df, output_dir):
     print("\nCriando plots mensais (4 visualizações por mês)...")
 
     os.makedirs(f"{output_dir}/mensal", exist_ok=True)
+    series = list(series_com_previsao(recorte['coluna_previsao']))
 
-    # Agrupar por ano-mês - ordenar do mais novo para o mais antigo
-    meses = sorted(df['ano_mes'].dropna().unique(), reverse=True)
+    # Percorrer os meses do mais novo para o mais antigo
+    for ano, mes, fatia in meses(grade, decrescente=True):
+        if grade['presente'][fatia].any():
+            agendar(agendador, criar_plots_mes, recortar_grade(grade, fatia, series), recorte, ano, mes,
+                    output_dir, arquivos=arquivos_plots_mes(output_dir, ano, mes))
 
-    for ano_mes in meses:
-        df_mes = df[df['ano_mes'] == ano_mes].copy()
-
-        if len(df_mes) == 0:
-            continue
-
-        # === GRÁFICO SEMI-HORÁRIO ===
-        fig, ax = plt.subplots(figsize=(14, 8))
-
-        ax.plot(df_mes['timestamp'], df_mes['geracao_total'],
-                label='Geração Real', color='#2196F3', linewidth=1.5, alpha=0.8)
-        ax.plot(df_mes['timestamp'], df_mes['geracao_referencia_total'],
-                label='Geração Referência', color='#FF9800', linewidth=1.5, alpha=0.8)
-        ax.plot(df_mes['timestamp'], df_mes['NE_UEE'],
-                label='Previsão NE_UEE', color='#4CAF50', linewidth=2, alpha=0.9)
-
-        ax.set_xlabel('Data', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração (MW)', fontsize=12, fontweight='bold')
-        ax.set_title(f'Comparação Semi-horária - {ano_mes}', fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=11, loc='upper left')
-        ax.grid(True, alpha=0.3)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
-        ax.xaxis.set_major_locator(mdates.DayLocator(interval=2))
-        plt.xticks(rotation=45)
-
-        plt.tight_layout()
-
-        # Salvar semi-horário
-        filename_semi = f"{output_dir}/mensal/{ano_mes}_semihorario.png"
-        plt.savefig(filename_semi, dpi=150, bbox_inches='tight')
-        plt.close()
-
-        print(f"  Salvo: {filename_semi}")
-
-        # === GRÁFICO DIÁRIO ===
-        fig, ax = plt.subplots(figsize=(14, 8))
-
-        # Calcular médias diárias
-        df_diario = df_mes.groupby('data').agg({
-            'geracao_total': 'mean',
-            'geracao_referencia_total': 'mean',
-            'NE_UEE': 'mean'
-        }).reset_index()
-
-        ax.plot(df_diario['data'], df_diario['geracao_total'],
-                label='Geração Real (Média Diária)', color='#2196F3',
-                linewidth=2.5, marker='o', markersize=6, alpha=0.8)
-        ax.plot(df_diario['data'], df_diario['geracao_referencia_total'],
-                label='Geração Referência (Média Diária)', color='#FF9800',
-                linewidth=2.5, marker='s', markersize=6, alpha=0.8)
-        ax.plot(df_diario['data'], df_diario['NE_UEE'],
-                label='Previsão NE_UEE (Média Diária)', color='#4CAF50',
-                linewidth=2.5, marker='^', markersize=6, alpha=0.9)
-
-        ax.set_xlabel('Data', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração Média Diária (MW)', fontsize=12, fontweight='bold')
-        ax.set_title(f'Comparação Diária - {ano_mes}', fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=11, loc='upper left')
-        ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-
-        plt.tight_layout()
-
-        # Salvar diário
-        filename_diario = f"{output_dir}/mensal/{ano_mes}_diario.png"
-        plt.savefig(filename_diario, dpi=150, bbox_inches='tight')
-        plt.close()
-
-        print(f"  Salvo: {filename_diario}")
-
-        # === GRÁFICO DE MODULAÇÃO DIÁRIA (SÉRIE TEMPORAL) ===
-        fig, ax = plt.subplots(figsize=(14, 8))
-
-        # Calcular modulação (retorna df completo com todos os dias)
-        df_modulacao = calcular_modulacao_diaria(df_mes)
-
-        # Plotar modulação como série temporal (mesmo formato do semi-horário)
-        ax.plot(df_modulacao['timestamp'], df_modulacao['pct_real'],
-                label='Geração Real', color='#2196F3', linewidth=1.5, alpha=0.8)
-        ax.plot(df_modulacao['timestamp'], df_modulacao['pct_ref'],
-                label='Geração Referência', color='#FF9800', linewidth=1.5, alpha=0.8)
-        ax.plot(df_modulacao['timestamp'], df_modulacao['pct_prev'],
-                label='Previsão NE_UEE', color='#4CAF50', linewidth=2, alpha=0.9)
+def arquivos_plots_mes(output_dir, ano, mes):
+    """Arquivos das 4 visualizações de um mês"""
+    return [f"{output_dir}/mensal/{ano}-{mes:02d}_{nome}"
+            for nome in ('semihorario.png', 'diario.png', 'modulacao.png', 'tabela.svg')]
 
+def modelo_linhas_mes(tipo, previsao):
+    """
+    Modelo de um gráfico de linhas do mês: 'semihorario' (MW), 'diario'
+    (médias diárias, com marcadores) ou 'modulacao' (% da média do dia)
+    """
+    fig, ax = criar_figura((14, 8))
+    diario = tipo == 'diario'
+    sufixo = ' (Média Diária)' if diario else ''
+    series = {
+        'geracao_total': (f'Geração Real{sufixo}', '#2196F3', 'o', 0.8),
+        'geracao_referencia_total': (f'Geração Referência{sufixo}', '#FF9800', 's', 0.8)
+    }
+    if previsao is not None:
+        series[previsao] = (f'Previsão {previsao}{sufixo}', '#4CAF50', '^', 0.9)
+
+    x = DATA_PROVISORIA.astype('datetime64[D]') if diario else DATA_PROVISORIA
+    linhas = {}
+    for coluna, (rotulo, cor, marcador, alpha) in series.items():
+        if diario:
+            linhas[coluna], = ax.plot(x, [np.nan], label=rotulo, color=cor, linewidth=2.5,
+                                      marker=marcador, markersize=6, alpha=alpha)
+        else:
+            linhas[coluna], = ax.plot(x, [np.nan], label=rotulo, color=cor,
+                                      linewidth=2 if coluna == previsao else 1.5, alpha=alpha)
+
+    if tipo == 'modulacao':
         # Linha de referência em 100%
         ax.axhline(y=100, color='gray', linestyle='--', linewidth=1.5, alpha=0.7, label='Média Diária (100%)')
 
-        ax.set_xlabel('Data', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Geração (% da Média Diária)', fontsize=12, fontweight='bold')
-        ax.set_title(f'Modulação Diária - {ano_mes}', fontsize=16, fontweight='bold', pad=20)
-        ax.legend(fontsize=11, loc='upper left')
-        ax.grid(True, alpha=0.3)
-        ax.set_ylim(bottom=0)  # Começar eixo Y em zero
+    rotulos_y = {'semihorario': 'Geração (MW)', 'diario': 'Geração Média Diária (MW)',
+                 'modulacao': 'Geração (% da Média Diária)'}
+    ax.set_xlabel('Data', fontsize=12, fontweight='bold')
+    ax.set_ylabel(rotulos_y[tipo], fontsize=12, fontweight='bold')
+    titulo = ax.set_title('', fontsize=16, fontweight='bold', pad=20)
+    ax.legend(fontsize=11, loc='upper left')
+    ax.grid(True, alpha=0.3)
+    if not diario:
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
         ax.xaxis.set_major_locator(mdates.DayLocator(interval=2))
-        plt.xticks(rotation=45)
-
-        plt.tight_layout()
-
-        # Salvar modulação
-        filename_modulacao = f"{output_dir}/mensal/{ano_mes}_modulacao.png"
-        plt.savefig(filename_modulacao, dpi=150, bbox_inches='tight')
-        plt.close()
-
-        print(f"  Salvo: {filename_modulacao}")
-
-        # === TABELA DE MODULAÇÃO POR HORA ===
-        fig, ax = plt.subplots(figsize=(14, 8))
-        ax.axis('tight')
-        ax.axis('off')
-
-        # Preparar dados da tabela - calcular média por hora completa do mês
-        df_modulacao['hora_int'] = df_modulacao['hora_decimal'].round().astype(int)
-        tabela_dados = df_modulacao.groupby('hora_int').agg({
-            'pct_real': 'mean',
-            'pct_ref': 'mean',
-            'pct_prev': 'mean'
-        }).reset_index()
+    ax.tick_params(axis='x', labelrotation=45)
+    return {'fig': fig, 'ax': ax, 'linhas': linhas, 'titulo': titulo}
 
-        # Criar dados para a tabela
-        table_data = []
-        table_data.append(['Hora', 'Geração Real (%)', 'Geração Referência (%)', 'Previsão NE_UEE (%)'])
-
-        for _, row in tabela_dados.iterrows():
-            hora = f"{int(row['hora_int']):02d}:00"
-            real = f"{row['pct_real']:.1f}%"
-            ref = f"{row['pct_ref']:.1f}%"
-            prev = f"{row['pct_prev']:.1f}%"
-            table_data.append([hora, real, ref, prev])
-
-        # Criar tabela
-        table = ax.table(cellText=table_data, cellLoc='center', loc='center',
-                        colWidths=[0.2, 0.27, 0.27, 0.26])
-
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1, 2.5)
-
-        # Estilizar cabeçalho
-        for i in range(4):
-            cell = table[(0, i)]
-            cell.set_facecolor('#2196F3')
-            cell.set_text_props(weight='bold', color='white', fontsize=11)
-
-        # Estilizar linhas alternadas
-        for i in range(1, len(table_data)):
-            for j in range(4):
-                cell = table[(i, j)]
-                if i % 2 == 0:
-                    cell.set_facecolor('#f0f0f0')
-                else:
-                    cell.set_facecolor('white')
-
-        plt.tight_layout()
-
-        # Salvar tabela
-        filename_tabela = f"{output_dir}/mensal/{ano_mes}_tabela.png"
-        plt.savefig(filename_tabela, dpi=150, bbox_inches='tight')
-        plt.close()
+def criar_plots_mes(grade, recorte, ano, mes, output_dir):
+    """
+    Cria as 4 visualizações de um mês em {output_dir}/mensal a partir da grade
+    só do mês (recortar_grade), que é o que uma tarefa do pool recebe. Os
+    gráficos reaproveitam os modelos do processo (modelos_graficos)
+    A previsão só aparece nos recortes que a têm
+    """
+    valores = grade['valores']
+    ano_mes = f"{ano}-{mes:02d}"
+    tempo = instantes(grade)
+    previsao = recorte['coluna_previsao']
+    series = series_com_previsao(previsao)
+
+    # === GRÁFICO SEMI-HORÁRIO ===
+    modelo = obter_modelo(modelo_linhas_mes, 'semihorario', previsao)
+    atualizar_linhas(modelo, {coluna: (tempo, valores[coluna]) for coluna in series})
+    modelo['titulo'].set_text(f'Comparação Semi-horária - {ano_mes}{sufixo_titulo(recorte)}')
+    reescalar(modelo['ax'])
+
+    # Salvar semi-horário
+    filename_semi = f"{output_dir}/mensal/{ano_mes}_semihorario.png"
+    salvar_modelo(modelo, filename_semi)
+
+    print(f"  Salvo: {filename_semi}")
+
+    # === GRÁFICO DIÁRIO ===
+    # Calcular médias diárias (apenas dias com registros)
+    com_dados = dias_com_dados(grade)
+    datas = dias(grade)[com_dados]
+    modelo = obter_modelo(modelo_linhas_mes, 'diario', previsao)
+    atualizar_linhas(modelo, {coluna: (datas, media_nan(matriz_dias(valores[coluna]), eixo=1)[com_dados])
+                              for coluna in series})
+    modelo['titulo'].set_text(f'Comparação Diária - {ano_mes}{sufixo_titulo(recorte)}')
+    reescalar(modelo['ax'])
+
+    # Salvar diário
+    filename_diario = f"{output_dir}/mensal/{ano_mes}_diario.png"
+    salvar_modelo(modelo, filename_diario)
+
+    print(f"  Salvo: {filename_diario}")
+
+    # === GRÁFICO DE MODULAÇÃO DIÁRIA (SÉRIE TEMPORAL) ===
+    # Calcular modulação (matriz dias × 48 de cada série), plotada como série
+    # temporal (mesmo formato do semi-horário)
+    modulacao = modulacao_diaria(grade, series=series)
+    modelo = obter_modelo(modelo_linhas_mes, 'modulacao', previsao)
+    atualizar_linhas(modelo, {coluna: (tempo, modulacao[chave].ravel()) for coluna, chave in series.items()})
+    modelo['titulo'].set_text(f'Modulação Diária - {ano_mes}{sufixo_titulo(recorte)}')
+    reescalar(modelo['ax'], ylim=(0, None))  # Começar eixo Y em zero
+
+    # Salvar modulação
+    filename_modulacao = f"{output_dir}/mensal/{ano_mes}_modulacao.png"
+    salvar_modelo(modelo, filename_modulacao)
+
+    print(f"  Salvo: {filename_modulacao}")
+
+    # === TABELA DE MODULAÇÃO POR HORA ===
+    # Média por hora completa do mês (semi-horas h:00 e h:30 agrupadas na
+    # hora h, só horas com registros)
+    medias = {chave: media_por_hora(pct) for chave, pct in modulacao.items()}
+    cabecalho = ['Hora', 'Geração Real (%)', 'Geração Referência (%)']
+    if previsao is not None:
+        cabecalho.append(f'Previsão {previsao} (%)')
+    horas = np.flatnonzero(horas_com_registro(matriz_dias(grade['presente'])))
+    valores = np.column_stack([medias[chave][horas] for chave in series.values()])
+
+    # Salvar tabela
+    filename_tabela = f"{output_dir}/mensal/{ano_mes}_tabela.svg"
+    gravar_tabela_svg(filename_tabela, cabecalho, [f"{hora:02d}:00" for hora in horas], valores, '#2196F3')
+
+    print(f"  Salvo: {filename_tabela}")
+
+def criar_plots_comparativos_gerais(grade, recorte, output_dir, agendador):
+    """
+    Cria plots comparativos gerais (um gráfico por tarefa do agendador)
+    """
+    print("\nCriando plots comparativos gerais...")
 
-        print(f"  Salvo: {filename_tabela}")
+    # Calcular médias mensais
+    df_mensal = {}
+    for coluna in series_com_previsao(recorte['coluna_previsao']):
+        meses_com_dados, df_mensal[coluna] = medias_mensais(grade, coluna)
 
+    agendar(agendador, criar_grafico_barras_mensal, [f"{ano}-{mes:02d}" for ano, mes in meses_com_dados],
+            df_mensal, recorte, output_dir, arquivos=[f"{output_dir}/barras_mensal.png"])
+    agendar(agendador, criar_grafico_serie_completa,
+            series_serie_completa(instantes(grade), {coluna: grade['valores'][coluna] for coluna in df_mensal}),
+            recorte, output_dir, arquivos=[f"{output_dir}/serie_temporal_completa.png"])
 
-def criar_plots_comparativos_gerais(df, output_dir):
+def criar_grafico_barras_mensal(meses, df_mensal, recorte, output_dir):
     """
-    Cria plots comparativos gerais
+    Gráfico de barras por mês (real e referência) com linha de previsão
+    `df_mensal` traz a média mensal de cada série, na ordem de `meses`
     """
-    print("\nCriando plots comparativos gerais...")
-
-    # 1. Gráfico de barras por mês com linha de previsão
     fig, ax = plt.subplots(figsize=(24, 10))
 
-    # Calcular médias mensais
-    df_mensal = df.groupby('ano_mes').agg({
-        'geracao_total': 'mean',
-        'geracao_referencia_total': 'mean',
-        'NE_UEE': 'mean'
-    }).reset_index()
-
-    meses = df_mensal['ano_mes'].astype(str).values
     x_pos = np.arange(len(meses))
 
     width = 0.35
@@ -353,11 +448,15 @@ def criar_plots_comparativos_gerais(df, output_dir):
     bars2 = ax.bar(x_pos + width/2, df_mensal['geracao_referencia_total'], width,
                    label='Geração Referência (Média)', color='#FF9800', alpha=0.8)
 
-    # Linha para previsão
-    ax2 = ax.twinx()
-    line = ax2.plot(x_pos, df_mensal['NE_UEE'],
-                    label='Previsão NE_UEE (Média)', color='#4CAF50',
-                    linewidth=3, marker='o', markersize=8, zorder=5)
+    # Linha para previsão (eixo direito só nos recortes com previsão)
+    previsao = recorte['coluna_previsao']
+    eixos = [ax]
+    if previsao is not None:
+        ax2 = ax.twinx()
+        line = ax2.plot(x_pos, df_mensal[previsao],
+                        label=f'Previsão {previsao} (Média)', color='#4CAF50',
+                        linewidth=3, marker='o', markersize=8, zorder=5)
+        eixos.append(ax2)
 
     # Configurações eixo y esquerdo (barras)
     ax.set_xlabel('Mês', fontsize=14, fontweight='bold')
@@ -367,28 +466,31 @@ def criar_plots_comparativos_gerais(df, output_dir):
     ax.grid(True, alpha=0.3, axis='y')
     ax.tick_params(axis='y', labelcolor='#333')
 
-    # Configurações eixo y direito (linha)
-    ax2.set_ylabel('Previsão NE_UEE (MW)', fontsize=14, fontweight='bold', color='#4CAF50')
-    ax2.tick_params(axis='y', labelcolor='#4CAF50')
+    if previsao is not None:
+        # Configurações eixo y direito (linha)
+        ax2.set_ylabel(f'Previsão {previsao} (MW)', fontsize=14, fontweight='bold', color='#4CAF50')
+        ax2.tick_params(axis='y', labelcolor='#4CAF50')
 
-    # Alinhar os eixos y
-    y1_min, y1_max = ax.get_ylim()
-    y2_min, y2_max = ax2.get_ylim()
+        # Alinhar os eixos y
+        y1_min, y1_max = ax.get_ylim()
+        y2_min, y2_max = ax2.get_ylim()
 
-    # Usar os mesmos limites para ambos os eixos
-    y_min = min(y1_min, y2_min)
-    y_max = max(y1_max, y2_max)
-    ax.set_ylim(y_min, y_max)
-    ax2.set_ylim(y_min, y_max)
+        # Usar os mesmos limites para ambos os eixos
+        y_min = min(y1_min, y2_min)
+        y_max = max(y1_max, y2_max)
+        ax.set_ylim(y_min, y_max)
+        ax2.set_ylim(y_min, y_max)
 
     # Título
-    ax.set_title('Comparação Mensal - Geração Eólica NE (Médias Mensais)',
+    ax.set_title(f"Comparação Mensal - Geração Eólica {recorte['nome']} (Médias Mensais)",
                  fontsize=18, fontweight='bold', pad=20)
 
     # Legenda combinada
-    lines_labels = [ax.get_legend_handles_labels(), ax2.get_legend_handles_labels()]
-    lines = lines_labels[0][0] + lines_labels[1][0]
-    labels = lines_labels[0][1] + lines_labels[1][1]
+    lines, labels = [], []
+    for eixo in eixos:
+        linhas_eixo, rotulos_eixo = eixo.get_legend_handles_labels()
+        lines += linhas_eixo
+        labels += rotulos_eixo
     ax.legend(lines, labels, fontsize=12, loc='upper left')
 
     plt.tight_layout()
@@ -396,120 +498,412 @@ def criar_plots_comparativos_gerais(df, output_dir):
     plt.close()
     print(f"  Salvo: {output_dir}/barras_mensal.png")
 
-    # 2. Série temporal completa
-    fig, ax = plt.subplots(figsize=(24, 8))
+def series_serie_completa(tempo, valores):
+    """
+    Séries do gráfico da série completa decimadas por coluna de pixel da
+    figura: a tarefa recebe (e desenha) o mesmo número de pontos qualquer que
+    seja o tamanho do histórico ou a resolução dos dados
+    """
+    return decimar_series(tempo, valores, colunas_da_largura(LARGURA_SERIE_COMPLETA, DPI))
+
+def criar_grafico_serie_completa(series, recorte, output_dir):
+    """
+    Gráfico da série temporal completa (real, referência e previsão, se houver)
+    `series` traz (tempo, valores) de cada coluna, já decimados
+    """
+    fig, ax = plt.subplots(figsize=(LARGURA_SERIE_COMPLETA, 8))
 
-    ax.plot(df['timestamp'], df['geracao_total'],
+    ax.plot(*series['geracao_total'],
             label='Geração Real', color='#2196F3', linewidth=1, alpha=0.6)
-    ax.plot(df['timestamp'], df['geracao_referencia_total'],
+    ax.plot(*series['geracao_referencia_total'],
             label='Geração Referência', color='#FF9800', linewidth=1, alpha=0.6)
-    ax.plot(df['timestamp'], df['NE_UEE'],
-            label='Previsão NE_UEE', color='#4CAF50', linewidth=1, alpha=0.6)
+    if recorte['coluna_previsao'] is not None:
+        ax.plot(*series[recorte['coluna_previsao']],
+                label=f"Previsão {recorte['coluna_previsao']}", color='#4CAF50', linewidth=1, alpha=0.6)
 
     ax.set_xlabel('Data', fontsize=12, fontweight='bold')
     ax.set_ylabel('Geração (MW)', fontsize=12, fontweight='bold')
-    ax.set_title('Série Temporal Completa - Eólica NE', fontsize=16, fontweight='bold', pad=20)
+    ax.set_title(f"Série Temporal Completa - Eólica {recorte['nome']}", fontsize=16, fontweight='bold', pad=20)
     ax.legend(fontsize=11, loc='upper left')
     ax.grid(True, alpha=0.3)
 
+    # Um rótulo por mês até MESES_POR_ROTULO meses; em históricos longos, um a cada tantos meses
+    tempo = np.asarray(series['geracao_total'][0], dtype='datetime64[M]')
+    n_meses = int(tempo[-1] - tempo[0]) + 1 if len(tempo) else 1
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=-(-n_meses // MESES_POR_ROTULO)))
     plt.xticks(rotation=45)
 
     plt.tight_layout()
-    plt.savefig(f"{output_dir}/serie_temporal_completa.png", dpi=150, bbox_inches='tight')
+    plt.savefig(f"{output_dir}/serie_temporal_completa.png", dpi=DPI, bbox_inches='tight')
     plt.close()
     print(f"  Salvo: {output_dir}/serie_temporal_completa.png")
 
-def salvar_dados_csv(df, output_dir):
+def relatar_particoes_gravadas(dir_completos, anteriores, hash_consulta):
     """
-    Salva os dados processados em CSV
+    Atualiza o manifesto da série completa e informa quantas partições mudaram
+    em relação aos checksums `anteriores` (as demais mantiveram o arquivo)
     """
-    print("\nSalvando dados em CSV...")
+    atuais = atualizar_manifesto(dir_completos, hash_consulta)['particoes']
+    alteradas = sum(anteriores.get(particao) != dados['sha256'] for particao, dados in atuais.items())
+    removidas = len(set(anteriores) - set(atuais))
+    print(f"  Salvo: {dir_completos} ({alteradas} de {len(atuais)} partições alteradas, {removidas} removidas)")
 
-    # CSV completo
-    df.to_csv(f"{output_dir}/dados_completos.csv", index=False)
-    print(f"  Salvo: {output_dir}/dados_completos.csv")
+def salvar_dados(df, grade, recorte, output_dir, dir_completos):
+    """
+    Salva os dados processados: série completa no armazenamento colunar, com
+    o índice de prefixos ao lado, e médias diárias (calculadas na grade temporal) em CSV
+    """
+    print("\nSalvando dados...")
+    colunas_analise, colunas_completos = colunas_do_recorte(recorte)
+
+    # Série completa tratada (particionada por ano/mês): só as partições que mudaram são regravadas
+    anteriores = checksums_particoes(dir_completos)
+    invalidar_manifesto(dir_completos)
+    gravar_particoes(df[colunas_completos], dir_completos, mesclar=False)
+    remover_particoes(dir_completos, set(zip(df['timestamp'].dt.year, df['timestamp'].dt.month)))
+    relatar_particoes_gravadas(dir_completos, anteriores, hash_texto(*colunas_completos))
+
+    # Somas de prefixo para consultas por período (consultar_periodo.py, comparacao_anos.py)
+    indice = construir_indice_prefixos(grade, series_com_previsao(recorte['coluna_previsao']))
+    gravar_indice_prefixos(caminho_indice_prefixos(dir_completos), indice, assinatura_dataset(dir_completos))
+    print(f"  Salvo: {caminho_indice_prefixos(dir_completos)}")
 
     # CSV com médias diárias
-    df_diario = df.groupby('data').agg({
-        'geracao_total': 'mean',
-        'geracao_referencia_total': 'mean',
-        'NE_UEE': 'mean',
-        'diferenca_geracao': 'mean',
-        'diferenca_referencia': 'mean'
-    }).reset_index()
+    df_diario = medias_diarias(grade, colunas_analise)
+    df_diario.to_csv(f"{output_dir}/dados_diarios.csv", index=False)
+    print(f"  Salvo: {output_dir}/dados_diarios.csv")
+
+def processar_fora_da_memoria(diretorios_fontes, recorte, nomes_detectores, output_dir, dir_completos,
+                              descartados=(), agendador=None):
+    """
+    Mesmo processamento de processar_recorte() sem carregar a série inteira: cada
+    mês é lido das partições, tratado (outliers com estado entre meses), gravado e
+    plotado, e só as médias diárias e mensais ficam acumuladas para o CSV e os
+    gráficos gerais. A série completa é desenhada a partir das médias diárias.
+    Os dias em `descartados` são retirados depois do tratamento de outliers.
+    Os gráficos vão para o `agendador` (serial se não for informado)
+    """
+    print("\nProcessando partição a partição (fora da memória)...")
+    os.makedirs(f"{output_dir}/mensal", exist_ok=True)
+    colunas_analise, colunas_completos = colunas_do_recorte(recorte)
+    series = series_com_previsao(recorte['coluna_previsao'])
+
+    dir_restricao = diretorios_fontes['restricao_eolica']
+    limiar = limiar_outlier(recorte, media_referencia(dir_restricao))
+    detectores = configurar_detectores(nomes_detectores, limiar)
+
+    def meses_combinados():
+        return iterar_meses_combinados(dir_restricao, diretorios_fontes.get('renovaveis'), recorte['coluna_previsao'])
 
+    # Os detectores com contexto (Hampel, valor travado) levam o alcance de um mês para o outro
+    n_outliers = contar_outliers(meses_combinados(), detectores)
+    descricao = ', '.join(f"< {limiar:.0f} MW" if nome == 'limiar' else nome for nome in detectores)
+    print(f"Outliers de referência detectados ({descricao}): {n_outliers}")
+
+    partes = meses_combinados()
+    if n_outliers > 0:
+        partes = tratar_outliers_em_partes(partes, detectores)
+
+    anteriores = checksums_particoes(dir_completos)
+    invalidar_manifesto(dir_completos)
+    if agendador is None:
+        agendador = criar_agendador()
+
+    diarios = []
+    blocos = []
+    meses_com_dados = []
+    df_mensal = {coluna: [] for coluna in series}
+    n_linhas = 0
+    for ano, mes, df_mes in partes:
+        df_mes = descartar_dias(df_mes, descartados)
+        if len(df_mes) == 0:
+            continue
+        calcular_diferencas(df_mes, recorte['coluna_previsao'])
+        gravar_particoes(df_mes[colunas_completos], dir_completos, mesclar=False)
+        n_linhas += len(df_mes)
+
+        grade = criar_grade(df_mes, colunas_analise)
+        diarios.append(medias_diarias(grade, colunas_analise))
+        blocos.append(blocos_diarios(grade, series))
+        meses_com_dados.append(f"{ano}-{mes:02d}")
+        for coluna in series:
+            df_mensal[coluna].append(media_nan(grade['valores'][coluna], eixo=0))
+
+        agendar(agendador, criar_plots_mes, recortar_grade(grade, fatia_mes(grade, ano, mes), list(series)),
+                recorte, ano, mes, output_dir, arquivos=arquivos_plots_mes(output_dir, ano, mes))
+
+    remover_particoes(dir_completos, {tuple(map(int, mes.split('-'))) for mes in meses_com_dados})
+    print(f"\nTotal de registros: {n_linhas}")
+    relatar_particoes_gravadas(dir_completos, anteriores, hash_texto(*colunas_completos))
+    gravar_indice_prefixos(caminho_indice_prefixos(dir_completos), indice_de_blocos(blocos),
+                           assinatura_dataset(dir_completos))
+    print(f"  Salvo: {caminho_indice_prefixos(dir_completos)}")
+
+    df_diario = pd.concat(diarios, ignore_index=True) if diarios else pd.DataFrame(columns=['data'] + colunas_analise)
     df_diario.to_csv(f"{output_dir}/dados_diarios.csv", index=False)
     print(f"  Salvo: {output_dir}/dados_diarios.csv")
+    relatar_memoria('tratamento e plots mensais')
 
-def main():
+    print("\nCriando plots comparativos gerais...")
+    agendar(agendador, criar_grafico_barras_mensal, meses_com_dados,
+            {c: np.array(v) for c, v in df_mensal.items()}, recorte, output_dir,
+            arquivos=[f"{output_dir}/barras_mensal.png"])
+    valores = {coluna: df_diario[coluna].to_numpy() for coluna in series}
+    agendar(agendador, criar_grafico_serie_completa, series_serie_completa(df_diario['data'].to_numpy(), valores),
+            recorte, output_dir, arquivos=[f"{output_dir}/serie_temporal_completa.png"])
+
+def avaliar_previsao(recorte, output_dir, dir_completos):
     """
-    Função principal
+    Atualiza os acumuladores de erro da previsão (só os meses novos ou alterados)
+    e exporta MAE, RMSE, viés e erros normalizados por hora, mês e ano, além da
+    defasagem previsão × geração (correlação cruzada por mês e faixa horária)
     """
+    if recorte['coluna_previsao'] is None:
+        return
+    print(f"\nAvaliando a previsão {recorte['coluna_previsao']}...")
+    celulas = atualizar_metricas(dir_completos, recorte['coluna_previsao'])
+    total = exportar_metricas(celulas, output_dir)
+    for _, linha in total.iterrows():
+        print(f"  vs {linha['par']}: MAE {linha['mae']:.0f} MW, RMSE {linha['rmse']:.0f} MW, "
+              f"viés {linha['vies']:+.0f} MW, nMAE {linha['nmae_pct']:.1f}%")
+
+    resumo, curvas = analisar_defasagem(dir_completos, recorte['coluna_previsao'])
+    if len(resumo) == 0:
+        return
+    resumo.to_csv(f"{output_dir}/defasagem_previsao.csv", index=False, float_format='%.4f')
+    curvas.to_csv(f"{output_dir}/defasagem_curvas.csv", index=False, float_format='%.4f')
+    grafico_defasagem(curvas, recorte['coluna_previsao'], f"{output_dir}/defasagem_previsao.png",
+                      titulo_base=f"{recorte['nome']} - ")
+    historico = resumo[(resumo['periodo'] == 'todos') & (resumo['faixa'] == 'dia inteiro')]
+    for _, linha in historico.iterrows():
+        print(f"  Defasagem vs {linha['par']}: {linha['melhor_defasagem_h']:+.1f} h "
+              f"(correlação {linha['correlacao_maxima']:.3f}; sem defasagem {linha['correlacao_sem_defasagem']:.3f})")
+    print(f"  Salvo: {output_dir}/defasagem_previsao.csv, defasagem_curvas.csv e defasagem_previsao.png")
+
+def imprimir_resumo(recorte, output_dir, dir_completos):
+    """
+    Resumo final dos arquivos gerados
+    """
+    print("\n" + "="*80)
+    print(f"ANÁLISE CONCLUÍDA COM SUCESSO! ({recorte['nome']} - {recorte['descricao']})")
     print("="*80)
-    print("ANÁLISE COMPARATIVA - EÓLICA NORDESTE")
-    print("="*80)
+    print(f"\nResultados salvos em: {output_dir}")
+    print(f"  - Gráfico de barras mensal: {output_dir}/barras_mensal.png")
+    print(f"  - Série temporal completa: {output_dir}/serie_temporal_completa.png")
+    print(f"  - Plots mensais: {output_dir}/mensal/")
+    print(f"  - Série completa (Parquet): {dir_completos}/")
+    print(f"  - Médias diárias: {output_dir}/dados_diarios.csv")
+    if recorte['coluna_previsao'] is not None:
+        print(f"  - Métricas da previsão: {output_dir}/metricas_previsao_{{hora,mes,ano}}.csv")
+
+def parse_args():
+    """
+    Argumentos de linha de comando
+    """
+    parser = argparse.ArgumentParser(description='Análise comparativa - eólica Nordeste')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Força a extração incremental mesmo com cache dentro da validade')
+    parser.add_argument('--sobreposicao-horas', type=float, default=SOBREPOSICAO_HORAS_PADRAO,
+                        help='Janela (h) reextraída antes do watermark para capturar correções '
+                             f'(padrão: {SOBREPOSICAO_HORAS_PADRAO})')
+    parser.add_argument('--reconstruir', action='store_true',
+                        help='Ignora o cache e extrai todo o histórico do banco')
+    parser.add_argument('--validade-horas', type=float, default=VALIDADE_CACHE_HORAS_PADRAO,
+                        help='Idade máxima do cache antes de estendê-lo incrementalmente '
+                             f'(padrão: {VALIDADE_CACHE_HORAS_PADRAO})')
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default='mysql',
+                        help='Origem dos dados: bancos RDS (config_db.py) ou réplica SQLite local')
+    parser.add_argument('--dir-sqlite', default=DIR_SQLITE_PADRAO,
+                        help=f'Diretório dos bancos SQLite locais (padrão: {DIR_SQLITE_PADRAO})')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO_PADRAO,
+                        help=f'Linhas por bloco lidas do banco (padrão: {TAMANHO_BLOCO_PADRAO})')
+    parser.add_argument('--conexoes', type=int, default=CONEXOES_POR_FONTE_PADRAO,
+                        help='Conexões simultâneas por banco na extração em fatias mensais '
+                             f'(padrão: {CONEXOES_POR_FONTE_PADRAO})')
+    parser.add_argument('--tentativas', type=int, default=TENTATIVAS_PADRAO,
+                        help=f'Tentativas por fatia em falhas de conexão (padrão: {TENTATIVAS_PADRAO})')
+    parser.add_argument('--espera-inicial', type=float, default=ESPERA_INICIAL_PADRAO,
+                        help='Espera (s) antes da primeira retentativa; dobra a cada falha '
+                             f'(padrão: {ESPERA_INICIAL_PADRAO})')
+    parser.add_argument('--fora-da-memoria', action='store_true',
+                        help='Processa o armazenamento partição a partição, sem carregar a série inteira')
+    parser.add_argument('--subsistemas', nargs='+', choices=list(SUBSISTEMAS), default=[SUBSISTEMA_PADRAO],
+                        help=f'Subsistemas analisados, cada um em seu processo (padrão: {SUBSISTEMA_PADRAO})')
+    parser.add_argument('--agrupamento', choices=list(AGRUPAMENTOS),
+                        help='Analisa também cada estado ou usina dos subsistemas (sem previsão)')
+    parser.add_argument('--detectores', nargs='+', choices=list(DETECTORES), default=['limiar'],
+                        help='Detectores de outliers da referência, em ordem de prioridade: limiar, '
+                             'Hampel (mediana/MAD por blocos) e valor travado (padrão: limiar)')
+    parser.add_argument('--cobertura-minima', type=float, default=0.0,
+                        help='Descarta os dias em que alguma fonte tem menos desta fração das 48 semi-horas '
+                             '(padrão: 0, nenhum dia descartado)')
+    parser.add_argument('--processos', type=int,
+                        help='Processos simultâneos, um recorte por processo (padrão: número de CPUs)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Processos que renderizam os gráficos de cada recorte, um mês por tarefa '
+                             '(padrão: 1, em série)')
+    parser.add_argument('--redesenhar', action='store_true',
+                        help='Renderiza todos os gráficos, mesmo os cujos dados não mudaram')
+    return parser.parse_args()
+
+def listar_recortes(backend, subsistemas, agrupamento=None):
+    """
+    Recortes a processar: cada subsistema e, com `agrupamento`, também cada
+    estado ou usina dele encontrado no banco
+    """
+    recortes = []
+    for subsistema in subsistemas:
+        recortes.append(criar_recorte(subsistema))
+        if agrupamento is not None:
+            recortes += [criar_recorte(subsistema, agrupamento, grupo)
+                         for grupo in listar_grupos(backend, subsistema, agrupamento)]
+    return recortes
+
+def processar_recorte(recorte, backend, args):
+    """
+    Extração, tratamento e relatórios de um recorte, com armazenamento e
+    resultados no diretório próprio do recorte. Retorna o diretório de saída
+    """
+    print(f"\n### {recorte['nome']} - {recorte['descricao']}")
 
     # Criar diretório de saída
-    output_dir = "resultados"
+    output_dir = diretorio_saida(recorte)
     os.makedirs(output_dir, exist_ok=True)
 
-    # Verificar se existe cache em CSV
-    cache_file = f"{output_dir}/cache_dados_brutos.csv"
-
-    if os.path.exists(cache_file):
-        print(f"\nUsando cache: {cache_file}")
-        print("(Para atualizar do banco, delete este arquivo)")
-        df = pd.read_csv(cache_file)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['data'] = pd.to_datetime(df['data'])
-        df['ano_mes'] = df['timestamp'].dt.to_period('M')
-    else:
-        # Extrair dados do banco
-        df_restricao = extrair_restricao_eolica()
-        df_renovaveis = extrair_renovaveis()
-
-        # Processar (sem tratamento ainda)
-        df_restricao = df_restricao.rename(columns={'din_instante': 'timestamp'})
-        df = pd.merge(df_restricao, df_renovaveis, on='timestamp', how='outer').sort_values('timestamp')
-
-        df['ano'] = df['timestamp'].dt.year
-        df['mes'] = df['timestamp'].dt.month
-        df['dia'] = df['timestamp'].dt.day
-        df['hora'] = df['timestamp'].dt.hour
-        df['minuto'] = df['timestamp'].dt.minute
-        df['data'] = df['timestamp'].dt.date
-        df['ano_mes'] = df['timestamp'].dt.to_period('M')
-
-        # Salvar cache
-        print(f"\nSalvando cache em: {cache_file}")
-        df.to_csv(cache_file, index=False)
+    # Armazenamento colunar: um dataset particionado por fonte
+    dir_dados = f"{output_dir}/dados"
+    os.makedirs(dir_dados, exist_ok=True)
+    fontes = fontes_do_recorte(recorte)
+    diretorios_fontes = {nome_fonte: caminho_dataset(nome_fonte, dir_dados) for nome_fonte in fontes}
+    dir_completos = caminho_dataset('completos', dir_dados)
+
+    # Decidir, pelo manifesto, entre reutilizar, estender ou reconstruir cada fonte
+    print(f"\nVerificando cache em {dir_dados}...")
+    modos = {}
+    for nome_fonte, diretorio in diretorios_fontes.items():
+        modo, motivo = avaliar_cache(diretorio, hash_fonte(fontes[nome_fonte], backend), args.validade_horas)
+        if args.reconstruir:
+            modo, motivo = 'reconstruir', '--reconstruir'
+        elif args.incremental and modo == 'reutilizar':
+            modo, motivo = 'incremental', '--incremental'
+        modos[nome_fonte] = modo
+        print(f"  {nome_fonte}: {modo} ({motivo})")
+
+    atualizar_cache(
+        backend,
+        fontes,
+        diretorios_fontes,
+        modos,
+        sobreposicao_horas=args.sobreposicao_horas,
+        tamanho_bloco=args.tamanho_bloco,
+        conexoes=args.conexoes,
+        tentativas=args.tentativas,
+        espera_inicial=args.espera_inicial
+    )
+
+    descartados = avaliar_qualidade(fontes, diretorios_fontes, dir_dados, output_dir, args.cobertura_minima)
+
+    if args.fora_da_memoria:
+        agendador = criar_agendador(args.jobs, f"{output_dir}/{ARQUIVO_REGISTRO}", args.redesenhar)
+        try:
+            processar_fora_da_memoria(diretorios_fontes, recorte, args.detectores, output_dir, dir_completos,
+                                      descartados, agendador)
+        finally:
+            concluir(agendador)
+        relatar_memoria('visualizações')
+        avaliar_previsao(recorte, output_dir, dir_completos)
+        imprimir_resumo(recorte, output_dir, dir_completos)
+        return output_dir
+
+    df = ler_dataset(diretorios_fontes['restricao_eolica'])
+    if 'renovaveis' in diretorios_fontes:
+        df = combinar_fontes(df, ler_dataset(diretorios_fontes['renovaveis']))
+    relatar_memoria('carga dos dados')
 
     # Aplicar tratamento de outliers
-    df = tratar_outliers_referencia(df)
-
-    # Calcular diferenças
-    df['diferenca_geracao'] = df['geracao_total'] - df['NE_UEE']
-    df['diferenca_referencia'] = df['geracao_referencia_total'] - df['NE_UEE']
+    media = media_nan(df['geracao_referencia_total'].to_numpy(dtype=np.float32), eixo=0)
+    detectores = configurar_detectores(args.detectores, limiar_outlier(recorte, media))
+    df = tratar_outliers_referencia(df, detectores, f"{dir_dados}/{ARQUIVO_CORRECOES}",
+                                    checksums_fontes(diretorios_fontes))
 
-    print(f"\nTotal de registros: {len(df)}")
+    # Descartar os dias incompletos segundo o índice de qualidade
+    df = descartar_dias(df, descartados)
 
-    # Salvar CSVs
-    salvar_dados_csv(df, output_dir)
+    # Calcular diferenças
+    calcular_diferencas(df, recorte['coluna_previsao'])
+
+    print(f"\nTotal de registros: {len(df)} ({memoria_dataframe_mb(df):.1f} MB)")
+
+    # Reindexar uma vez na grade de 30 min: meses e dias passam a ser fatias (views) dos vetores
+    colunas_analise, _ = colunas_do_recorte(recorte)
+    grade = criar_grade(df, colunas_analise)
+    if grade['fora_da_grade']:
+        print(f"  {grade['fora_da_grade']} instantes fora da grade de 30 min ignorados")
+
+    # Salvar dados processados
+    salvar_dados(df, grade, recorte, output_dir, dir_completos)
+    del df
+    relatar_memoria('tratamento')
+
+    # Criar visualizações (com --jobs, em paralelo num pool de processos)
+    agendador = criar_agendador(args.jobs, f"{output_dir}/{ARQUIVO_REGISTRO}", args.redesenhar)
+    try:
+        criar_plots_comparativos_gerais(grade, recorte, output_dir, agendador)
+        criar_plots_mensais(grade, recorte, output_dir, agendador)
+    finally:
+        concluir(agendador)
+    relatar_memoria('visualizações')
+
+    avaliar_previsao(recorte, output_dir, dir_completos)
+    imprimir_resumo(recorte, output_dir, dir_completos)
+    return output_dir
+
+def processar_recorte_em_processo(recorte, backend, args):
+    """
+    processar_recorte() em um processo do pool, com a saída redirecionada para
+    execucao.log no diretório do recorte (para não intercalar os recortes)
+    """
+    output_dir = diretorio_saida(recorte)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(f"{output_dir}/execucao.log", 'w', encoding='utf-8') as log, redirect_stdout(log):
+        return processar_recorte(recorte, backend, args)
 
-    # Criar visualizações
-    criar_plots_comparativos_gerais(df, output_dir)
-    criar_plots_mensais(df, output_dir)
+def main():
+    """
+    Função principal
+    """
+    args = parse_args()
 
-    print("\n" + "="*80)
-    print("ANÁLISE CONCLUÍDA COM SUCESSO!")
     print("="*80)
-    print(f"\nResultados salvos em: {output_dir}")
-    print(f"  - Gráfico de barras mensal: {output_dir}/barras_mensal.png")
-    print(f"  - Série temporal completa: {output_dir}/serie_temporal_completa.png")
-    print(f"  - Plots mensais: {output_dir}/mensal/")
-    print(f"  - Dados CSV: {output_dir}/dados_*.csv")
+    print("ANÁLISE COMPARATIVA - EÓLICA " + ", ".join(args.subsistemas))
+    print("="*80)
+
+    backend = criar_backend(args.backend, args.dir_sqlite)
+    recortes = listar_recortes(backend, args.subsistemas, args.agrupamento)
+
+    if len(recortes) == 1:
+        processar_recorte(recortes[0], backend, args)
+        return
+
+    # Um processo por recorte: extração, tratamento e gráficos de cada um em paralelo
+    processos = min(args.processos or os.cpu_count() or 1, len(recortes))
+    print(f"\nProcessando {len(recortes)} recortes em {processos} processos "
+          f"(saída de cada um em <diretório do recorte>/execucao.log)...")
+    falhas = []
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = {recorte['nome']: executor.submit(processar_recorte_em_processo, recorte, backend, args)
+                   for recorte in recortes}
+        for nome, futuro in futuros.items():
+            try:
+                print(f"  {nome}: concluído em {futuro.result()}/")
+            except Exception as erro:
+                falhas.append(nome)
+                print(f"  {nome}: FALHOU ({type(erro).__name__}: {erro})")
+
+    if falhas:
+        raise SystemExit(f"Recortes com falha: {', '.join(falhas)}")
+    relatar_memoria('todos os recortes')
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,89 @@
+"""
+Script para consultas ad hoc de períodos quaisquer (intervalo livre, semana,
+estação ou o mesmo mês em todos os anos), opcionalmente de uma só hora
+Soma, média e perfil de modulação saem do índice de prefixos gravado ao
+lado da série completa, sem reler a série
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from armazenamento import caminho_dataset, exigir_dataset, ler_manifesto
+from indice_prefixos import obter_indice_prefixos, perfil_modulacao, somar
+from modulacao import series_com_previsao
+
+NOMES_SERIES = {
+    'geracao_total': 'Geração Real',
+    'geracao_referencia_total': 'Geração Referência'
+}
+
+def parse_args():
+    """
+    Argumentos de linha de comando
+    """
+    parser = argparse.ArgumentParser(description='Consulta de períodos quaisquer no índice de prefixos')
+    parser.add_argument('--inicio', help='Início do intervalo (inclusivo), ex.: 2024-06-01')
+    parser.add_argument('--fim', help='Fim do intervalo (exclusivo), ex.: 2024-09-01')
+    parser.add_argument('--mes', type=int, choices=range(1, 13),
+                        help='Em vez de um intervalo, o mesmo mês (1 a 12) em todos os anos')
+    parser.add_argument('--hora', type=int, choices=range(24),
+                        help='Só a hora informada (semi-horas h:00 e h:30)')
+    parser.add_argument('--dir-completos', default=caminho_dataset('completos'),
+                        help='Série completa consultada (padrão: a do NE; outros recortes em '
+                             'resultados/<recorte>/dados/completos)')
+    args = parser.parse_args()
+    if args.mes is None and not (args.inicio and args.fim):
+        parser.error('informe --inicio e --fim, ou --mes')
+    return args
+
+def series_do_dataset(diretorio):
+    """Séries da série completa (com previsão só se houver a coluna)"""
+    colunas = [coluna for coluna in ler_manifesto(diretorio)['colunas'] if coluna != 'timestamp']
+    previsao = next((coluna for coluna in colunas if coluna not in NOMES_SERIES), None)
+    return series_com_previsao(previsao)
+
+def periodos(args, indice):
+    """(rótulo, início, fim) de cada período consultado"""
+    if args.mes is None:
+        return [(f"{args.inicio} a {args.fim}", pd.Timestamp(args.inicio), pd.Timestamp(args.fim))]
+    primeiro = pd.Timestamp(indice['primeiro_dia'], unit='D')
+    ultimo = primeiro + pd.Timedelta(days=max(indice['n_dias'] - 1, 0))
+    return [(str(periodo), periodo.start_time, (periodo + 1).start_time)
+            for periodo in pd.period_range(primeiro, ultimo, freq='M') if periodo.month == args.mes]
+
+def main():
+    """
+    Função principal
+    """
+    args = parse_args()
+    exigir_dataset(args.dir_completos, ['timestamp', 'geracao_total', 'geracao_referencia_total'])
+    series = series_do_dataset(args.dir_completos)
+    indice = obter_indice_prefixos(args.dir_completos, series)
+
+    filtro_hora = '' if args.hora is None else f" - hora {args.hora:02d}:00"
+    perfis = {}
+    for rotulo, inicio, fim in periodos(args, indice):
+        print(f"\n{rotulo}{filtro_hora}")
+        for coluna in series:
+            soma, contagem = somar(indice, coluna, inicio, fim, args.hora)
+            if contagem == 0:
+                print(f"  {NOMES_SERIES.get(coluna, f'Previsão {coluna}')}: sem registros")
+                continue
+            # Semi-horas em MW médios: a energia do período é a soma × 0,5 h
+            print(f"  {NOMES_SERIES.get(coluna, f'Previsão {coluna}')}: média {soma / contagem:.1f} MW, "
+                  f"energia {soma / 2 / 1000:.1f} GWh ({contagem} semi-horas)")
+        perfis[rotulo] = perfil_modulacao(indice, inicio, fim, series).set_index('hora_int')
+
+    # Perfil de modulação (% da média diária) por hora, um bloco de colunas por período
+    perfis = {rotulo: perfil for rotulo, perfil in perfis.items() if len(perfil)}
+    if perfis:
+        tabela = pd.concat(perfis, axis=1)
+        if args.hora is not None:
+            tabela = tabela.loc[[args.hora]] if args.hora in tabela.index else tabela.iloc[:0]
+        print("\nModulação (% da média diária) por hora:")
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(tabela.round(1).replace(np.nan, '-').to_string())
+
+if __name__ == "__main__":
+    main()
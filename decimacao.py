@@ -0,0 +1,108 @@
+"""
+Decimação visual de séries longas antes de plotar
+A imagem tem largura fixa em pixels, então desenhar cada semi-hora de anos
+de histórico só custa tempo. Cada série é reduzida por colunas de pixel
+(intervalos iguais do eixo X): 'min_max' mantém, em cada coluna, o ponto de
+mínimo e o de máximo na ordem do tempo — a linha desenhada cobre exatamente
+a mesma faixa vertical da série inteira —; 'lttb' (Largest-Triangle-Three-
+Buckets) escolhe um ponto por coluna, o que forma o maior triângulo com os
+vizinhos, e preserva melhor a forma em linhas finas. Os pontos devolvidos
+são pontos da série original; colunas só com NaN viram um NaN (a lacuna
+continua quebrando a linha). O custo de desenho passa a depender só da
+largura da figura
+"""
+import numpy as np
+
+# Método padrão de decimação
+METODO_PADRAO = 'min_max'
+
+def colunas_da_largura(polegadas, dpi):
+    """Colunas de pixel de uma figura de `polegadas` de largura salva com `dpi` (limite para qualquer eixo dela)"""
+    return int(np.ceil(polegadas * dpi))
+
+def eixo_numerico(x):
+    """Eixo X em números (datas em segundos) para dividir em colunas"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[s]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+def colunas_de_pixel(x, colunas):
+    """Coluna de pixel (0..colunas-1) de cada ponto, em intervalos iguais de x"""
+    numerico = eixo_numerico(x)
+    largura = numerico[-1] - numerico[0]
+    if largura <= 0:
+        return np.zeros(len(numerico), dtype=np.int64)
+    return np.minimum(((numerico - numerico[0]) / largura * colunas).astype(np.int64), colunas - 1)
+
+def reduzir_min_max(x, y, colunas):
+    """Índices do mínimo e do máximo de cada coluna de pixel, em ordem (x crescente)"""
+    coluna = colunas_de_pixel(x, colunas)
+    inicios = np.flatnonzero(np.r_[True, coluna[1:] != coluna[:-1]])
+    tamanhos = np.diff(np.r_[inicios, len(coluna)])
+    # fmin/fmax ignoram NaN: só dá NaN a coluna sem nenhum valor, que fica com um ponto NaN (mantém a lacuna)
+    with np.errstate(invalid='ignore'):
+        minimos, maximos = np.fmin.reduceat(y, inicios), np.fmax.reduceat(y, inicios)
+    indices = [inicios[np.isnan(minimos)]]
+    for extremos in (minimos, maximos):
+        posicoes = np.flatnonzero(y == np.repeat(extremos, tamanhos))
+        _, primeiras = np.unique(coluna[posicoes], return_index=True)
+        indices.append(posicoes[primeiras])
+    return np.unique(np.concatenate(indices))
+
+def reduzir_lttb(x, y, colunas):
+    """
+    Índices escolhidos pelo LTTB: o primeiro e o último ponto e, em cada
+    coluna de pixel entre eles, o que forma o maior triângulo com o ponto
+    escolhido na coluna anterior e a média da coluna seguinte
+    """
+    validos = np.flatnonzero(~np.isnan(y))
+    if len(validos) <= 2:
+        return validos
+    numerico = eixo_numerico(x)
+    coluna = colunas_de_pixel(x[validos], colunas)
+    inicios = np.flatnonzero(np.r_[True, coluna[1:] != coluna[:-1]])
+    fins = np.r_[inicios[1:], len(coluna)]
+    xv, yv = numerico[validos], y[validos].astype(np.float64)
+
+    escolhidos = [0]
+    for i in range(len(inicios)):
+        inicio, fim = max(inicios[i], 1), min(fins[i], len(validos) - 1)
+        if inicio >= fim:
+            continue
+        anterior = escolhidos[-1]
+        proximo = slice(fim, fins[i + 1] if i + 1 < len(inicios) else len(validos))
+        x_medio, y_medio = xv[proximo].mean(), yv[proximo].mean()
+        area = np.abs((xv[anterior] - x_medio) * (yv[inicio:fim] - yv[anterior])
+                      - (xv[anterior] - xv[inicio:fim]) * (y_medio - yv[anterior]))
+        escolhidos.append(inicio + int(np.argmax(area)))
+    escolhidos.append(len(validos) - 1)
+    indices = validos[np.unique(escolhidos)]
+
+    # Lacunas: o primeiro NaN entre dois pontos escolhidos, se houver, para a linha continuar quebrada
+    nulos = np.flatnonzero(np.isnan(y))
+    if len(nulos) == 0:
+        return indices
+    primeiro_nulo = nulos[np.minimum(np.searchsorted(nulos, indices[:-1]), len(nulos) - 1)]
+    nan_entre = primeiro_nulo[(primeiro_nulo > indices[:-1]) & (primeiro_nulo < indices[1:])]
+    return np.sort(np.concatenate([indices, nan_entre]))
+
+def decimar(x, y, colunas, metodo=METODO_PADRAO):
+    """
+    Série (x, y) reduzida a no máximo ~2 pontos ('min_max') ou 1 ponto ('lttb')
+    por coluna de pixel; séries que já cabem nas colunas voltam inteiras
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if len(y) <= 2 * colunas:
+        return x, y
+    if metodo == 'min_max':
+        indices = reduzir_min_max(x, y, colunas)
+    elif metodo == 'lttb':
+        indices = reduzir_lttb(x, y, colunas)
+    else:
+        raise ValueError(f"Método de decimação desconhecido: {metodo}")
+    return x[indices], y[indices]
+
+def decimar_series(x, valores, colunas, metodo=METODO_PADRAO):
+    """Cada série de `valores` ({coluna: y}, todas sobre o mesmo x) decimada: {coluna: (x, y)}"""
+    return {coluna: decimar(x, y, colunas, metodo) for coluna, y in valores.items()}
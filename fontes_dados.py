@@ -0,0 +1,404 @@
+"""
+Camada de acesso às fontes de dados (middle.tbl_restricao_eolica e dessem.tbl_renovaveis)
+Backends disponíveis:
+  - mysql: bancos RDS configurados em config_db.py (pymysql, cursor não-bufferizado)
+  - sqlite: réplica local com o mesmo esquema, criada por gerar_dados_sinteticos.py
+"""
+import functools
+import os
+import queue
+import random
+import re
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+import pandas as pd
+import pymysql
+
+# Linhas por bloco lidas do cursor não-bufferizado
+TAMANHO_BLOCO_PADRAO = 50000
+
+# Tentativas por fatia e espera (s) antes da primeira retentativa; a espera dobra a cada falha
+TENTATIVAS_PADRAO = 5
+ESPERA_INICIAL_PADRAO = 2.0
+ESPERA_MAXIMA = 60.0
+
+# Falhas de conexão/tempo esgotado que justificam uma nova tentativa
+ERROS_TRANSITORIOS = (
+    pymysql.err.OperationalError,
+    pymysql.err.InterfaceError,
+    sqlite3.OperationalError,
+    ConnectionError,
+    TimeoutError
+)
+
+# Diretório padrão dos bancos SQLite locais (middle.sqlite e dessem.sqlite)
+DIR_SQLITE_PADRAO = 'dados_locais'
+
+# Subsistemas do SIN; a previsão de cada um é a coluna <subsistema>_UEE de tbl_renovaveis
+SUBSISTEMAS = {
+    'NE': 'Nordeste',
+    'SE': 'Sudeste/Centro-Oeste',
+    'S': 'Sul',
+    'N': 'Norte'
+}
+SUBSISTEMA_PADRAO = 'NE'
+
+# Agrupamentos opcionais dentro de um subsistema (coluna de tbl_restricao_eolica).
+# A previsão só existe por subsistema, então os grupos são analisados sem ela
+AGRUPAMENTOS = {
+    'estado': 'id_estado',
+    'usina': 'nom_usina'
+}
+
+# Diretório de resultados; o Nordeste fica na raiz e os demais recortes em subdiretórios
+DIR_RESULTADOS = 'resultados'
+
+# Modelos das fontes de dados extraídas do banco; {filtro_recorte} e
+# {coluna_previsao} são preenchidos por fontes_do_recorte
+MODELOS_FONTES = {
+    'restricao_eolica': {
+        'descricao': 'restrição eólica',
+        'banco': 'middle',
+        'coluna_tempo': 'din_instante',
+        'query': """
+    SELECT
+        din_instante,
+        SUM(val_geracao) as geracao_total,
+        SUM(val_geracaoreferencia) as geracao_referencia_total
+    FROM tbl_restricao_eolica
+    WHERE {filtro_recorte}
+        AND din_instante IS NOT NULL
+        AND val_geracao IS NOT NULL
+        {filtro_periodo}
+    GROUP BY din_instante
+    ORDER BY din_instante
+    """,
+        'query_limites': """
+    SELECT MIN(din_instante), MAX(din_instante)
+    FROM tbl_restricao_eolica
+    WHERE {filtro_recorte}
+        AND val_geracao IS NOT NULL
+    """,
+        'tipos': {
+            'geracao_total': 'float64',
+            'geracao_referencia_total': 'float64'
+        }
+    },
+    'renovaveis': {
+        'descricao': 'previsão eólica',
+        'banco': 'dessem',
+        'coluna_tempo': 'timestamp',
+        'query': """
+    SELECT
+        timestamp,
+        {coluna_previsao}
+    FROM tbl_renovaveis
+    WHERE timestamp IS NOT NULL
+        AND {coluna_previsao} IS NOT NULL
+        {filtro_periodo}
+    ORDER BY timestamp
+    """,
+        'query_limites': """
+    SELECT MIN(timestamp), MAX(timestamp)
+    FROM tbl_renovaveis
+    WHERE {coluna_previsao} IS NOT NULL
+    """,
+        'tipos': {
+            '{coluna_previsao}': 'float64'
+        }
+    }
+}
+
+def criar_recorte(subsistema=SUBSISTEMA_PADRAO, agrupamento=None, grupo=None):
+    """
+    Recorte analisado: um subsistema inteiro (com a sua previsão) ou um grupo
+    (estado ou usina) dentro dele, sem previsão
+    """
+    if subsistema not in SUBSISTEMAS:
+        raise ValueError(f"Subsistema desconhecido: {subsistema}")
+    if agrupamento is None:
+        return {
+            'nome': subsistema,
+            'descricao': SUBSISTEMAS[subsistema],
+            'subsistema': subsistema,
+            'agrupamento': None,
+            'grupo': None,
+            'coluna_previsao': f"{subsistema}_UEE"
+        }
+    if agrupamento not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento desconhecido: {agrupamento}")
+    return {
+        'nome': f"{subsistema}/{agrupamento}/{grupo}",
+        'descricao': f"{SUBSISTEMAS[subsistema]} - {grupo}",
+        'subsistema': subsistema,
+        'agrupamento': agrupamento,
+        'grupo': grupo,
+        'coluna_previsao': None
+    }
+
+def diretorio_saida(recorte):
+    """
+    Diretório de resultados de um recorte: resultados/ para o NE,
+    resultados/<subsistema>/ e resultados/<subsistema>/<agrupamento>/<grupo>/ para os demais
+    """
+    if recorte['nome'] == SUBSISTEMA_PADRAO:
+        return DIR_RESULTADOS
+    partes = [re.sub(r'[^\w.-]+', '_', parte) for parte in recorte['nome'].split('/')]
+    return '/'.join([DIR_RESULTADOS] + partes)
+
+def fontes_do_recorte(recorte):
+    """
+    Fontes de dados de um recorte, {nome_fonte: fonte} preenchidas a partir de
+    MODELOS_FONTES. Grupos sem previsão têm só a restrição eólica; o valor do
+    grupo vai como parâmetro
+    """
+    filtro_recorte = f"id_subsistema = '{recorte['subsistema']}'"
+    params = []
+    if recorte['agrupamento'] is not None:
+        filtro_recorte += f"\n        AND {AGRUPAMENTOS[recorte['agrupamento']]} = %s"
+        params.append(recorte['grupo'])
+
+    fontes = {}
+    for nome_fonte, modelo in MODELOS_FONTES.items():
+        if nome_fonte == 'renovaveis' and recorte['coluna_previsao'] is None:
+            continue
+        campos = {'filtro_recorte': filtro_recorte, 'coluna_previsao': recorte['coluna_previsao'],
+                  'filtro_periodo': '{filtro_periodo}'}
+        fontes[nome_fonte] = dict(
+            modelo,
+            nome=nome_fonte,
+            recorte=recorte['nome'],
+            query=modelo['query'].format(**campos),
+            query_limites=modelo['query_limites'].format(**campos),
+            tipos={coluna.format(**campos): tipo for coluna, tipo in modelo['tipos'].items()},
+            params=params if nome_fonte == 'restricao_eolica' else []
+        )
+    return fontes
+
+# Esquema das tabelas na réplica local (mesmas colunas usadas nos bancos RDS)
+ESQUEMA_SQLITE = {
+    'middle': [
+        """
+    CREATE TABLE IF NOT EXISTS tbl_restricao_eolica (
+        id_subsistema TEXT NOT NULL,
+        id_estado TEXT NOT NULL,
+        nom_usina TEXT NOT NULL,
+        id_ons TEXT NOT NULL,
+        din_instante TEXT NOT NULL,
+        val_geracao REAL,
+        val_geracaoreferencia REAL
+    )
+    """,
+        """
+    CREATE INDEX IF NOT EXISTS idx_restricao_subsistema_instante
+    ON tbl_restricao_eolica (id_subsistema, din_instante)
+    """
+    ],
+    'dessem': [
+        """
+    CREATE TABLE IF NOT EXISTS tbl_renovaveis (
+        timestamp TEXT NOT NULL PRIMARY KEY,
+        NE_UEE REAL,
+        SE_UEE REAL,
+        S_UEE REAL,
+        N_UEE REAL
+    )
+    """
+    ]
+}
+
+def criar_backend(nome='mysql', dir_sqlite=DIR_SQLITE_PADRAO):
+    """
+    Descrição do backend de dados ('mysql' ou 'sqlite'), passada às funções de extração
+    """
+    if nome not in ('mysql', 'sqlite'):
+        raise ValueError(f"Backend desconhecido: {nome}")
+    return {'nome': nome, 'dir_sqlite': dir_sqlite}
+
+def arquivo_sqlite(backend, banco):
+    """Arquivo SQLite local de um banco (middle ou dessem)"""
+    return f"{backend['dir_sqlite']}/{banco}.sqlite"
+
+def conectar(backend, banco):
+    """
+    Abre conexão com o banco ('middle' ou 'dessem'). No MySQL usa cursor
+    não-bufferizado (SSCursor): as linhas são lidas do servidor sob demanda,
+    sem carregar o resultado inteiro no cliente
+    """
+    if backend['nome'] == 'sqlite':
+        arquivo = arquivo_sqlite(backend, banco)
+        if not os.path.exists(arquivo):
+            raise FileNotFoundError(f"{arquivo} não encontrado. Gere-o com gerar_dados_sinteticos.py")
+        return sqlite3.connect(arquivo, check_same_thread=False)
+
+    # Importar configurações de banco de dados apenas quando o MySQL for usado
+    from config_db import DB_CONFIG_MIDDLE, DB_CONFIG_DESSEM
+    db_config = {'middle': DB_CONFIG_MIDDLE, 'dessem': DB_CONFIG_DESSEM}[banco]
+    return pymysql.connect(**db_config, cursorclass=pymysql.cursors.SSCursor)
+
+def adaptar_consulta(backend, query):
+    """Troca o marcador de parâmetros do pymysql (%s) pelo do sqlite3 (?)"""
+    if backend['nome'] == 'sqlite':
+        return query.replace('%s', '?')
+    return query
+
+def criar_esquema_sqlite(backend):
+    """Cria os bancos SQLite locais e suas tabelas, se ainda não existirem"""
+    os.makedirs(backend['dir_sqlite'], exist_ok=True)
+    for banco, comandos in ESQUEMA_SQLITE.items():
+        with closing(sqlite3.connect(arquivo_sqlite(backend, banco))) as conn:
+            for comando in comandos:
+                conn.execute(comando)
+            conn.commit()
+
+def criar_pool_conexoes(tamanho):
+    """
+    Pool simples de conexões; as conexões são abertas sob demanda
+    """
+    pool = queue.Queue()
+    for _ in range(tamanho):
+        pool.put(None)
+    return pool
+
+@contextmanager
+def conexao_do_pool(pool, backend, banco):
+    """
+    Empresta uma conexão do pool. Conexões que falharem são descartadas
+    """
+    conn = pool.get()
+    try:
+        if conn is None:
+            conn = conectar(backend, banco)
+        yield conn
+    except Exception:
+        if conn is not None:
+            conn.close()
+            conn = None
+        raise
+    finally:
+        pool.put(conn)
+
+def fechar_pool(pool):
+    """
+    Fecha todas as conexões abertas do pool
+    """
+    while not pool.empty():
+        conn = pool.get_nowait()
+        if conn is not None:
+            conn.close()
+
+def com_retentativas(funcao, tentativas=TENTATIVAS_PADRAO, espera_inicial=ESPERA_INICIAL_PADRAO):
+    """
+    Envolve `funcao` para repeti-la após falhas transitórias (queda de conexão,
+    tempo esgotado), com espera exponencial e jitter entre as tentativas
+    """
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        for tentativa in range(1, tentativas + 1):
+            try:
+                return funcao(*args, **kwargs)
+            except ERROS_TRANSITORIOS as erro:
+                if tentativa == tentativas:
+                    raise
+                espera = min(espera_inicial * 2 ** (tentativa - 1), ESPERA_MAXIMA)
+                espera *= random.uniform(0.5, 1.0)
+                print(f"  Falha em {funcao.__name__} (tentativa {tentativa}/{tentativas}): {erro}. "
+                      f"Nova tentativa em {espera:.1f} s")
+                time.sleep(espera)
+    return executar
+
+def consultar_em_blocos(backend, conn, query, params=None, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """
+    Executa a consulta e gera DataFrames de até `tamanho_bloco` linhas
+    """
+    with closing(conn.cursor()) as cursor:
+        cursor.execute(adaptar_consulta(backend, query), params or ())
+        colunas = [descricao[0] for descricao in cursor.description]
+        while True:
+            linhas = cursor.fetchmany(tamanho_bloco)
+            if not linhas:
+                break
+            yield pd.DataFrame.from_records(linhas, columns=colunas)
+
+def extrair_fonte_em_blocos(fonte, backend, conn, inicio=None, fim=None,
+                            tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """
+    Gera blocos tipados de uma fonte ('timestamp' em datetime64, valores em float)
+    restritos ao intervalo [inicio, fim) quando informado
+    """
+    coluna_tempo = fonte['coluna_tempo']
+
+    filtros = []
+    params = list(fonte['params'])
+    if inicio is not None:
+        filtros.append(f"AND {coluna_tempo} >= %s")
+        params.append(inicio.strftime('%Y-%m-%d %H:%M:%S'))
+    if fim is not None:
+        filtros.append(f"AND {coluna_tempo} < %s")
+        params.append(fim.strftime('%Y-%m-%d %H:%M:%S'))
+    query = fonte['query'].format(filtro_periodo="\n        ".join(filtros))
+
+    for bloco in consultar_em_blocos(backend, conn, query, params, tamanho_bloco):
+        bloco = bloco.rename(columns={coluna_tempo: 'timestamp'})
+        bloco['timestamp'] = pd.to_datetime(bloco['timestamp'])
+        yield bloco.astype(fonte['tipos'])
+
+def dataframe_vazio(fonte):
+    """
+    DataFrame sem linhas com as colunas e tipos da fonte
+    """
+    colunas = {'timestamp': pd.Series(dtype='datetime64[ns]')}
+    colunas.update({coluna: pd.Series(dtype=tipo) for coluna, tipo in fonte['tipos'].items()})
+    return pd.DataFrame(colunas)
+
+def extrair_fatia(fonte, backend, pool, inicio, fim, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """
+    Extrai uma fatia [inicio, fim) de uma fonte usando uma conexão do pool
+    """
+    with conexao_do_pool(pool, backend, fonte['banco']) as conn:
+        blocos = list(extrair_fonte_em_blocos(fonte, backend, conn, inicio, fim, tamanho_bloco))
+    if not blocos:
+        return dataframe_vazio(fonte)
+    return pd.concat(blocos, ignore_index=True)
+
+def consultar_limites(fonte, backend, pool):
+    """
+    Primeiro e último instante disponíveis no banco para a fonte
+    """
+    with conexao_do_pool(pool, backend, fonte['banco']) as conn:
+        with closing(conn.cursor()) as cursor:
+            cursor.execute(adaptar_consulta(backend, fonte['query_limites']), fonte['params'])
+            minimo, maximo = cursor.fetchone()
+    if minimo is None:
+        return None, None
+    return pd.Timestamp(minimo), pd.Timestamp(maximo)
+
+def listar_grupos(backend, subsistema, agrupamento):
+    """Estados ou usinas com geração registrada no subsistema, em ordem"""
+    coluna = AGRUPAMENTOS[agrupamento]
+    query = f"""
+    SELECT DISTINCT {coluna}
+    FROM tbl_restricao_eolica
+    WHERE id_subsistema = %s
+        AND val_geracao IS NOT NULL
+    ORDER BY {coluna}
+    """
+    with closing(conectar(backend, 'middle')) as conn:
+        with closing(conn.cursor()) as cursor:
+            cursor.execute(adaptar_consulta(backend, query), (subsistema,))
+            return [linha[0] for linha in cursor.fetchall()]
+
+def consultar_recorte(backend, recorte, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """
+    Somas semi-horárias de cada fonte do recorte lidas direto do banco, sem o
+    armazenamento local: {nome_fonte: DataFrame}. A soma das usinas do recorte
+    é feita no servidor, com as mesmas consultas da extração
+    """
+    dfs = {}
+    for nome_fonte, fonte in fontes_do_recorte(recorte).items():
+        with closing(conectar(backend, fonte['banco'])) as conn:
+            blocos = list(extrair_fonte_em_blocos(fonte, backend, conn, tamanho_bloco=tamanho_bloco))
+        dfs[nome_fonte] = pd.concat(blocos, ignore_index=True) if blocos else dataframe_vazio(fonte)
+    return dfs
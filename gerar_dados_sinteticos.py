@@ -0,0 +1,234 @@
+"""
+Script para gerar uma réplica local (SQLite) dos bancos middle e dessem
+com séries eólicas semi-horárias sintéticas, por usina, para testar e
+medir o pipeline sem acesso aos bancos RDS
+
+A série de cada subsistema combina:
+  - sazonalidade anual e modulação diária (pico noturno no NE)
+  - variação climática lenta (processo AR(1))
+  - eventos de restrição (val_geracao abaixo da referência)
+  - lacunas de dados (blocos de instantes ausentes)
+  - outliers de referência (soma do subsistema abaixo de 1000 MW)
+"""
+import argparse
+import os
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from fontes_dados import DIR_SQLITE_PADRAO, arquivo_sqlite, conectar, criar_backend, criar_esquema_sqlite
+
+# Parâmetros de cada subsistema
+PERFIS_SUBSISTEMAS = {
+    'NE': {
+        'capacidade_mw': 26000,
+        'estados': ['BA', 'RN', 'CE', 'PI', 'PE', 'PB'],
+        'fator_capacidade': 0.40,
+        'amplitude_sazonal': 0.35,
+        'pico_sazonal_dia': 245,    # início de setembro
+        'amplitude_diaria': 0.25,
+        'pico_diario_hora': 21
+    },
+    'SE': {
+        'capacidade_mw': 900,
+        'estados': ['MG', 'RJ'],
+        'fator_capacidade': 0.35,
+        'amplitude_sazonal': 0.25,
+        'pico_sazonal_dia': 230,
+        'amplitude_diaria': 0.20,
+        'pico_diario_hora': 16
+    },
+    'S': {
+        'capacidade_mw': 2200,
+        'estados': ['RS', 'SC'],
+        'fator_capacidade': 0.38,
+        'amplitude_sazonal': 0.20,
+        'pico_sazonal_dia': 300,
+        'amplitude_diaria': 0.15,
+        'pico_diario_hora': 15
+    },
+    'N': {
+        'capacidade_mw': 700,
+        'estados': ['MA'],
+        'fator_capacidade': 0.42,
+        'amplitude_sazonal': 0.40,
+        'pico_sazonal_dia': 255,
+        'amplitude_diaria': 0.20,
+        'pico_diario_hora': 20
+    }
+}
+
+def processo_ar1(rng, n, phi, sigma):
+    """Série AR(1) de média zero e variância estacionária sigma²"""
+    ruido = rng.normal(0, sigma * np.sqrt(1 - phi ** 2), n)
+    serie = np.empty(n)
+    serie[0] = rng.normal(0, sigma)
+    for i in range(1, n):
+        serie[i] = phi * serie[i - 1] + ruido[i]
+    return serie
+
+def fator_capacidade(rng, instantes, perfil):
+    """Fator de capacidade semi-horário do subsistema (sazonal × diário × clima)"""
+    dia_ano = instantes.dayofyear.to_numpy()
+    hora = instantes.hour.to_numpy() + instantes.minute.to_numpy() / 60.0
+
+    sazonal = 1 + perfil['amplitude_sazonal'] * np.cos(2 * np.pi * (dia_ano - perfil['pico_sazonal_dia']) / 365.25)
+    diario = 1 + perfil['amplitude_diaria'] * np.cos(2 * np.pi * (hora - perfil['pico_diario_hora']) / 24)
+    clima = np.exp(processo_ar1(rng, len(instantes), phi=0.995, sigma=0.3))
+
+    return np.clip(perfil['fator_capacidade'] * sazonal * diario * clima, 0.0, 0.95)
+
+def mascara_lacunas(rng, n, prob_dia, max_horas):
+    """Máscara de instantes presentes, com blocos ausentes de até `max_horas`"""
+    presente = np.ones(n, dtype=bool)
+    n_lacunas = rng.binomial(n // 48, prob_dia)
+    for inicio in rng.integers(0, n, n_lacunas):
+        presente[inicio:inicio + rng.integers(1, 2 * max_horas + 1)] = False
+    return presente
+
+def fator_restricao(rng, instantes, prob_dia):
+    """
+    Fração da referência efetivamente gerada: eventos diários de restrição
+    (janelas de 2 a 8 h entre 9h e 20h) e pequenas perdas no restante
+    """
+    n = len(instantes)
+    fator = 1 - rng.uniform(0, 0.02, n)
+    dias = instantes.normalize()
+    inicio_dia = np.flatnonzero(np.r_[True, dias[1:] != dias[:-1]])
+    for inicio in inicio_dia[rng.random(len(inicio_dia)) < prob_dia]:
+        inicio_evento = inicio + 2 * rng.integers(9, 21)
+        fim_evento = inicio_evento + 2 * rng.integers(2, 9)
+        fator[inicio_evento:fim_evento] *= rng.uniform(0.4, 0.9)
+    return fator
+
+def criar_usinas(rng, subsistema, perfil, n_usinas):
+    """Usinas do subsistema: estado, nome, código ONS e participação na capacidade"""
+    participacao = rng.dirichlet(np.full(n_usinas, 2.0))
+    return [
+        {
+            'id_estado': perfil['estados'][i % len(perfil['estados'])],
+            'nom_usina': f"EOL {subsistema} {i + 1:03d}",
+            'id_ons': f"{subsistema}EOL{i + 1:04d}",
+            'participacao': participacao[i]
+        }
+        for i in range(n_usinas)
+    ]
+
+def gerar(destino, inicio, fim, subsistemas, n_usinas, semente, prob_restricao, prob_lacuna, prob_outlier):
+    """Gera e grava as séries sintéticas mês a mês"""
+    rng = np.random.default_rng(semente)
+    backend = criar_backend('sqlite', destino)
+    criar_esquema_sqlite(backend)
+
+    instantes = pd.date_range(inicio, fim, freq='30min', inclusive='left')
+    n = len(instantes)
+    print(f"Período: {instantes[0]} a {instantes[-1]} ({n} instantes)")
+
+    series = {}
+    for subsistema in subsistemas:
+        perfil = PERFIS_SUBSISTEMAS[subsistema]
+        referencia = perfil['capacidade_mw'] * fator_capacidade(rng, instantes, perfil)
+
+        # Outliers: referência do subsistema inteiro quase zerada em instantes isolados
+        outlier = rng.random(n) < prob_outlier
+        fator_ref = np.where(outlier, rng.uniform(0.0, 0.02, n), 1.0)
+
+        # Previsão: referência defasada em 1 h com erro multiplicativo persistente
+        previsao = np.roll(referencia, 2) * (1 + processo_ar1(rng, n, phi=0.97, sigma=0.08))
+
+        series[subsistema] = {
+            'usinas': criar_usinas(rng, subsistema, perfil, n_usinas),
+            'referencia': referencia,
+            'fator_ref': fator_ref,
+            'restricao': fator_restricao(rng, instantes, prob_restricao),
+            'presente': mascara_lacunas(rng, n, prob_lacuna, max_horas=12),
+            'previsao': np.maximum(previsao, 0.0)
+        }
+        print(f"  {subsistema}: {n_usinas} usinas, {outlier.sum()} outliers de referência, "
+              f"{(~series[subsistema]['presente']).sum()} instantes ausentes")
+
+    presente_previsao = mascara_lacunas(rng, n, prob_lacuna, max_horas=12)
+    textos = instantes.strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+    meses = instantes.year * 100 + instantes.month
+    limites_meses = np.flatnonzero(np.r_[True, meses[1:] != meses[:-1], True])
+
+    with closing(conectar(backend, 'middle')) as conn_middle, \
+         closing(conectar(backend, 'dessem')) as conn_dessem:
+        for ini, fim_mes in zip(limites_meses[:-1], limites_meses[1:]):
+            linhas_middle = []
+            for subsistema, serie in series.items():
+                indices = np.arange(ini, fim_mes)[serie['presente'][ini:fim_mes]]
+                for usina in serie['usinas']:
+                    ruido = 1 + rng.normal(0, 0.08, len(indices))
+                    ref = np.maximum(serie['referencia'][indices] * usina['participacao'] * ruido, 0.0)
+                    ger = ref * serie['restricao'][indices]
+                    ref = ref * serie['fator_ref'][indices]
+                    linhas_middle.extend(zip(
+                        [subsistema] * len(indices), [usina['id_estado']] * len(indices),
+                        [usina['nom_usina']] * len(indices), [usina['id_ons']] * len(indices),
+                        textos[indices], np.round(ger, 3).tolist(), np.round(ref, 3).tolist()
+                    ))
+
+            indices = np.arange(ini, fim_mes)[presente_previsao[ini:fim_mes]]
+            colunas_previsao = [
+                np.round(series[s]['previsao'][indices], 3).tolist() if s in series else [None] * len(indices)
+                for s in ('NE', 'SE', 'S', 'N')
+            ]
+            linhas_dessem = list(zip(textos[indices], *colunas_previsao))
+
+            conn_middle.executemany(
+                "INSERT INTO tbl_restricao_eolica (id_subsistema, id_estado, nom_usina, id_ons, din_instante, "
+                "val_geracao, val_geracaoreferencia) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                linhas_middle
+            )
+            conn_dessem.executemany(
+                "INSERT OR REPLACE INTO tbl_renovaveis (timestamp, NE_UEE, SE_UEE, S_UEE, N_UEE) "
+                "VALUES (?, ?, ?, ?, ?)",
+                linhas_dessem
+            )
+            conn_middle.commit()
+            conn_dessem.commit()
+            print(f"  {instantes[ini]:%Y-%m}: {len(linhas_middle)} linhas (middle), "
+                  f"{len(linhas_dessem)} linhas (dessem)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera bancos SQLite locais com dados eólicos sintéticos')
+    parser.add_argument('--destino', default=DIR_SQLITE_PADRAO,
+                        help=f'Diretório dos bancos SQLite (padrão: {DIR_SQLITE_PADRAO})')
+    parser.add_argument('--inicio', default='2021-10-01', help='Primeiro dia (padrão: 2021-10-01)')
+    parser.add_argument('--fim', default='2025-11-01', help='Dia seguinte ao último (padrão: 2025-11-01)')
+    parser.add_argument('--subsistemas', nargs='+', default=['NE'], choices=sorted(PERFIS_SUBSISTEMAS),
+                        help='Subsistemas gerados (padrão: NE)')
+    parser.add_argument('--usinas', type=int, default=20, help='Usinas por subsistema (padrão: 20)')
+    parser.add_argument('--semente', type=int, default=42, help='Semente aleatória (padrão: 42)')
+    parser.add_argument('--prob-restricao', type=float, default=0.15,
+                        help='Probabilidade diária de evento de restrição (padrão: 0.15)')
+    parser.add_argument('--prob-lacuna', type=float, default=0.01,
+                        help='Probabilidade diária de lacuna de dados (padrão: 0.01)')
+    parser.add_argument('--prob-outlier', type=float, default=0.002,
+                        help='Probabilidade por instante de outlier de referência (padrão: 0.002)')
+    parser.add_argument('--substituir', action='store_true', help='Apaga os bancos locais existentes')
+    args = parser.parse_args()
+
+    print("="*80)
+    print("GERAÇÃO DE DADOS SINTÉTICOS")
+    print("="*80)
+
+    backend = criar_backend('sqlite', args.destino)
+    for banco in ('middle', 'dessem'):
+        arquivo = arquivo_sqlite(backend, banco)
+        if os.path.exists(arquivo):
+            if not args.substituir:
+                raise SystemExit(f"{arquivo} já existe (use --substituir para recriar)")
+            os.remove(arquivo)
+
+    gerar(args.destino, args.inicio, args.fim, args.subsistemas, args.usinas, args.semente,
+          args.prob_restricao, args.prob_lacuna, args.prob_outlier)
+
+    print(f"\nBancos gravados em: {args.destino}/")
+    print("Para usar: python comparacao_eolica_ne.py --backend sqlite"
+          + (f" --dir-sqlite {args.destino}" if args.destino != DIR_SQLITE_PADRAO else ""))
+
+if __name__ == "__main__":
+    main()
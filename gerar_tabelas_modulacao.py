@@ -1,81 +1,84 @@
 """
 Script para gerar tabelas de modulação por mês
-Cria 3 tabelas HTML mostrando modulação por hora para cada mês
+Cria 3 tabelas HTML mostrando modulação por hora para cada mês (2 nos
+recortes sem previsão)
 """
-import pandas as pd
-import numpy as np
-
-# Carregar dados
-df = pd.read_csv('resultados/dados_completos.csv')
-df['timestamp'] = pd.to_datetime(df['timestamp'])
-df['data'] = pd.to_datetime(df['data'])
-
-# Calcular modulação para todos os meses
-def calcular_modulacao_mensal(df):
-    """Calcula modulação por mês e hora"""
-
-    # Adicionar colunas necessárias
-    df['ano_mes'] = df['timestamp'].dt.to_period('M').astype(str)
-    df['hora'] = df['timestamp'].dt.hour
-    df['minuto'] = df['timestamp'].dt.minute
-    df['hora_decimal'] = df['hora'] + df['minuto'] / 60.0
+import argparse
+import os
 
-    # Calcular médias diárias para cada dia
-    df['data_str'] = df['timestamp'].dt.date
-    medias_diarias = df.groupby(['ano_mes', 'data_str']).agg({
-        'geracao_total': 'mean',
-        'geracao_referencia_total': 'mean',
-        'NE_UEE': 'mean'
-    }).reset_index()
-    medias_diarias.columns = ['ano_mes', 'data_str', 'media_dia_real', 'media_dia_ref', 'media_dia_prev']
-
-    # Merge
-    df = df.merge(medias_diarias, on=['ano_mes', 'data_str'], how='left')
-
-    # Calcular percentual
-    df['pct_real'] = (df['geracao_total'] / df['media_dia_real']) * 100
-    df['pct_ref'] = (df['geracao_referencia_total'] / df['media_dia_ref']) * 100
-    df['pct_prev'] = (df['NE_UEE'] / df['media_dia_prev']) * 100
+import pandas as pd
 
-    # Arredondar hora para agrupar
-    df['hora_int'] = df['hora_decimal'].round().astype(int)
+from agregacao_servidor import modulacao_do_servidor
+from armazenamento import caminho_dataset, exigir_dataset, ler_dataset
+from fontes_dados import (AGRUPAMENTOS, DIR_RESULTADOS, DIR_SQLITE_PADRAO, SUBSISTEMA_PADRAO, SUBSISTEMAS,
+                          criar_backend, criar_recorte, diretorio_saida)
+from modulacao import N_HORAS, calcular_modulacao, series_com_previsao
+from outliers import DETECTORES
+from processamento_particionado import modulacao_por_particao
+from utilitarios import relatar_memoria
 
-    # Calcular média por mês e hora
-    resultado = df.groupby(['ano_mes', 'hora_int']).agg({
-        'pct_real': 'mean',
-        'pct_ref': 'mean',
-        'pct_prev': 'mean'
-    }).reset_index()
+parser = argparse.ArgumentParser(description='Gera tabelas HTML de modulação por mês')
+parser.add_argument('--subsistema', choices=list(SUBSISTEMAS), default=SUBSISTEMA_PADRAO,
+                    help=f'Subsistema, lido de resultados/<subsistema>/ (padrão: {SUBSISTEMA_PADRAO}, em resultados/)')
+parser.add_argument('--agrupamento', choices=list(AGRUPAMENTOS),
+                    help='Tabelas de um estado ou usina do subsistema (sem previsão); exige --grupo')
+parser.add_argument('--grupo', help='Estado ou usina com --agrupamento')
+parser.add_argument('--agregacao-servidor', action='store_true',
+                    help='Calcula a modulação por mês/hora a partir das somas semi-horárias consultadas '
+                         'no banco, sem ler o armazenamento local')
+parser.add_argument('--backend', choices=['mysql', 'sqlite'], default='mysql',
+                    help='Banco usado com --agregacao-servidor: RDS (config_db.py) ou réplica SQLite local')
+parser.add_argument('--dir-sqlite', default=DIR_SQLITE_PADRAO,
+                    help=f'Diretório dos bancos SQLite locais (padrão: {DIR_SQLITE_PADRAO})')
+parser.add_argument('--detectores', nargs='+', choices=list(DETECTORES), default=['limiar'],
+                    help='Detectores de outliers da referência com --agregacao-servidor (os mesmos '
+                         'usados em comparacao_eolica_ne.py; padrão: limiar)')
+parser.add_argument('--fora-da-memoria', action='store_true',
+                    help='Lê o armazenamento partição a partição, sem carregar a série inteira')
+args = parser.parse_args()
+if (args.agrupamento is None) != (args.grupo is None):
+    parser.error('--agrupamento e --grupo devem ser usados juntos')
 
-    return resultado
+recorte = criar_recorte(args.subsistema, args.agrupamento, args.grupo)
+series = series_com_previsao(recorte['coluna_previsao'])
+dir_recorte = diretorio_saida(recorte)
 
-print("Calculando modulação por mês...")
-modulacao = calcular_modulacao_mensal(df)
+# O NE fica em tabelas_modulacao.html; os demais recortes, em tabelas_modulacao_<recorte>.html
+arquivo_html = 'tabelas_modulacao.html'
+if dir_recorte != DIR_RESULTADOS:
+    arquivo_html = f"tabelas_modulacao_{os.path.relpath(dir_recorte, DIR_RESULTADOS).replace(os.sep, '_')}.html"
 
-# Pivotar dados para ter meses nas linhas e horas nas colunas
-pivot_real = modulacao.pivot(index='ano_mes', columns='hora_int', values='pct_real')
-pivot_ref = modulacao.pivot(index='ano_mes', columns='hora_int', values='pct_ref')
-pivot_prev = modulacao.pivot(index='ano_mes', columns='hora_int', values='pct_prev')
+if args.agregacao_servidor:
+    print(f"Somando as usinas no servidor ({args.backend}) e calculando a modulação por mês...")
+    modulacao = modulacao_do_servidor(criar_backend(args.backend, args.dir_sqlite), recorte, args.detectores)
+else:
+    # Carregar dados
+    dir_completos = caminho_dataset('completos', f"{dir_recorte}/dados")
+    exigir_dataset(dir_completos, ['timestamp'] + list(series))
+    print(f"Calculando modulação por mês ({recorte['nome']})...")
+    if args.fora_da_memoria:
+        modulacao = modulacao_por_particao(dir_completos, series)
+    else:
+        df = ler_dataset(dir_completos, colunas=list(series))
+        modulacao = calcular_modulacao(df, series=series)
 
-# Ordenar meses do mais novo para o mais antigo
-meses_ordenados = sorted(pivot_real.index, reverse=True)
-pivot_real = pivot_real.loc[meses_ordenados]
-pivot_ref = pivot_ref.loc[meses_ordenados]
-pivot_prev = pivot_prev.loc[meses_ordenados]
+modulacao['ano_mes'] = modulacao['ano'].astype(str) + '-' + modulacao['mes'].astype(str).str.zfill(2)
 
-# Garantir que temos todas as horas de 0 a 24
-horas = list(range(25))
-for hora in horas:
-    if hora not in pivot_real.columns:
-        pivot_real[hora] = np.nan
-    if hora not in pivot_ref.columns:
-        pivot_ref[hora] = np.nan
-    if hora not in pivot_prev.columns:
-        pivot_prev[hora] = np.nan
+# Tabelas na ordem da página: chave, título e cor (a previsão só nos recortes que a têm)
+TABELAS = [
+    ('pct_real', '🔵 Geração Real', '#2196F3'),
+    ('pct_ref', '🟠 Geração Referência', '#FF9800'),
+    ('pct_prev', f"🟢 Previsão {recorte['coluna_previsao']}", '#4CAF50')
+]
+TABELAS = [tabela for tabela in TABELAS if tabela[0] in series.values()]
 
-pivot_real = pivot_real[horas]
-pivot_ref = pivot_ref[horas]
-pivot_prev = pivot_prev[horas]
+# Pivotar dados para ter meses nas linhas e horas nas colunas, do mês mais
+# novo para o mais antigo e com todas as horas de 0 a 23
+horas = list(range(N_HORAS))
+pivots = {}
+for chave, _, _ in TABELAS:
+    pivot = modulacao.pivot(index='ano_mes', columns='hora_int', values=chave)
+    pivots[chave] = pivot.reindex(index=sorted(pivot.index, reverse=True), columns=horas)
 
 def gerar_html_tabela(pivot_data, titulo, cor):
     """Gera HTML para uma tabela"""
@@ -90,7 +93,7 @@ def gerar_html_tabela(pivot_data, titulo, cor):
 '''
 
     # Cabeçalho das horas
-    for hora in range(25):
+    for hora in horas:
         html += f'                        <th>{hora:02d}:00</th>\n'
 
     html += '''                    </tr>
@@ -101,7 +104,7 @@ def gerar_html_tabela(pivot_data, titulo, cor):
     # Dados
     for mes in pivot_data.index:
         html += f'                    <tr>\n                        <td class="mes-col">{mes}</td>\n'
-        for hora in range(25):
+        for hora in horas:
             valor = pivot_data.loc[mes, hora]
             if pd.isna(valor):
                 html += '                        <td class="na-cell">-</td>\n'
@@ -129,7 +132,7 @@ print("Gerando HTML...")
 html_completo = f'''<!DOCTYPE html>
 <html>
 <head>
-    <title>Tabelas de Modulação por Mês</title>
+    <title>Tabelas de Modulação por Mês - {recorte['descricao']}</title>
     <meta charset="UTF-8">
     <style>
         body {{
@@ -294,7 +297,7 @@ html_completo = f'''<!DOCTYPE html>
 </head>
 <body>
     <div class="header">
-        <h1>📋 Tabelas de Modulação por Mês</h1>
+        <h1>📋 Tabelas de Modulação por Mês - {recorte['descricao']}</h1>
         <div class="descricao">
             <strong>Modulação Diária:</strong> Percentual em relação à média do dia<br>
             <strong>Leitura:</strong> Valores > 100% indicam geração acima da média diária | Valores < 100% indicam geração abaixo da média<br>
@@ -326,10 +329,9 @@ html_completo = f'''<!DOCTYPE html>
 
 '''
 
-# Adicionar as 3 tabelas
-html_completo += gerar_html_tabela(pivot_real, '🔵 Geração Real - Modulação por Hora (%)', '#2196F3')
-html_completo += gerar_html_tabela(pivot_ref, '🟠 Geração Referência - Modulação por Hora (%)', '#FF9800')
-html_completo += gerar_html_tabela(pivot_prev, '🟢 Previsão NE_UEE - Modulação por Hora (%)', '#4CAF50')
+# Adicionar as tabelas
+for chave, titulo, cor in TABELAS:
+    html_completo += gerar_html_tabela(pivots[chave], f'{titulo} - Modulação por Hora (%)', cor)
 
 html_completo += '''
     <div class="nav" style="margin-top: 40px;">
@@ -345,16 +347,16 @@ html_completo += '''
 '''
 
 # Salvar HTML
-with open('tabelas_modulacao.html', 'w', encoding='utf-8') as f:
+with open(arquivo_html, 'w', encoding='utf-8') as f:
     f.write(html_completo)
 
 print("\n" + "="*80)
 print("✅ TABELAS GERADAS COM SUCESSO!")
 print("="*80)
-print(f"\nArquivo salvo: tabelas_modulacao.html")
-print(f"Meses incluídos: {len(pivot_real)} meses")
-print(f"Horas por mês: 0:00 a 24:00 (25 colunas)")
+print(f"\nArquivo salvo: {arquivo_html}")
+print(f"Meses incluídos: {len(pivots['pct_real'])} meses")
+print(f"Horas por mês: 00:00 a {N_HORAS - 1:02d}:00 ({N_HORAS} colunas)")
 print("\nTabelas geradas:")
-print("  1. 🔵 Geração Real")
-print("  2. 🟠 Geração Referência")
-print("  3. 🟢 Previsão NE_UEE")
+for numero, (_, titulo, _) in enumerate(TABELAS, start=1):
+    print(f"  {numero}. {titulo}")
+relatar_memoria('geração das tabelas')
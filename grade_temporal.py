@@ -0,0 +1,136 @@
+"""
+Grade temporal densa de passo fixo (30 min) para as séries da análise
+A série é reindexada uma única vez sobre uma grade completa que começa à
+meia-noite do primeiro dia e termina à meia-noite seguinte ao último, com
+um vetor NumPy contíguo por coluna e máscara explícita das lacunas.
+O índice de um instante é obtido por aritmética, então meses, dias e
+intervalos quaisquer são fatias (views, sem cópia) dos vetores
+"""
+import numpy as np
+import pandas as pd
+
+# Passo da grade
+PASSO_SEGUNDOS = 1800
+PONTOS_POR_DIA = 86400 // PASSO_SEGUNDOS
+
+def para_segundos(instantes):
+    """Instantes (datetime64, Timestamp ou texto) em segundos desde a época"""
+    return np.asarray(instantes, dtype='datetime64[s]').astype(np.int64)
+
+def criar_grade(df, colunas, coluna_tempo='timestamp'):
+    """
+    Reindexa o DataFrame sobre a grade de 30 min. Instantes fora da grade
+    (minuto diferente de :00/:30) são descartados e contados.
+    Retorna um dict com 'inicio' (segundos da primeira posição), 'n',
+    'valores' (vetor float32 por coluna, NaN nas lacunas) e 'presente'
+    (posições com registro na origem)
+    """
+    segundos = para_segundos(df[coluna_tempo].to_numpy())
+    if len(segundos) == 0:
+        return {'inicio': 0, 'n': 0, 'valores': {c: np.empty(0, dtype=np.float32) for c in colunas},
+                'presente': np.zeros(0, dtype=bool), 'fora_da_grade': 0}
+
+    inicio = segundos.min() // 86400 * 86400
+    fim = (segundos.max() // 86400 + 1) * 86400
+    n = int((fim - inicio) // PASSO_SEGUNDOS)
+
+    na_grade = (segundos - inicio) % PASSO_SEGUNDOS == 0
+    indices = (segundos[na_grade] - inicio) // PASSO_SEGUNDOS
+
+    presente = np.zeros(n, dtype=bool)
+    presente[indices] = True
+    valores = {}
+    for coluna in colunas:
+        vetor = np.full(n, np.nan, dtype=np.float32)
+        vetor[indices] = df[coluna].to_numpy(dtype=np.float32)[na_grade]
+        valores[coluna] = vetor
+
+    return {
+        'inicio': int(inicio),
+        'n': n,
+        'valores': valores,
+        'presente': presente,
+        'fora_da_grade': int((~na_grade).sum())
+    }
+
+def recortar_grade(grade, fatia, colunas=None):
+    """
+    Cópia compacta de uma fatia da grade, só com as colunas pedidas (para
+    enviar a outro processo sem a série inteira); a fatia deve começar à
+    meia-noite, como as de fatia_mes
+    """
+    inicio, fim, _ = fatia.indices(grade['n'])
+    colunas = grade['valores'] if colunas is None else colunas
+    return {
+        'inicio': grade['inicio'] + inicio * PASSO_SEGUNDOS,
+        'n': fim - inicio,
+        'valores': {coluna: grade['valores'][coluna][inicio:fim].copy() for coluna in colunas},
+        'presente': grade['presente'][inicio:fim].copy(),
+        'fora_da_grade': 0
+    }
+
+def indice(grade, instante):
+    """Posição de um instante na grade (pode cair fora de [0, n))"""
+    return int((para_segundos(instante) - grade['inicio']) // PASSO_SEGUNDOS)
+
+def fatia_periodo(grade, inicio, fim):
+    """Fatia das posições em [inicio, fim), limitada à extensão da grade"""
+    return slice(max(indice(grade, inicio), 0), min(max(indice(grade, fim), 0), grade['n']))
+
+def fatia_mes(grade, ano, mes):
+    """Fatia das posições de um mês"""
+    inicio = pd.Timestamp(year=ano, month=mes, day=1)
+    return fatia_periodo(grade, inicio, inicio + pd.offsets.MonthBegin(1))
+
+def meses(grade, decrescente=False):
+    """Lista (ano, mes, fatia) de cada mês coberto pela grade"""
+    if grade['n'] == 0:
+        return []
+    primeiro = pd.Timestamp(grade['inicio'], unit='s').to_period('M')
+    ultimo = pd.Timestamp(grade['inicio'] + (grade['n'] - 1) * PASSO_SEGUNDOS, unit='s').to_period('M')
+    lista = [(p.year, p.month, fatia_mes(grade, p.year, p.month))
+             for p in pd.period_range(primeiro, ultimo, freq='M')]
+    return lista[::-1] if decrescente else lista
+
+def instantes(grade, fatia=slice(None)):
+    """Eixo de tempo (datetime64) das posições da fatia"""
+    inicio, fim, _ = fatia.indices(grade['n'])
+    return (np.datetime64(grade['inicio'], 's')
+            + np.arange(inicio, fim) * np.timedelta64(PASSO_SEGUNDOS, 's'))
+
+def dias(grade, fatia=slice(None)):
+    """Datas (datetime64[D]) dos dias completos da fatia"""
+    inicio, fim, _ = fatia.indices(grade['n'])
+    primeiro = np.datetime64(grade['inicio'], 's').astype('datetime64[D]') + inicio // PONTOS_POR_DIA
+    return primeiro + np.arange((fim - inicio) // PONTOS_POR_DIA)
+
+def matriz_dias(vetor, fatia=slice(None)):
+    """
+    View dias × 48 de um vetor da grade; a fatia deve começar à meia-noite
+    e cobrir dias inteiros (como as de fatia_mes e fatia_periodo com datas)
+    """
+    return vetor[fatia].reshape(-1, PONTOS_POR_DIA)
+
+def dias_com_dados(grade, fatia=slice(None)):
+    """Máscara dos dias da fatia com ao menos um registro"""
+    return matriz_dias(grade['presente'], fatia).any(axis=1)
+
+def medias_mensais(grade, coluna):
+    """Meses (ano, mes) com registros e a média mensal da coluna em cada um"""
+    lista = [(ano, mes, fatia) for ano, mes, fatia in meses(grade) if grade['presente'][fatia].any()]
+    medias = np.array([media_nan(grade['valores'][coluna][fatia], eixo=0) for _, _, fatia in lista])
+    return [(ano, mes) for ano, mes, _ in lista], medias
+
+def medias_diarias(grade, colunas):
+    """DataFrame com a média diária de cada coluna nos dias com registros"""
+    com_dados = dias_com_dados(grade)
+    diario = pd.DataFrame({'data': dias(grade)[com_dados]})
+    for coluna in colunas:
+        diario[coluna] = media_nan(matriz_dias(grade['valores'][coluna]), eixo=1)[com_dados]
+    return diario
+
+def media_nan(matriz, eixo):
+    """Média ignorando NaN; NaN (sem aviso) onde não há valores"""
+    validos = ~np.isnan(matriz)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(validos, matriz, 0.0).sum(axis=eixo) / validos.sum(axis=eixo)
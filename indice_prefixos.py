@@ -0,0 +1,199 @@
+"""
+Índice de somas de prefixo para agregações em períodos quaisquer
+Para cada série (e para o seu percentual sobre a média do dia) guarda, por
+semi-hora do dia, a soma e a contagem acumuladas dia a dia (matrizes
+(dias + 1) × 48), além da presença de registros. A soma, a média ou o perfil
+de modulação de qualquer intervalo [inicio, fim) — semana, estação, mês de
+vários anos, intervalo livre — e de uma hora específica saem de duas linhas
+dessas matrizes, sem percorrer a série. O índice é gravado (.npz) ao lado da
+série completa, com a assinatura das partições de que foi construído
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from armazenamento import gravar_atomico, hash_texto, ler_manifesto
+from grade_temporal import PASSO_SEGUNDOS, PONTOS_POR_DIA, criar_grade, matriz_dias, para_segundos
+from modulacao import AGRUPAR_HORAS, HORA_INT, SERIES, modulacao_diaria
+from processamento_particionado import iterar_particoes
+
+# Arquivo do índice, no diretório de dados ao lado da série completa
+ARQUIVO_PREFIXOS = 'indice_prefixos.npz'
+
+def caminho_indice_prefixos(dir_completos):
+    """Arquivo do índice de uma série completa"""
+    return os.path.join(os.path.dirname(dir_completos), ARQUIVO_PREFIXOS)
+
+def assinatura_dataset(diretorio):
+    """Hash dos checksums das partições do dataset (pelo manifesto)"""
+    particoes = (ler_manifesto(diretorio) or {}).get('particoes', {})
+    return hash_texto(*(f"{particao}:{dados['sha256']}" for particao, dados in sorted(particoes.items())))
+
+def blocos_diarios(grade, series=SERIES):
+    """
+    Somas e contagens dias × 48 de cada série e do seu percentual diário,
+    e a presença de registros, de uma grade (a grade começa à meia-noite)
+    """
+    bloco = {
+        'primeiro_dia': grade['inicio'] // 86400,
+        'presentes': matriz_dias(grade['presente']).astype(np.int32),
+        'somas': {}, 'contagens': {}
+    }
+    for coluna in series:
+        if coluna in grade['valores']:
+            bloco['somas'][coluna], bloco['contagens'][coluna] = somas_e_contagens(
+                matriz_dias(grade['valores'][coluna]))
+    for chave, pct in modulacao_diaria(grade, series=series).items():
+        bloco['somas'][chave], bloco['contagens'][chave] = somas_e_contagens(pct)
+    return bloco
+
+def somas_e_contagens(matriz):
+    """Valores (NaN como zero, em float64) e contagem dos válidos"""
+    validos = ~np.isnan(matriz)
+    return np.where(validos, matriz, 0.0).astype(np.float64), validos.astype(np.int32)
+
+def indice_de_blocos(blocos):
+    """
+    Acumula blocos diários (de uma grade inteira ou de cada partição) num só
+    calendário, com zeros nos dias sem bloco, e calcula os prefixos
+    """
+    blocos = [bloco for bloco in blocos if len(bloco['presentes'])]
+    if not blocos:
+        return {'primeiro_dia': 0, 'n_dias': 0, 'presentes': np.zeros((1, PONTOS_POR_DIA), dtype=np.int64),
+                'somas': {}, 'contagens': {}}
+    primeiro_dia = min(bloco['primeiro_dia'] for bloco in blocos)
+    n_dias = max(bloco['primeiro_dia'] + len(bloco['presentes']) for bloco in blocos) - primeiro_dia
+
+    def prefixo(chave, nome=None):
+        acumulado = np.zeros((n_dias + 1, PONTOS_POR_DIA),
+                             dtype=np.float64 if chave == 'somas' else np.int64)
+        for bloco in blocos:
+            matriz = bloco[chave] if nome is None else bloco[chave].get(nome)
+            if matriz is not None:
+                deslocamento = bloco['primeiro_dia'] - primeiro_dia + 1
+                acumulado[deslocamento:deslocamento + len(matriz)] += matriz
+        return np.cumsum(acumulado, axis=0, out=acumulado)
+
+    nomes = list(dict.fromkeys(nome for bloco in blocos for nome in bloco['somas']))
+    return {
+        'primeiro_dia': int(primeiro_dia),
+        'n_dias': int(n_dias),
+        'presentes': prefixo('presentes'),
+        'somas': {nome: prefixo('somas', nome) for nome in nomes},
+        'contagens': {nome: prefixo('contagens', nome) for nome in nomes}
+    }
+
+def construir_indice_prefixos(grade, series=SERIES):
+    """Índice de prefixos de uma grade inteira"""
+    return indice_de_blocos([blocos_diarios(grade, series)])
+
+def indice_do_dataset(diretorio, series=SERIES):
+    """Índice de prefixos de um dataset, lendo partição a partição"""
+    return indice_de_blocos([blocos_diarios(criar_grade(df, list(series)), series)
+                             for _, _, df in iterar_particoes(diretorio, list(series)) if len(df) > 0])
+
+def gravar_indice_prefixos(arquivo, indice, assinatura):
+    """Grava o índice em .npz (sem compressão: as consultas leem as matrizes inteiras)"""
+    matrizes = {'presentes': indice['presentes']}
+    for nome in indice['somas']:
+        matrizes[f'soma__{nome}'] = indice['somas'][nome]
+        matrizes[f'contagem__{nome}'] = indice['contagens'][nome]
+
+    def escrever(destino):
+        with open(destino, 'wb') as arquivo_npz:
+            np.savez(arquivo_npz, primeiro_dia=indice['primeiro_dia'], n_dias=indice['n_dias'],
+                     assinatura=assinatura, **matrizes)
+    gravar_atomico(arquivo, escrever)
+
+def ler_indice_prefixos(arquivo, assinatura=None):
+    """Lê o índice gravado; None se não existir ou se a assinatura não conferir"""
+    if not os.path.exists(arquivo):
+        return None
+    with np.load(arquivo) as dados:
+        if assinatura is not None and str(dados['assinatura']) != assinatura:
+            return None
+        indice = {'primeiro_dia': int(dados['primeiro_dia']), 'n_dias': int(dados['n_dias']),
+                  'presentes': dados['presentes'], 'somas': {}, 'contagens': {}}
+        for chave in dados.files:
+            if chave.startswith('soma__'):
+                indice['somas'][chave[len('soma__'):]] = dados[chave]
+            elif chave.startswith('contagem__'):
+                indice['contagens'][chave[len('contagem__'):]] = dados[chave]
+    return indice
+
+def obter_indice_prefixos(dir_completos, series=SERIES):
+    """
+    Índice gravado da série completa, se estiver em dia com as partições;
+    senão é reconstruído (partição a partição) e gravado
+    """
+    arquivo = caminho_indice_prefixos(dir_completos)
+    assinatura = assinatura_dataset(dir_completos)
+    indice = ler_indice_prefixos(arquivo, assinatura)
+    if indice is None:
+        print(f"Construindo o índice de prefixos de {dir_completos}...")
+        indice = indice_do_dataset(dir_completos, series)
+        gravar_indice_prefixos(arquivo, indice, assinatura)
+    return indice
+
+def dias_por_semi_hora(indice, inicio, fim):
+    """
+    Para cada semi-hora do dia, as linhas do prefixo que delimitam as suas
+    posições em [inicio, fim): os dias d com d × 48 + s no intervalo
+    """
+    origem = indice['primeiro_dia'] * 86400
+    posicao_inicio = -((origem - para_segundos(inicio)) // PASSO_SEGUNDOS)
+    posicao_fim = -((origem - para_segundos(fim)) // PASSO_SEGUNDOS)
+    semi_horas = np.arange(PONTOS_POR_DIA)
+    primeiro = np.clip(-((semi_horas - posicao_inicio) // PONTOS_POR_DIA), 0, indice['n_dias'])
+    ultimo = np.clip(-((semi_horas - posicao_fim) // PONTOS_POR_DIA), 0, indice['n_dias'])
+    return primeiro, np.maximum(ultimo, primeiro)
+
+def diferenca(prefixo, primeiro, ultimo):
+    """Total de cada semi-hora entre as linhas dos prefixos (vetor de 48)"""
+    semi_horas = np.arange(PONTOS_POR_DIA)
+    return prefixo[ultimo, semi_horas] - prefixo[primeiro, semi_horas]
+
+def somar(indice, nome, inicio, fim, hora=None):
+    """Soma e contagem dos valores válidos de uma série em [inicio, fim), opcionalmente de uma hora"""
+    primeiro, ultimo = dias_por_semi_hora(indice, inicio, fim)
+    selecao = slice(None) if hora is None else HORA_INT == hora
+    soma = diferenca(indice['somas'][nome], primeiro, ultimo)[selecao].sum()
+    contagem = diferenca(indice['contagens'][nome], primeiro, ultimo)[selecao].sum()
+    return float(soma), int(contagem)
+
+def media(indice, nome, inicio, fim, hora=None):
+    """Média dos valores válidos de uma série em [inicio, fim) (NaN se não houver)"""
+    soma, contagem = somar(indice, nome, inicio, fim, hora)
+    return soma / contagem if contagem else np.nan
+
+def perfil_modulacao(indice, inicio, fim, series=SERIES):
+    """
+    Modulação média por hora em [inicio, fim) (mesmo resultado de
+    modulacao_por_periodo sobre o período): DataFrame com hora_int e um pct_*
+    por série, só com as horas que têm registro
+    """
+    primeiro, ultimo = dias_por_semi_hora(indice, inicio, fim)
+    horas = np.flatnonzero(diferenca(indice['presentes'], primeiro, ultimo) @ AGRUPAR_HORAS > 0)
+    perfil = {'hora_int': horas}
+    for chave in series.values():
+        if chave in indice['somas']:
+            somas = diferenca(indice['somas'][chave], primeiro, ultimo) @ AGRUPAR_HORAS
+            contagens = diferenca(indice['contagens'][chave], primeiro, ultimo) @ AGRUPAR_HORAS
+            with np.errstate(invalid='ignore', divide='ignore'):
+                perfil[chave] = (somas / contagens)[horas]
+    return pd.DataFrame(perfil)
+
+def modulacao_mensal(indice, series=SERIES):
+    """Modulação por ano, mês e hora de todos os meses do índice (como modulacao_por_periodo)"""
+    if indice['n_dias'] == 0:
+        return pd.DataFrame(columns=['ano', 'mes', 'hora_int'] + list(series.values()))
+    primeiro = pd.Timestamp(indice['primeiro_dia'], unit='D')
+    ultimo = primeiro + pd.Timedelta(days=indice['n_dias'] - 1)
+    perfis = []
+    for periodo in pd.period_range(primeiro.to_period('M'), ultimo.to_period('M'), freq='M'):
+        perfil = perfil_modulacao(indice, periodo.start_time, (periodo + 1).start_time, series)
+        perfil.insert(0, 'ano', periodo.year)
+        perfil.insert(1, 'mes', periodo.month)
+        perfis.append(perfil)
+    return pd.concat(perfis, ignore_index=True)
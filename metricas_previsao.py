@@ -0,0 +1,142 @@
+"""
+Métricas de erro da previsão (NE_UEE ou <subsistema>_UEE) contra a geração
+real e a de referência: MAE, RMSE, viés, desvio do erro e erros normalizados
+Os acumuladores são somas mescláveis por partição (mês) e hora do dia —
+contagem, média e M2 do erro (Welford/Chan), somas do erro absoluto, do
+quadrado e do observado —, gravados ao lado da série completa com o
+checksum de cada partição. A cada atualização só os meses novos ou
+alterados são lidos; os resumos por hora, mês e ano saem da mescla das
+células, sem outra passada pelo histórico.
+O erro segue o sinal das colunas diferenca_*: observado − previsão
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from armazenamento import atualizar_por_particao, checksums_particoes, ler_particao
+from grade_temporal import para_segundos
+from modulacao import OBSERVADAS
+
+# Arquivo dos acumuladores, no diretório de dados ao lado da série completa
+ARQUIVO_METRICAS = 'metricas_previsao.parquet'
+
+# Versão do formato gravado (muda a versão, os acumuladores são refeitos)
+VERSAO_METRICAS = 1
+
+# Acumuladores de cada célula (par, partição, hora)
+CAMPOS = ['n', 'media_erro', 'm2_erro', 'soma_abs', 'soma_quad', 'soma_observado']
+
+def acumular_particao(df, coluna_previsao):
+    """
+    Acumuladores por par e hora do dia (24 células por par) de uma partição.
+    Só entram os instantes com previsão e observado válidos
+    """
+    horas = para_segundos(df['timestamp'].to_numpy()) % 86400 // 3600
+    previsao = df[coluna_previsao].to_numpy(dtype=np.float64)
+    celulas = []
+    for par, coluna in OBSERVADAS.items():
+        observado = df[coluna].to_numpy(dtype=np.float64)
+        validos = ~(np.isnan(observado) | np.isnan(previsao))
+        erro = (observado - previsao)[validos]
+        hora = horas[validos]
+
+        n = np.bincount(hora, minlength=24)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = np.bincount(hora, erro, minlength=24) / n
+        celulas.append(pd.DataFrame({
+            'par': par,
+            'hora': np.arange(24),
+            'n': n,
+            'media_erro': np.where(n > 0, media, 0.0),
+            # Segunda passada sobre a partição: M2 exato em torno da média da célula
+            'm2_erro': np.bincount(hora, (erro - np.nan_to_num(media)[hora]) ** 2, minlength=24),
+            'soma_abs': np.bincount(hora, np.abs(erro), minlength=24),
+            'soma_quad': np.bincount(hora, erro ** 2, minlength=24),
+            'soma_observado': np.bincount(hora, observado[validos], minlength=24)
+        }))
+    celulas = pd.concat(celulas, ignore_index=True)
+    return celulas[celulas['n'] > 0].reset_index(drop=True)
+
+def mesclar(celulas, chaves):
+    """
+    Mescla as células de cada grupo: somas simples, e média e M2 do erro pela
+    combinação de Chan (M2 = ΣM2ᵢ + Σnᵢ(médiaᵢ − média)²)
+    """
+    grupos = [celulas[chave] for chave in chaves]
+    soma_erro = celulas['n'] * celulas['media_erro']
+    media_grupo = soma_erro.groupby(grupos).transform('sum') / celulas['n'].groupby(grupos).transform('sum')
+    celulas = celulas.assign(soma_erro=soma_erro,
+                             m2_erro=celulas['m2_erro'] + celulas['n'] * (celulas['media_erro'] - media_grupo) ** 2)
+    resultado = celulas.groupby(chaves, sort=True)[
+        ['n', 'soma_erro', 'm2_erro', 'soma_abs', 'soma_quad', 'soma_observado']].sum()
+    resultado['media_erro'] = resultado['soma_erro'] / resultado['n']
+    return resultado[CAMPOS].reset_index()
+
+def metricas(acumuladores):
+    """Métricas de cada linha de acumuladores mesclados"""
+    n = acumuladores['n']
+    rmse = np.sqrt(acumuladores['soma_quad'] / n)
+    media_observado = acumuladores['soma_observado'] / n
+    resultado = acumuladores.drop(columns=CAMPOS).assign(
+        n=n,
+        mae=acumuladores['soma_abs'] / n,
+        rmse=rmse,
+        vies=acumuladores['media_erro'],
+        desvio_erro=np.sqrt(acumuladores['m2_erro'] / (n - 1).where(n > 1)),
+        nmae_pct=100 * acumuladores['soma_abs'] / acumuladores['soma_observado'],
+        nrmse_pct=100 * rmse / media_observado
+    )
+    return resultado
+
+def resumir(celulas, nivel):
+    """
+    Métricas por par e nível: 'hora' (hora do dia, todo o histórico), 'mes'
+    (ano e mês), 'ano' ou 'total'
+    """
+    celulas = celulas.assign(ano=celulas['particao'].str[:4].astype(int),
+                             mes=celulas['particao'].str[5:].astype(int))
+    chaves = {'hora': ['par', 'hora'], 'mes': ['par', 'ano', 'mes'], 'ano': ['par', 'ano'],
+              'total': ['par']}[nivel]
+    return metricas(mesclar(celulas, chaves))
+
+def atualizar_metricas(dir_completos, coluna_previsao):
+    """
+    Células (par, partição, hora) da série completa: reaproveita as gravadas
+    das partições com o mesmo checksum, acumula só as novas ou alteradas e grava
+    """
+    colunas = [coluna_previsao] + list(OBSERVADAS.values())
+
+    def resumir(particao):
+        ano, mes = (int(parte) for parte in particao.split('-'))
+        celulas = acumular_particao(ler_particao(dir_completos, ano, mes, colunas), coluna_previsao)
+        celulas.insert(1, 'particao', particao)
+        return celulas
+
+    por_particao, novas = atualizar_por_particao(
+        os.path.join(os.path.dirname(dir_completos), ARQUIVO_METRICAS), 'metricas', VERSAO_METRICAS,
+        {'coluna_previsao': coluna_previsao}, checksums_particoes(dir_completos), resumir, ler_celulas,
+        lambda celulas: pa.Table.from_pandas(juntar_celulas(celulas), preserve_index=False))
+    print(f"Métricas da previsão: {novas} partições acumuladas, {len(por_particao) - novas} reaproveitadas")
+    return juntar_celulas(por_particao)
+
+def juntar_celulas(por_particao):
+    """Células de todas as partições ({partição: células}) numa tabela ordenada"""
+    if not por_particao:
+        return pd.DataFrame(columns=['par', 'particao', 'hora'] + CAMPOS)
+    celulas = pd.concat(por_particao.values(), ignore_index=True)
+    return celulas.sort_values(['particao', 'par', 'hora'], kind='stable').reset_index(drop=True)
+
+def ler_celulas(tabela, particoes):
+    """Células gravadas das `particoes`, {partição: células} (vazias nas partições sem pares válidos)"""
+    celulas = tabela.to_pandas()
+    return {particao: celulas[celulas['particao'] == particao].reset_index(drop=True) for particao in particoes}
+
+def exportar_metricas(celulas, output_dir):
+    """Grava um CSV por nível (hora, mês, ano) e devolve o resumo total"""
+    for nivel in ('hora', 'mes', 'ano'):
+        arquivo = f"{output_dir}/metricas_previsao_{nivel}.csv"
+        resumir(celulas, nivel).to_csv(arquivo, index=False, float_format='%.3f')
+        print(f"  Salvo: {arquivo}")
+    return resumir(celulas, 'total')
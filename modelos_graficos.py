@@ -0,0 +1,67 @@
+"""
+Modelos de figura reaproveitados entre os gráficos do mesmo tipo
+Montar a figura (eixos, rótulos, legenda, formatadores) e medir o layout
+(tight_layout e bbox_inches='tight') custava mais que desenhar as linhas.
+Cada tipo de gráfico é montado uma vez por processo, com layout fixo
+(margens constantes) e as linhas já criadas; a cada mês só os dados, o
+título e os limites mudam antes de salvar, com um único desenho da figura.
+A imagem depende só do tipo e dos dados, não de quais meses o processo já
+desenhou. As tabelas não passam pelo matplotlib (tabelas_svg.py)
+"""
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Modelos montados neste processo: (função de montagem, chave) -> modelo
+MODELOS = {}
+
+# Resolução das imagens salvas
+DPI = 150
+
+# Margens fixas dos gráficos de linhas (frações da figura)
+MARGENS = {'left': 0.07, 'right': 0.98, 'bottom': 0.14, 'top': 0.9}
+
+# Instante provisório das linhas com eixo de datas, até receberem os dados do mês
+DATA_PROVISORIA = np.array(['2000-01-01'], dtype='datetime64[s]')
+
+def obter_modelo(montar, *chave):
+    """Modelo montado por `montar(*chave)`, criado na primeira vez que é pedido neste processo"""
+    if (montar, chave) not in MODELOS:
+        MODELOS[(montar, chave)] = montar(*chave)
+    return MODELOS[(montar, chave)]
+
+def criar_figura(figsize, margens=MARGENS):
+    """Figura com um eixo, fora do pyplot (não fica registrada nem precisa ser fechada)"""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    if margens is not None:
+        fig.subplots_adjust(**margens)
+    return fig, ax
+
+def atualizar_linhas(modelo, dados):
+    """Troca os dados das linhas do modelo: {nome da linha: (x, y)}"""
+    for nome, (x, y) in dados.items():
+        modelo['linhas'][nome].set_data(x, y)
+
+def reescalar(ax, xlim=None, ylim=None, colecoes=()):
+    """
+    Recalcula a escala automática com os dados atuais e aplica os limites
+    fixos, como set_xlim/set_ylim depois de plotar (None mantém o automático).
+    relim só considera linhas: as `colecoes` visíveis (faixas de fill_between)
+    entram à parte
+    """
+    ax.relim()
+    for colecao in colecoes:
+        if colecao.get_visible():
+            ax.update_datalim(colecao.get_datalim(ax.transData).get_points())
+    ax.autoscale(True)
+    ax.autoscale_view()
+    if xlim is not None:
+        ax.set_xlim(*xlim)
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+
+def salvar_modelo(modelo, arquivo):
+    """Salva a figura do modelo"""
+    modelo['fig'].savefig(arquivo, dpi=DPI)
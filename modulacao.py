@@ -0,0 +1,109 @@
+"""
+Cálculo vetorizado da modulação diária, compartilhado pelos scripts da análise
+Cada série da grade temporal vira uma matriz dias × 48; a média de cada dia,
+o percentual de cada semi-hora sobre ela e as médias por hora (por mês ou
+por ano) saem de poucas reduções NumPy, sem groupby nem merge
+"""
+import numpy as np
+import pandas as pd
+
+from grade_temporal import PASSO_SEGUNDOS, PONTOS_POR_DIA, criar_grade, dias, matriz_dias, media_nan
+
+def series_com_previsao(coluna_previsao):
+    """Séries analisadas e nome do respectivo percentual; sem previsão, só real e referência"""
+    series = {
+        'geracao_total': 'pct_real',
+        'geracao_referencia_total': 'pct_ref'
+    }
+    if coluna_previsao is not None:
+        series[coluna_previsao] = 'pct_prev'
+    return series
+
+# Séries analisadas no Nordeste (previsão NE_UEE)
+SERIES = series_com_previsao('NE_UEE')
+
+# Séries observadas comparadas com a previsão nas métricas de erro e na defasagem (nome do par -> coluna)
+OBSERVADAS = {
+    'real': 'geracao_total',
+    'referencia': 'geracao_referencia_total'
+}
+
+# Hora (0 a 23) de cada semi-hora do dia: a hora h agrupa h:00 e h:30,
+# o intervalo [h, h + 1) da reamostragem horária (rótulo no início)
+HORA_INT = np.arange(PONTOS_POR_DIA) * PASSO_SEGUNDOS // 3600
+N_HORAS = HORA_INT.max() + 1
+
+# Matriz 48 × 24 que soma as semi-horas de cada hora
+AGRUPAR_HORAS = (HORA_INT[:, None] == np.arange(N_HORAS)[None, :]).astype(float)
+
+def percentual_diario(matriz):
+    """
+    Percentual de cada semi-hora em relação à média do seu dia (matriz dias × 48).
+    Dias sem valores ou com média zero ficam NaN
+    """
+    media_dia = media_nan(matriz, eixo=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(media_dia[:, None] != 0, matriz / media_dia[:, None] * 100, np.nan)
+
+def modulacao_diaria(grade, fatia=slice(None), series=SERIES):
+    """
+    Modulação de cada série na fatia da grade: dict pct_* -> matriz dias × 48
+    """
+    return {chave: percentual_diario(matriz_dias(grade['valores'][coluna], fatia))
+            for coluna, chave in series.items() if coluna in grade['valores']}
+
+def media_por_hora(pct, inicios_grupos=None):
+    """
+    Média do percentual por hora. Sem `inicios_grupos`, agrega todos
+    os dias (vetor de 24 horas); com ele, agrega cada bloco de dias consecutivos
+    que começa nessas linhas (matriz grupos × 24). Horas sem valores ficam NaN
+    """
+    validos = ~np.isnan(pct)
+    somas = np.where(validos, pct, 0.0)
+    contagens = validos.astype(float)
+    if inicios_grupos is None:
+        somas, contagens = somas.sum(axis=0), contagens.sum(axis=0)
+    else:
+        somas = np.add.reduceat(somas, inicios_grupos, axis=0)
+        contagens = np.add.reduceat(contagens, inicios_grupos, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (somas @ AGRUPAR_HORAS) / (contagens @ AGRUPAR_HORAS)
+
+def horas_com_registro(presente, inicios_grupos=None):
+    """Máscara das horas com ao menos um registro (por grupo de dias)"""
+    contagens = presente.astype(float)
+    if inicios_grupos is None:
+        contagens = contagens.sum(axis=0)
+    else:
+        contagens = np.add.reduceat(contagens, inicios_grupos, axis=0)
+    return (contagens @ AGRUPAR_HORAS) > 0
+
+def modulacao_por_periodo(grade, nivel='mes', series=SERIES):
+    """
+    Modulação média por hora de cada mês (nivel='mes': colunas ano, mes, hora_int)
+    ou de cada ano (nivel='ano': colunas ano, hora_int), mais um pct_* por série.
+    Inclui apenas as horas com registro no período
+    """
+    if grade['n'] == 0:
+        chaves = ['ano', 'mes', 'hora_int'] if nivel == 'mes' else ['ano', 'hora_int']
+        return pd.DataFrame(columns=chaves + [chave for chave in series.values()])
+
+    datas = dias(grade)
+    periodos = datas.astype('datetime64[M]' if nivel == 'mes' else 'datetime64[Y]')
+    inicios = np.flatnonzero(np.r_[True, periodos[1:] != periodos[:-1]])
+    periodos = pd.DatetimeIndex(periodos[inicios])
+
+    presente = horas_com_registro(matriz_dias(grade['presente']), inicios)
+    grupos, horas = np.nonzero(presente)
+    resultado = {'ano': periodos.year[grupos].astype(int)}
+    if nivel == 'mes':
+        resultado['mes'] = periodos.month[grupos].astype(int)
+    resultado['hora_int'] = horas
+    for chave, pct in modulacao_diaria(grade, series=series).items():
+        resultado[chave] = media_por_hora(pct, inicios)[grupos, horas]
+    return pd.DataFrame(resultado)
+
+def calcular_modulacao(df, nivel='mes', series=SERIES):
+    """Atalho: monta a grade do DataFrame e calcula a modulação por período"""
+    grade = criar_grade(df, [coluna for coluna in series if coluna in df.columns])
+    return modulacao_por_periodo(grade, nivel, series)
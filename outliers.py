@@ -0,0 +1,374 @@
+"""
+Detecção de outliers da geração de referência e camada esparsa de correções
+Os detectores são funções vetorizadas sobre o vetor da série, registradas em
+DETECTORES com os parâmetros padrão e o alcance (quantas amostras vizinhas
+influenciam a decisão em cada posição). As correções não reescrevem a série:
+ficam numa camada esparsa (posição, motivo, valor original e corrigido),
+aplicada sobre a série bruta quando necessário e gravada em Parquet para
+auditoria. Graças ao alcance, cada execução só reavalia os dados novos mais
+uma janela de contexto
+"""
+import json
+import math
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from armazenamento import gravar_atomico, hash_texto
+from fontes_dados import SUBSISTEMA_PADRAO
+
+# Limiar (MW) abaixo do qual a geração de referência do NE é considerada outlier
+LIMIAR_OUTLIER = 1000
+
+# Nos demais recortes (subsistemas menores, estados, usinas) o limiar é esta
+# fração da média da referência (no NE, 1000 MW é cerca de 10% da média)
+FRACAO_LIMIAR_OUTLIER = 0.1
+
+# Arquivo da camada de correções no diretório de dados do recorte
+ARQUIVO_CORRECOES = 'correcoes.parquet'
+
+# Versão do cálculo da camada; mudá-la força a reavaliação completa
+VERSAO_CORRECOES = 2
+
+# Motivo das posições sem valor que são interpoladas junto com os outliers
+MOTIVO_LACUNA = 'lacuna'
+
+# Fator que converte o MAD no desvio padrão de uma distribuição normal
+FATOR_MAD = 1.4826
+
+def limiar_outlier(recorte, media_referencia):
+    """Limiar de outlier da referência de um recorte"""
+    if recorte['nome'] == SUBSISTEMA_PADRAO:
+        return LIMIAR_OUTLIER
+    # Dois algarismos significativos: o limiar (e a camada gravada) não muda a cada mês novo
+    return float(f"{FRACAO_LIMIAR_OUTLIER * media_referencia:.2g}")
+
+def detectar_limiar(valores, limiar=LIMIAR_OUTLIER):
+    """Valores abaixo do limiar (referência quase zerada)"""
+    return valores < limiar
+
+def mediana_por_blocos(valores, janela):
+    """
+    Mediana, ignorando NaN, de cada bloco de `janela` amostras seguidas contado a
+    partir da posição 0 (o último pode ser menor), repetida nas posições do bloco.
+    Blocos sem lacunas usam seleção linear (np.partition): O(n) na série inteira
+    """
+    n = len(valores)
+    n_blocos = -(-n // janela)
+    matriz = np.full(n_blocos * janela, np.nan)
+    matriz[:n] = valores
+    matriz = matriz.reshape(n_blocos, janela)
+
+    medianas = np.full(n_blocos, np.nan)
+    lacunas = np.isnan(matriz)
+    completos = ~lacunas.any(axis=1)
+    meios = sorted({(janela - 1) // 2, janela // 2})
+    if completos.any():
+        selecionados = np.partition(matriz[completos], meios, axis=1)
+        medianas[completos] = selecionados[:, meios].mean(axis=1)
+    parciais = ~completos & ~lacunas.all(axis=1)
+    if parciais.any():
+        medianas[parciais] = np.nanmedian(matriz[parciais], axis=1)
+    return np.repeat(medianas, janela)[:n]
+
+def detectar_hampel(valores, janela=48, n_desvios=3.0):
+    """
+    Filtro de Hampel por blocos: valores que se afastam da mediana do seu bloco
+    de `janela` amostras mais de `n_desvios` desvios robustos (1,4826 × MAD do
+    bloco). Blocos fixos (e não uma janela deslizante) mantêm o custo linear;
+    trechos com MAD nulo (valor constante) ficam para o detector de valor travado
+    """
+    mediana = mediana_por_blocos(valores, janela)
+    desvio = np.abs(valores - mediana)
+    mad = mediana_por_blocos(desvio, janela)
+    with np.errstate(invalid='ignore'):
+        return (desvio > n_desvios * FATOR_MAD * mad) & (mad > 0)
+
+def detectar_valor_travado(valores, repeticoes=6):
+    """
+    Trechos com `repeticoes` ou mais amostras seguidas exatamente iguais
+    (medição congelada); lacunas (NaN) interrompem o trecho
+    """
+    if len(valores) == 0:
+        return np.zeros(0, dtype=bool)
+    inicios = np.flatnonzero(np.r_[True, valores[1:] != valores[:-1]])
+    comprimentos = np.diff(np.r_[inicios, len(valores)])
+    return np.repeat(comprimentos >= repeticoes, comprimentos) & ~np.isnan(valores)
+
+# Detectores disponíveis: função, parâmetros padrão, alcance (amostras
+# vizinhas, de cada lado, que podem mudar a decisão em uma posição) e bloco
+# (a avaliação de um trecho deve começar em múltiplo dele para dar o mesmo
+# resultado que a série inteira)
+DETECTORES = {
+    'limiar': {
+        'funcao': detectar_limiar,
+        'parametros': {'limiar': LIMIAR_OUTLIER},
+        'alcance': lambda parametros: 0,
+        'bloco': lambda parametros: 1
+    },
+    'hampel': {
+        'funcao': detectar_hampel,
+        'parametros': {'janela': 48, 'n_desvios': 3.0},
+        # mediana e MAD do bloco da posição: até uma janela de cada lado
+        'alcance': lambda parametros: parametros['janela'],
+        'bloco': lambda parametros: parametros['janela']
+    },
+    'travado': {
+        'funcao': detectar_valor_travado,
+        'parametros': {'repeticoes': 6},
+        'alcance': lambda parametros: parametros['repeticoes'],
+        'bloco': lambda parametros: 1
+    }
+}
+
+def configurar_detectores(nomes, limiar=LIMIAR_OUTLIER):
+    """Detectores escolhidos (na ordem de prioridade) com os parâmetros de cada um"""
+    detectores = {}
+    for nome in nomes:
+        if nome not in DETECTORES:
+            raise ValueError(f"Detector desconhecido: {nome}")
+        detectores[nome] = dict(DETECTORES[nome]['parametros'])
+    if 'limiar' in detectores:
+        detectores['limiar']['limiar'] = float(limiar)
+    return detectores
+
+def alcance_detectores(detectores):
+    """Maior alcance entre os detectores configurados"""
+    return max((DETECTORES[nome]['alcance'](parametros) for nome, parametros in detectores.items()), default=0)
+
+def bloco_detectores(detectores):
+    """Menor bloco comum aos detectores configurados (onde um trecho avaliado pode começar)"""
+    return math.lcm(1, *(DETECTORES[nome]['bloco'](parametros) for nome, parametros in detectores.items()))
+
+def detectar(valores, detectores, inicio=0):
+    """
+    Código do primeiro detector que marca cada posição a partir de `inicio`
+    (1, 2... na ordem de `detectores`; 0 = não marcada). Só o trecho
+    [inicio - alcance, n), recuado até o início de um bloco, é avaliado
+    """
+    contexto = max(inicio - alcance_detectores(detectores), 0)
+    contexto -= contexto % bloco_detectores(detectores)
+    trecho = valores[contexto:]
+    codigos = np.zeros(len(trecho), dtype=np.int8)
+    for codigo, (nome, parametros) in enumerate(detectores.items(), start=1):
+        marcados = DETECTORES[nome]['funcao'](trecho, **parametros) & (codigos == 0)
+        codigos[marcados] = codigo
+    return codigos[inicio - contexto:]
+
+def camada_vazia(detectores):
+    """Camada de correções sem nenhuma posição"""
+    return {
+        'motivos': [MOTIVO_LACUNA] + list(detectores),
+        'posicoes': np.zeros(0, dtype=np.int64),
+        'codigos': np.zeros(0, dtype=np.int8),
+        'original': np.zeros(0, dtype=np.float32),
+        'corrigido': np.zeros(0, dtype=np.float32)
+    }
+
+def calcular_camada(valores, detectores, anterior=None, inicio=0):
+    """
+    Camada esparsa de correções da série: as posições marcadas por algum detector
+    e, se houver ao menos uma, também as lacunas (NaN) são interpoladas linearmente
+    pela posição entre os valores válidos (nas pontas vale o mais próximo).
+    Com `anterior` (camada já calculada, com posições na série atual), só as
+    posições a partir de `inicio` (dados novos ou alterados), mais o alcance dos
+    detectores, são reavaliadas; as anteriores são reaproveitadas
+    """
+    camada = camada_vazia(detectores)
+    n = len(valores)
+    if anterior is None:
+        inicio = 0
+    inicio = min(max(inicio - alcance_detectores(detectores), 0), n)
+
+    codigos_novos = detectar(valores, detectores, inicio)
+    if anterior is not None:
+        mantidos = anterior['posicoes'] < inicio
+        posicoes_antes = anterior['posicoes'][mantidos]
+        codigos_antes = anterior['codigos'][mantidos]
+        valores_antes = anterior['corrigido'][mantidos]
+        marcados_antes = codigos_antes > 0
+    else:
+        posicoes_antes = np.zeros(0, dtype=np.int64)
+        codigos_antes = np.zeros(0, dtype=np.int8)
+        valores_antes = np.zeros(0, dtype=np.float32)
+        marcados_antes = np.zeros(0, dtype=bool)
+
+    if not marcados_antes.any() and not codigos_novos.any():
+        return camada
+
+    # Sem outliers antes de `inicio`, as lacunas anteriores ainda não estavam na camada
+    interpolar_desde = inicio
+    if not marcados_antes.any():
+        lacunas = np.flatnonzero(np.isnan(valores[:inicio]))
+        posicoes_antes = lacunas
+        codigos_antes = np.zeros(len(lacunas), dtype=np.int8)
+        valores_antes = np.full(len(lacunas), np.nan, dtype=np.float32)
+        interpolar_desde = 0
+
+    # Lacunas não marcadas no trecho reavaliado recebem o código 0 (lacuna)
+    trecho = valores[inicio:]
+    corrigir = (codigos_novos > 0) | np.isnan(trecho)
+    posicoes = np.r_[posicoes_antes, inicio + np.flatnonzero(corrigir)].astype(np.int64)
+    codigos = np.r_[codigos_antes, codigos_novos[corrigir]].astype(np.int8)
+    corrigido = np.r_[valores_antes, np.full(corrigir.sum(), np.nan, dtype=np.float32)].astype(np.float32)
+
+    # Último valor válido antes do trecho reinterpolado (as correções até ele não
+    # mudam): fim das posições corrigidas seguidas que terminam em interpolar_desde - 1
+    antes = posicoes[posicoes < interpolar_desde]
+    divergentes = np.flatnonzero(antes != interpolar_desde - len(antes) + np.arange(len(antes)))
+    seguidas = len(antes) - (divergentes[-1] + 1 if len(divergentes) else 0)
+    ancora = max(interpolar_desde - 1 - seguidas, 0)
+
+    reinterpolar = posicoes >= ancora
+    validos = np.ones(n - ancora, dtype=bool)
+    validos[posicoes[reinterpolar] - ancora] = False
+    xp = ancora + np.flatnonzero(validos)
+    if len(xp) > 0:
+        corrigido[reinterpolar] = np.interp(posicoes[reinterpolar], xp, valores[xp])
+    else:
+        corrigido[reinterpolar] = np.nan
+
+    camada.update(posicoes=posicoes, codigos=codigos, original=valores[posicoes].astype(np.float32),
+                  corrigido=corrigido)
+    return camada
+
+def aplicar_camada(valores, camada):
+    """Cópia da série com as correções da camada aplicadas"""
+    corrigidos = np.array(valores, dtype=np.float32, copy=True)
+    corrigidos[camada['posicoes']] = camada['corrigido']
+    return corrigidos
+
+def resumo_camada(camada):
+    """Quantidade de correções por motivo"""
+    contagens = np.bincount(camada['codigos'], minlength=len(camada['motivos']))
+    return dict(zip(camada['motivos'], contagens.tolist()))
+
+def hash_detectores(detectores):
+    """Hash da configuração dos detectores, registrado junto com a camada"""
+    return hash_texto(VERSAO_CORRECOES, json.dumps(detectores, sort_keys=True))
+
+def gravar_camada(arquivo, camada, instantes, metadados):
+    """
+    Grava a camada em Parquet (instante, motivo, valor original e corrigido),
+    com `metadados` (configuração e partições de origem) no esquema do arquivo
+    """
+    motivos = np.array(camada['motivos'], dtype=object)[camada['codigos']]
+    tabela = pa.table({
+        'timestamp': np.asarray(instantes, dtype='datetime64[s]')[camada['posicoes']].astype(np.int64),
+        'motivo': pa.array(motivos, type=pa.string()).dictionary_encode(),
+        'original': camada['original'],
+        'corrigido': camada['corrigido']
+    })
+    tabela = tabela.replace_schema_metadata({'correcoes': json.dumps(metadados)})
+    gravar_atomico(arquivo, lambda destino: pq.write_table(tabela, destino))
+
+def ler_camada(arquivo, instantes, detectores):
+    """
+    Lê uma camada gravada e a posiciona na série atual. Retorna (camada,
+    metadados), ou (None, None) se o arquivo não existir, for de outra
+    configuração ou tiver instantes que não estão mais na série
+    """
+    if not os.path.exists(arquivo):
+        return None, None
+    try:
+        tabela = pq.read_table(arquivo)
+        metadados = json.loads(tabela.schema.metadata[b'correcoes'])
+    except (OSError, ValueError, KeyError, TypeError, pa.ArrowException):
+        return None, None
+    if metadados.get('hash_detectores') != hash_detectores(detectores):
+        return None, None
+
+    segundos = np.asarray(instantes, dtype='datetime64[s]').astype(np.int64)
+    gravados = tabela['timestamp'].to_numpy()
+    posicoes = np.searchsorted(segundos, gravados)
+    if (posicoes >= len(segundos)).any() or (segundos[np.minimum(posicoes, len(segundos) - 1)] != gravados).any():
+        return None, None
+
+    camada = camada_vazia(detectores)
+    codigo_motivo = {motivo: codigo for codigo, motivo in enumerate(camada['motivos'])}
+    camada.update(
+        posicoes=posicoes.astype(np.int64),
+        codigos=np.array([codigo_motivo[motivo] for motivo in tabela['motivo'].to_pylist()], dtype=np.int8),
+        original=tabela['original'].to_numpy().astype(np.float32),
+        corrigido=tabela['corrigido'].to_numpy().astype(np.float32)
+    )
+    return camada, metadados
+
+def primeira_particao_alterada(particoes_anteriores, particoes_atuais):
+    """
+    Primeira partição ('AAAA-MM') cujo checksum mudou em alguma fonte desde a
+    camada gravada; None se nada mudou. Partição removida exige reavaliar tudo ('')
+    """
+    alteradas = []
+    for nome_fonte, atuais in particoes_atuais.items():
+        anteriores = particoes_anteriores.get(nome_fonte, {})
+        if set(anteriores) - set(atuais):
+            return ''
+        alteradas += [chave for chave, sha in atuais.items() if anteriores.get(chave) != sha]
+    if set(particoes_anteriores) - set(particoes_atuais):
+        return ''
+    return min(alteradas) if alteradas else None
+
+def tratar_outliers_referencia(df, detectores, arquivo_correcoes=None, particoes=None):
+    """
+    Trata outliers na geração de referência com os detectores configurados
+    (por padrão, só o limiar de 1000 MW). As correções formam uma camada esparsa
+    gravada em `arquivo_correcoes`; com a camada da execução anterior e os
+    checksums das partições de origem (`particoes`), só os meses alterados
+    (mais o contexto dos detectores) são reavaliados.
+    A coluna corrigida é aplicada ao DataFrame, sem copiá-lo
+    """
+    print("\nTratando outliers na geração de referência...")
+
+    referencia = df['geracao_referencia_total'].to_numpy(dtype=np.float32)
+    instantes_df = df['timestamp'].to_numpy()
+
+    # Reaproveitar a camada anterior até a primeira partição alterada
+    anterior, inicio = None, 0
+    if arquivo_correcoes is not None:
+        anterior, metadados = ler_camada(arquivo_correcoes, instantes_df, detectores)
+        if anterior is not None:
+            alterada = primeira_particao_alterada(metadados['particoes'], particoes)
+            if alterada is None:
+                inicio = len(referencia)
+            elif alterada:
+                inicio = int(np.searchsorted(instantes_df, np.datetime64(f"{alterada}-01")))
+            else:
+                anterior = None
+    if anterior is not None:
+        print(f"Camada de correções anterior reaproveitada até a posição {inicio} de {len(referencia)}")
+
+    camada = calcular_camada(referencia, detectores, anterior, inicio)
+    if arquivo_correcoes is not None:
+        gravar_camada(arquivo_correcoes, camada, instantes_df, {
+            'hash_detectores': hash_detectores(detectores),
+            'detectores': detectores,
+            'particoes': particoes
+        })
+
+    resumo = resumo_camada(camada)
+    for nome, parametros in detectores.items():
+        if nome == 'limiar':
+            print(f"Outliers detectados (< {parametros['limiar']:.0f} MW): {resumo[nome]}")
+        else:
+            print(f"Outliers detectados ({nome}, {parametros}): {resumo[nome]}")
+
+    outliers = camada['codigos'] > 0
+    if outliers.any():
+        print(f"Lacunas interpoladas: {resumo['lacuna']}")
+        df['geracao_referencia_total'] = aplicar_camada(referencia, camada)
+
+        # Estatísticas do tratamento
+        valores_corrigidos = camada['corrigido'][outliers]
+        if np.isnan(valores_corrigidos).all():
+            print("Nenhum valor válido para interpolar.")
+            return df
+        print(f"Valores corrigidos - Mínimo: {valores_corrigidos.min():.2f} MW")
+        print(f"Valores corrigidos - Máximo: {valores_corrigidos.max():.2f} MW")
+        print(f"Valores corrigidos - Média: {valores_corrigidos.mean():.2f} MW")
+    else:
+        print("Nenhum outlier detectado.")
+
+    return df
@@ -0,0 +1,171 @@
+"""
+Execução fora da memória: as partições mensais do armazenamento são lidas
+uma a uma e passam pelo tratamento de outliers, pela modulação e pelas
+agregações sem que a série inteira seja carregada. Só ficam em memória o
+mês corrente, o estado da interpolação entre meses e os agregados parciais
+(médias diárias, mensais e modulação por mês), que crescem com o número de
+dias e não com o número de linhas
+"""
+import numpy as np
+import pandas as pd
+
+from alinhamento import alinhar_fontes
+from armazenamento import ler_particao, listar_particoes
+from grade_temporal import criar_grade
+from modulacao import SERIES, modulacao_por_periodo
+from outliers import alcance_detectores, bloco_detectores, configurar_detectores, detectar
+
+def iterar_particoes(diretorio, colunas=None):
+    """Gera (ano, mes, DataFrame) de cada partição de um dataset, em ordem"""
+    for ano, mes in listar_particoes(diretorio):
+        yield ano, mes, ler_particao(diretorio, ano, mes, colunas)
+
+def iterar_meses_combinados(dir_restricao, dir_renovaveis=None, coluna_previsao='NE_UEE'):
+    """
+    Gera (ano, mes, DataFrame) com restrição eólica e previsão juntas por
+    instante, mês a mês (mesmo resultado de combinar_fontes, por partição).
+    Sem `dir_renovaveis` (recortes sem previsão), só a restrição eólica
+    """
+    colunas_restricao = ['geracao_total', 'geracao_referencia_total']
+    if dir_renovaveis is None:
+        for ano, mes, df in iterar_particoes(dir_restricao, colunas_restricao):
+            yield ano, mes, df
+        return
+
+    meses = sorted(set(listar_particoes(dir_restricao)) | set(listar_particoes(dir_renovaveis)))
+    for ano, mes in meses:
+        yield ano, mes, alinhar_fontes([ler_particao(dir_restricao, ano, mes, colunas_restricao),
+                                        ler_particao(dir_renovaveis, ano, mes, [coluna_previsao])])
+
+def media_referencia(dir_restricao):
+    """Média da referência lendo só essa coluna, partição a partição"""
+    soma, contagem = 0.0, 0
+    for _, _, df in iterar_particoes(dir_restricao, ['geracao_referencia_total']):
+        referencia = df['geracao_referencia_total'].to_numpy(dtype=np.float64)
+        referencia = referencia[~np.isnan(referencia)]
+        soma += referencia.sum()
+        contagem += len(referencia)
+    return soma / contagem if contagem else 0.0
+
+def detectar_em_partes(partes, detectores):
+    """
+    Recebe (ano, mes, DataFrame) e gera (ano, mes, DataFrame, marcados) com as
+    posições da referência marcadas pelos detectores, as mesmas de detectar
+    sobre a série inteira. Cada parte só é avaliada quando o alcance dos
+    detectores depois dela já foi lido; antes dela fica guardado o contexto
+    (alcance recuado até o início de um bloco), nunca a série inteira
+    """
+    alcance = alcance_detectores(detectores)
+    bloco = bloco_detectores(detectores)
+    pendentes = []
+    trecho = np.zeros(0, dtype=np.float32)
+    origem = 0
+    posicao = 0
+
+    def avaliar():
+        nonlocal trecho, origem
+        parte = pendentes.pop(0)
+        inicio = parte['posicao'] - origem
+        marcados = detectar(trecho, detectores, inicio)[:parte['n']] > 0
+        # Descarta o que não é mais contexto da próxima parte
+        proxima = pendentes[0]['posicao'] if pendentes else parte['posicao'] + parte['n']
+        contexto = max(proxima - alcance, 0)
+        contexto -= contexto % bloco
+        trecho, origem = trecho[contexto - origem:], contexto
+        return parte['ano'], parte['mes'], parte['df'], marcados
+
+    for ano, mes, df in partes:
+        referencia = df['geracao_referencia_total'].to_numpy(dtype=np.float32)
+        pendentes.append({'ano': ano, 'mes': mes, 'df': df, 'posicao': posicao, 'n': len(referencia)})
+        trecho = np.r_[trecho, referencia]
+        posicao += len(referencia)
+        while pendentes and posicao - (pendentes[0]['posicao'] + pendentes[0]['n']) >= alcance:
+            yield avaliar()
+    while pendentes:
+        yield avaliar()
+
+def contar_outliers(partes, detectores):
+    """
+    Conta os outliers de referência das partes (ano, mes, DataFrame), como
+    detectar_em_partes. Como em tratar_outliers_referencia, a interpolação só é
+    aplicada se houver algum
+    """
+    return sum(int(marcados.sum()) for _, _, _, marcados in detectar_em_partes(partes, detectores))
+
+def interpolar_pendente(parte, anterior, proximo):
+    """
+    Interpola (pela posição) os valores ausentes da referência de uma parte,
+    usando o último ponto válido antes dela e o primeiro depois, se houver
+    """
+    referencia, posicoes = parte['referencia'], parte['posicoes']
+    validos = ~np.isnan(referencia)
+    xp = posicoes[validos]
+    fp = referencia[validos]
+    if anterior is not None:
+        xp, fp = np.r_[anterior[0], xp], np.r_[anterior[1], fp]
+    if proximo is not None:
+        xp, fp = np.r_[xp, proximo[0]], np.r_[fp, proximo[1]]
+    if len(xp) > 0:
+        faltantes = ~validos
+        referencia[faltantes] = np.interp(posicoes[faltantes], xp, fp)
+    parte['df']['geracao_referencia_total'] = referencia
+    return parte['ano'], parte['mes'], parte['df']
+
+def tratar_outliers_em_partes(partes, detectores=None):
+    """
+    Versão incremental de tratar_outliers_referencia: recebe e gera
+    (ano, mes, DataFrame) com os outliers (de `detectores`, por padrão só o
+    limiar) e lacunas da referência interpolados linearmente pela posição na
+    série inteira. Um mês só é liberado quando o próximo valor válido depois
+    dele é conhecido; os meses retidos são apenas os que terminam sem
+    referência válida (normalmente o corrente).
+    Quem chama decide, com contar_outliers, se o tratamento se aplica
+    """
+    if detectores is None:
+        detectores = configurar_detectores(['limiar'])
+    anterior = None
+    pendentes = []
+    posicao = 0
+    for ano, mes, df, marcados in detectar_em_partes(partes, detectores):
+        referencia = df['geracao_referencia_total'].to_numpy(dtype=np.float32, copy=True)
+        referencia[marcados] = np.nan
+
+        posicoes = np.arange(posicao, posicao + len(referencia))
+        posicao += len(referencia)
+        pendentes.append({'ano': ano, 'mes': mes, 'df': df, 'referencia': referencia, 'posicoes': posicoes})
+
+        validos = np.flatnonzero(~np.isnan(referencia))
+        if len(validos) == 0:
+            continue
+
+        # O primeiro valor válido desta parte fecha as partes retidas antes dela
+        proximo = (posicoes[validos[0]], referencia[validos[0]])
+        for parte in pendentes[:-1]:
+            yield interpolar_pendente(parte, anterior, proximo)
+            if len(parte['posicoes']) > 0:
+                anterior = (parte['posicoes'][-1], parte['referencia'][-1])
+        pendentes = pendentes[-1:]
+
+        # A parte atual só é liberada se terminar em valor válido
+        if validos[-1] == len(referencia) - 1:
+            yield interpolar_pendente(pendentes.pop(), anterior, None)
+            anterior = (posicoes[-1], referencia[-1])
+
+    for parte in pendentes:
+        yield interpolar_pendente(parte, anterior, None)
+        if (~np.isnan(parte['referencia'])).any():
+            anterior = (parte['posicoes'][-1], parte['referencia'][-1])
+
+def modulacao_por_particao(diretorio, series=SERIES):
+    """
+    Modulação média por ano/mês/hora lendo o dataset partição a partição
+    (mesmo resultado de modulacao_por_periodo sobre a série inteira)
+    """
+    resultados = [
+        modulacao_por_periodo(criar_grade(df, list(series)), 'mes', series)
+        for _, _, df in iterar_particoes(diretorio, list(series))
+        if len(df) > 0
+    ]
+    if not resultados:
+        return pd.DataFrame(columns=['ano', 'mes', 'hora_int'] + list(series.values()))
+    return pd.concat(resultados, ignore_index=True)
@@ -0,0 +1,203 @@
+"""
+Índice de qualidade dos dados, por fonte e por dia
+Para cada dia o índice registra as semi-horas presentes (máscara de 48 bits),
+as linhas sem valor e os instantes fora da grade de 30 min, além das
+suspeitas de mudança de horário de verão (uma hora inteira faltando). Os
+instantes repetidos não entram: o armazenamento guarda uma linha por
+instante. As contagens de cada partição (fonte e mês) são gravadas junto com
+os dados, com o checksum da partição: a cada execução só as partições novas
+ou alteradas são lidas. Os demais estágios consultam o índice para descartar
+dias incompletos, sem reprocurar lacunas na série; dele também sai o
+relatório de cobertura por mês e fonte
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from armazenamento import atualizar_por_particao, checksums_particoes, ler_manifesto, ler_particao
+from grade_temporal import PASSO_SEGUNDOS, PONTOS_POR_DIA, para_segundos
+
+# Arquivo do índice no diretório de dados do recorte
+ARQUIVO_QUALIDADE = 'qualidade.parquet'
+
+# Versão do formato gravado (muda a versão, o índice é refeito)
+VERSAO_QUALIDADE = 2
+
+# Contagens diárias de cada partição
+CONTAGENS = ['presentes', 'sem_valor', 'fora_da_grade', 'mascara']
+
+# Máscara de um dia com todas as semi-horas presentes
+DIA_COMPLETO = (1 << PONTOS_POR_DIA) - 1
+
+# Máscaras de cada hora inteira (duas semi-horas seguidas)
+HORAS_INTEIRAS = np.array([3 << (2 * hora) for hora in range(PONTOS_POR_DIA // 2)], dtype=np.int64)
+
+def contar_bits(mascaras):
+    """Quantidade de bits ligados em cada máscara int64"""
+    mascaras = np.ascontiguousarray(mascaras, dtype=np.int64)
+    return np.unpackbits(mascaras.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def periodo_das_fontes(diretorios_fontes):
+    """Primeiro dia e número de dias cobertos por alguma das fontes (pelos manifestos)"""
+    inicios, fins = [], []
+    for diretorio in diretorios_fontes.values():
+        manifesto = ler_manifesto(diretorio) or {}
+        if manifesto.get('inicio') is not None:
+            inicios.append(np.datetime64(manifesto['inicio'], 'D'))
+            fins.append(np.datetime64(manifesto['fim'], 'D'))
+    if not inicios:
+        return np.datetime64('1970-01-01', 'D'), 0
+    return min(inicios), int((max(fins) - min(inicios)).astype(int)) + 1
+
+def indexar_particao(df, colunas, ano, mes):
+    """
+    Contagens por dia de uma partição (linhas ordenadas, um instante por
+    linha): presentes, sem valor, fora da grade e máscara de presença
+    """
+    mes_inicial = np.datetime64(f"{ano}-{mes:02d}", 'M')
+    dia_inicial = mes_inicial.astype('datetime64[D]')
+    n_dias = int(((mes_inicial + 1).astype('datetime64[D]') - dia_inicial).astype(np.int64))
+    segundos = para_segundos(df['timestamp'].to_numpy())
+    dias = segundos // 86400 - dia_inicial.astype(np.int64)
+    semi_hora = (segundos % 86400) // PASSO_SEGUNDOS
+    bits = np.ldexp(1.0, semi_hora)
+
+    na_grade = segundos % PASSO_SEGUNDOS == 0
+    sem_valor = np.isnan(df[colunas].to_numpy(dtype=np.float32)).any(axis=1)
+
+    def por_dia(selecao, pesos=None):
+        return np.bincount(dias[selecao], weights=None if pesos is None else pesos[selecao], minlength=n_dias)
+
+    return pd.DataFrame({
+        'data': dia_inicial + np.arange(n_dias),
+        'presentes': por_dia(na_grade).astype(np.int32),
+        'sem_valor': por_dia(na_grade & sem_valor).astype(np.int32),
+        'fora_da_grade': por_dia(~na_grade).astype(np.int32),
+        # Soma de potências de 2 distintas (< 2^48): exata em float64
+        'mascara': por_dia(na_grade, bits).astype(np.int64)
+    })
+
+def ler_contagens(tabela, particoes):
+    """Contagens gravadas de cada partição ('fonte/AAAA-MM'), {partição: DataFrame}"""
+    contagens = tabela.to_pandas()
+    contagens['data'] = contagens['data'].to_numpy(dtype='datetime64[D]')
+    return {particao: contagens.loc[contagens['particao'] == particao, ['data'] + CONTAGENS].reset_index(drop=True)
+            for particao in particoes}
+
+def tabelar_contagens(por_particao):
+    """Tabela a gravar: as contagens diárias de todas as partições, com a coluna 'particao'"""
+    partes = [contagens.assign(particao=particao) for particao, contagens in por_particao.items()]
+    contagens = (pd.concat(partes, ignore_index=True) if partes
+                 else pd.DataFrame(columns=['data'] + CONTAGENS + ['particao']))
+    return pa.Table.from_pandas(contagens[['particao', 'data'] + CONTAGENS], preserve_index=False)
+
+def indexar_fonte(contagens, dia_inicial, n_dias):
+    """Índice diário de uma fonte no calendário comum, a partir das contagens das suas partições"""
+    indice = pd.DataFrame({'data': dia_inicial + np.arange(n_dias)})
+    posicao = (contagens['data'].to_numpy(dtype='datetime64[D]') - dia_inicial).astype(np.int64)
+    dentro_do_calendario = (posicao >= 0) & (posicao < n_dias)
+    for chave in CONTAGENS:
+        valores = np.zeros(n_dias, dtype=np.int64)
+        valores[posicao[dentro_do_calendario]] = contagens[chave].to_numpy()[dentro_do_calendario]
+        indice[chave] = valores if chave == 'mascara' else valores.astype(np.int32)
+
+    presentes = indice['presentes'].to_numpy()
+    faltantes = DIA_COMPLETO ^ indice['mascara'].to_numpy()
+    primeiro, ultimo = np.flatnonzero(presentes)[[0, -1]] if presentes.any() else (0, -1)
+    dentro = (np.arange(n_dias) > primeiro) & (np.arange(n_dias) < ultimo)
+    indice['suspeita_horario_verao'] = dentro & np.isin(faltantes, HORAS_INTEIRAS)
+    return indice
+
+def construir_indice(diretorios_fontes, colunas_fontes, arquivo):
+    """
+    Índice de qualidade (uma linha por fonte e dia) de todas as fontes, sobre o
+    mesmo calendário: dias sem nenhum registro também aparecem, com presentes = 0.
+    As contagens por partição ficam em `arquivo`; só as partições novas ou
+    alteradas (pelo checksum do manifesto) são lidas
+    """
+    checksums = {f"{nome_fonte}/{particao}": checksum
+                 for nome_fonte, diretorio in diretorios_fontes.items()
+                 for particao, checksum in checksums_particoes(diretorio).items()}
+
+    def resumir(particao):
+        nome_fonte, ano_mes = particao.split('/')
+        ano, mes = (int(parte) for parte in ano_mes.split('-'))
+        colunas = colunas_fontes[nome_fonte]
+        return indexar_particao(ler_particao(diretorios_fontes[nome_fonte], ano, mes, colunas), colunas, ano, mes)
+
+    por_particao, novas = atualizar_por_particao(
+        arquivo, 'qualidade', VERSAO_QUALIDADE, {'colunas': {fonte: list(colunas)
+                                                             for fonte, colunas in colunas_fontes.items()}},
+        checksums, resumir, ler_contagens, tabelar_contagens)
+    print(f"  Índice de qualidade: {novas} partições indexadas, {len(por_particao) - novas} reaproveitadas")
+
+    dia_inicial, n_dias = periodo_das_fontes(diretorios_fontes)
+    partes = []
+    for nome_fonte in diretorios_fontes:
+        contagens = [resumo for particao, resumo in por_particao.items() if particao.split('/')[0] == nome_fonte]
+        contagens = (pd.concat(contagens, ignore_index=True) if contagens
+                     else pd.DataFrame({'data': np.array([], dtype='datetime64[D]'),
+                                        **{chave: np.array([], dtype=np.int64) for chave in CONTAGENS}}))
+        indice = indexar_fonte(contagens, dia_inicial, n_dias)
+        indice.insert(0, 'fonte', nome_fonte)
+        partes.append(indice)
+    return pd.concat(partes, ignore_index=True)
+
+def relatorio_cobertura(indice):
+    """
+    Cobertura por mês e fonte: semi-horas esperadas e presentes, lacunas, dias
+    incompletos e sem dados, linhas sem valor, fora da grade, suspeitas de
+    horário de verão e semi-horas presentes só nesta fonte
+    (as que o merge com as demais completa com NaN)
+    """
+    mascaras = indice.pivot(index='data', columns='fonte', values='mascara')
+    relatorio = []
+    for nome_fonte, grupo in indice.groupby('fonte', sort=False):
+        outras = np.zeros(len(mascaras), dtype=np.int64)
+        for outra in mascaras.columns.drop(nome_fonte):
+            outras |= mascaras[outra].to_numpy()
+        somente = contar_bits(mascaras[nome_fonte].to_numpy() & ~outras) if len(mascaras.columns) > 1 \
+            else np.zeros(len(mascaras), dtype=np.int64)
+
+        grupo = grupo.assign(
+            mes=grupo['data'].to_numpy(dtype='datetime64[M]'),
+            incompleto=(grupo['presentes'] > 0) & (grupo['presentes'] < PONTOS_POR_DIA),
+            sem_dados=grupo['presentes'] == 0,
+            somente_nesta_fonte=pd.Series(somente, index=mascaras.index).reindex(grupo['data']).to_numpy()
+        )
+        mensal = grupo.groupby('mes').agg(
+            dias=('data', 'size'),
+            presentes=('presentes', 'sum'),
+            dias_incompletos=('incompleto', 'sum'),
+            dias_sem_dados=('sem_dados', 'sum'),
+            sem_valor=('sem_valor', 'sum'),
+            fora_da_grade=('fora_da_grade', 'sum'),
+            suspeitas_horario_verao=('suspeita_horario_verao', 'sum'),
+            somente_nesta_fonte=('somente_nesta_fonte', 'sum')
+        ).reset_index()
+        mensal.insert(1, 'fonte', nome_fonte)
+        mensal.insert(3, 'esperados', mensal['dias'] * PONTOS_POR_DIA)
+        mensal.insert(5, 'lacunas', mensal['esperados'] - mensal['presentes'])
+        mensal.insert(6, 'cobertura_pct', 100.0 * mensal['presentes'] / mensal['esperados'])
+        relatorio.append(mensal)
+
+    relatorio = pd.concat(relatorio, ignore_index=True).sort_values(['mes', 'fonte'], kind='stable')
+    relatorio['mes'] = pd.to_datetime(relatorio['mes']).dt.strftime('%Y-%m')
+    return relatorio.reset_index(drop=True)
+
+def dias_invalidos(indice, cobertura_minima):
+    """
+    Dias em que alguma fonte tem menos de `cobertura_minima` (fração de 0 a 1)
+    das 48 semi-horas; dias sem nenhum registro em todas as fontes não entram
+    """
+    if indice is None or cobertura_minima <= 0:
+        return np.array([], dtype='datetime64[D]')
+    por_dia = indice.groupby('data')['presentes']
+    invalidos = (por_dia.min() < cobertura_minima * PONTOS_POR_DIA) & (por_dia.max() > 0)
+    return invalidos.index[invalidos.to_numpy()].to_numpy(dtype='datetime64[D]')
+
+def descartar_dias(df, dias, coluna_tempo='timestamp'):
+    """Linhas do DataFrame fora dos dias informados (sem cópia se não houver nenhum)"""
+    if len(dias) == 0:
+        return df
+    return df[~np.isin(df[coluna_tempo].to_numpy(dtype='datetime64[D]'), dias)].reset_index(drop=True)
@@ -0,0 +1,184 @@
+"""
+Sketches de quantis (t-digest) para os envelopes climatológicos da modulação
+Cada sketch resume uma distribuição em centroides (média e peso), mais o
+mínimo e o máximo; sketches se mesclam concatenando e recomprimindo os
+centroides, então podem ser atualizados com novos dias e somados entre
+partições, subsistemas ou processos sem rever os valores originais.
+Há um sketch por partição (mês), série e hora do dia, gravado ao lado da
+série completa: a cada execução só as partições cujo checksum mudou são
+resumidas de novo, e o envelope P10/P50/P90 de cada mês e hora sai da
+mescla dos sketches daquele mês em todos os anos
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from armazenamento import atualizar_por_particao, checksums_particoes, ler_particao
+from grade_temporal import criar_grade
+from modulacao import HORA_INT, N_HORAS, SERIES, modulacao_diaria
+
+# Arquivo dos sketches, no diretório de dados ao lado da série completa
+ARQUIVO_QUANTIS = 'quantis_modulacao.parquet'
+
+# Versão do formato gravado (muda a versão, os sketches são refeitos)
+VERSAO_QUANTIS = 1
+
+# Compressão do t-digest: ~compressão centroides por sketch, com os das caudas menores
+COMPRESSAO_PADRAO = 100
+
+# Quantis do envelope climatológico
+QUANTIS_ENVELOPE = (0.1, 0.5, 0.9)
+
+def digest_vazio():
+    """Sketch sem nenhum valor"""
+    return {'medias': np.empty(0), 'pesos': np.empty(0), 'minimo': np.nan, 'maximo': np.nan}
+
+def comprimir(medias, pesos, minimo, maximo, compressao=COMPRESSAO_PADRAO):
+    """
+    Ordena os centroides e funde os vizinhos que caem na mesma unidade da
+    escala k1 (k = δ/2π · asin(2q − 1)), que é íngreme nas caudas: lá os
+    centroides ficam pequenos e os quantis extremos, precisos
+    """
+    ordem = np.argsort(medias, kind='stable')
+    medias, pesos = medias[ordem], pesos[ordem]
+    if len(medias) > compressao:
+        total = pesos.sum()
+        q_esquerda = (np.cumsum(pesos) - pesos) / total
+        escala = compressao / (2 * np.pi) * np.arcsin(np.clip(2 * q_esquerda - 1, -1, 1))
+        grupos = np.floor(escala)
+        inicios = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]])
+        somas = np.add.reduceat(medias * pesos, inicios)
+        pesos = np.add.reduceat(pesos, inicios)
+        medias = somas / pesos
+    return {'medias': medias, 'pesos': pesos, 'minimo': minimo, 'maximo': maximo}
+
+def digest_de_valores(valores, compressao=COMPRESSAO_PADRAO):
+    """Sketch dos valores finitos de um vetor"""
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[np.isfinite(valores)]
+    if len(valores) == 0:
+        return digest_vazio()
+    return comprimir(valores, np.ones(len(valores)), valores.min(), valores.max(), compressao)
+
+def mesclar_digests(digests, compressao=COMPRESSAO_PADRAO):
+    """Mescla sketches (de meses, anos, subsistemas ou processos diferentes)"""
+    digests = [digest for digest in digests if len(digest['pesos'])]
+    if not digests:
+        return digest_vazio()
+    return comprimir(np.concatenate([digest['medias'] for digest in digests]),
+                     np.concatenate([digest['pesos'] for digest in digests]),
+                     min(digest['minimo'] for digest in digests),
+                     max(digest['maximo'] for digest in digests), compressao)
+
+def quantis(digest, probabilidades=QUANTIS_ENVELOPE):
+    """
+    Quantis estimados: interpolação linear entre os centros dos centroides
+    (na posição do peso acumulado), com o mínimo e o máximo nas pontas
+    """
+    total = digest['pesos'].sum()
+    if total == 0:
+        return np.full(len(probabilidades), np.nan)
+    centros = np.cumsum(digest['pesos']) - digest['pesos'] / 2
+    return np.interp(np.asarray(probabilidades) * total, np.r_[0.0, centros, total],
+                     np.r_[digest['minimo'], digest['medias'], digest['maximo']])
+
+def digests_da_grade(grade, series=SERIES, compressao=COMPRESSAO_PADRAO):
+    """Sketch do percentual diário de cada série e hora do dia: {(pct_*, hora): digest}"""
+    digests = {}
+    for chave, pct in modulacao_diaria(grade, series=series).items():
+        for hora in range(N_HORAS):
+            digests[(chave, hora)] = digest_de_valores(pct[:, HORA_INT == hora], compressao)
+    return digests
+
+def atualizar_digests(dir_completos, series=SERIES, compressao=COMPRESSAO_PADRAO):
+    """
+    Sketches de cada partição da série completa, {'AAAA-MM': {(pct_*, hora): digest}}.
+    Reaproveita os gravados das partições com o mesmo checksum, resume só as
+    novas ou alteradas e grava o resultado
+    """
+    def resumir(particao):
+        ano, mes = (int(parte) for parte in particao.split('-'))
+        df = ler_particao(dir_completos, ano, mes, list(series))
+        return digests_da_grade(criar_grade(df, list(series)), series, compressao)
+
+    colecao, novas = atualizar_por_particao(
+        os.path.join(os.path.dirname(dir_completos), ARQUIVO_QUANTIS), 'quantis', VERSAO_QUANTIS,
+        {'compressao': compressao}, checksums_particoes(dir_completos), resumir, ler_digests, tabelar_digests)
+    print(f"Sketches de quantis: {novas} partições resumidas, {len(colecao) - novas} reaproveitadas")
+    return colecao
+
+def tabelar_digests(colecao):
+    """Tabela dos sketches a gravar: uma linha por centroide"""
+    linhas = {'particao': [], 'chave': [], 'hora': [], 'media': [], 'peso': [], 'minimo': [], 'maximo': []}
+    for particao, digests in colecao.items():
+        for (chave, hora), digest in digests.items():
+            n = len(digest['medias'])
+            linhas['particao'] += [particao] * n
+            linhas['chave'] += [chave] * n
+            linhas['hora'] += [hora] * n
+            linhas['media'].append(digest['medias'])
+            linhas['peso'].append(digest['pesos'])
+            linhas['minimo'].append(np.full(n, digest['minimo']))
+            linhas['maximo'].append(np.full(n, digest['maximo']))
+    for coluna in ('media', 'peso', 'minimo', 'maximo'):
+        linhas[coluna] = np.concatenate(linhas[coluna]) if linhas[coluna] else np.empty(0)
+
+    return pa.table({
+        'particao': pa.array(linhas['particao'], pa.string()).dictionary_encode(),
+        'chave': pa.array(linhas['chave'], pa.string()).dictionary_encode(),
+        'hora': pa.array(linhas['hora'], pa.int8()),
+        'media': pa.array(linhas['media'], pa.float64()),
+        'peso': pa.array(linhas['peso'], pa.float64()),
+        'minimo': pa.array(linhas['minimo'], pa.float64()),
+        'maximo': pa.array(linhas['maximo'], pa.float64())
+    })
+
+def ler_digests(tabela, particoes):
+    """Sketches gravados das `particoes`, {'AAAA-MM': {(pct_*, hora): digest}}"""
+    # Os centroides de cada sketch foram gravados em sequência: basta achar as fronteiras
+    codigos, nomes = {}, {}
+    for coluna in ('particao', 'chave'):
+        dicionario = tabela[coluna].combine_chunks()
+        if not pa.types.is_dictionary(dicionario.type):
+            dicionario = dicionario.dictionary_encode()
+        codigos[coluna] = dicionario.indices.to_numpy(zero_copy_only=False)
+        nomes[coluna] = dicionario.dictionary.to_pylist()
+    hora = tabela['hora'].to_numpy()
+    mudou = (np.diff(codigos['particao']) != 0) | (np.diff(codigos['chave']) != 0) | (np.diff(hora) != 0)
+    inicios = np.flatnonzero(np.r_[True, mudou]) if len(hora) else np.empty(0, dtype=np.int64)
+    fins = np.r_[inicios[1:], len(hora)]
+    valores = {coluna: tabela[coluna].to_numpy() for coluna in ('media', 'peso', 'minimo', 'maximo')}
+
+    colecao = {particao: {} for particao in particoes}
+    for inicio, fim in zip(inicios, fins):
+        particao = nomes['particao'][codigos['particao'][inicio]]
+        chave = nomes['chave'][codigos['chave'][inicio]]
+        colecao.setdefault(particao, {})[(chave, int(hora[inicio]))] = {
+            'medias': valores['media'][inicio:fim], 'pesos': valores['peso'][inicio:fim],
+            'minimo': valores['minimo'][inicio], 'maximo': valores['maximo'][inicio]
+        }
+    return colecao
+
+def envelopes_mensais(*colecoes, probabilidades=QUANTIS_ENVELOPE, compressao=COMPRESSAO_PADRAO):
+    """
+    Envelope climatológico de cada mês do ano, série e hora: mescla os sketches
+    daquele mês em todos os anos (e em todas as coleções, p. ex. de vários
+    subsistemas). DataFrame com mes, hora_int, chave e uma coluna p10, p50, ...
+    por quantil
+    """
+    por_mes = {}
+    for colecao in colecoes:
+        for particao, digests in colecao.items():
+            mes = int(particao.split('-')[1])
+            for chave_digest, digest in digests.items():
+                por_mes.setdefault((mes,) + chave_digest, []).append(digest)
+
+    nomes = [f"p{round(100 * p):02d}" for p in probabilidades]
+    linhas = []
+    for (mes, chave, hora), digests in sorted(por_mes.items()):
+        digest = mesclar_digests(digests, compressao)
+        if len(digest['pesos']):
+            linhas.append([mes, hora, chave] + list(quantis(digest, probabilidades)))
+    return pd.DataFrame(linhas, columns=['mes', 'hora_int', 'chave'] + nomes)
@@ -0,0 +1,159 @@
+"""
+Agendador da renderização de gráficos
+Cada tarefa é uma função de módulo que desenha e salva as suas figuras a
+partir de arrays compactos (as fatias do mês, não a série inteira). Com um
+processo as tarefas rodam na hora, como antes; com mais, vão para um pool
+de processos com backend Agg (sem tela), no máximo duas por processo em
+andamento, e a saída de cada uma (as linhas "Salvo: ...") é impressa na
+ordem de agendamento. Os arquivos gerados são os mesmos nos dois modos.
+Com um registro, cada arquivo gerado guarda a impressão digital da tarefa
+que o gerou (função, versão do estilo e todos os argumentos: arrays do mês,
+limites de eixo, títulos); a tarefa só é executada de novo se a impressão
+mudar ou se algum dos seus arquivos não existir
+"""
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from armazenamento import gravar_json_atomico
+
+# Tarefas em andamento por processo do pool
+TAREFAS_POR_PROCESSO = 2
+
+# Versão do estilo dos gráficos: mudou o visual (cores, fontes, layout), incremente para redesenhar tudo
+VERSAO_ESTILO = 3
+
+# Registro das impressões digitais, no diretório de saída de cada script
+ARQUIVO_REGISTRO = '_graficos.json'
+
+def iniciar_processo():
+    """Inicialização de cada processo do pool: backend sem tela"""
+    matplotlib.use('Agg')
+
+def executar_tarefa(funcao, args):
+    """Executa uma tarefa no processo do pool e devolve o que ela imprimiu"""
+    saida = io.StringIO()
+    with redirect_stdout(saida):
+        funcao(*args)
+    return saida.getvalue()
+
+def atualizar_hash(h, valor):
+    """Acrescenta ao hash o conteúdo de um argumento (arrays, DataFrames, dicts, listas, escalares)"""
+    if isinstance(valor, np.ndarray):
+        h.update(f"ndarray {valor.dtype.str} {valor.shape}".encode('utf-8'))
+        if valor.dtype == object:
+            h.update(repr(valor.tolist()).encode('utf-8'))
+        else:
+            h.update(np.ascontiguousarray(valor).tobytes())
+    elif isinstance(valor, pd.DataFrame):
+        # O índice (rótulos das linhas) não entra: os gráficos usam só as colunas
+        h.update(f"DataFrame {list(valor.columns)!r}".encode('utf-8'))
+        for coluna in valor.columns:
+            atualizar_hash(h, valor[coluna].to_numpy())
+    elif isinstance(valor, pd.Series):
+        atualizar_hash(h, valor.to_numpy())
+    elif isinstance(valor, dict):
+        h.update(f"dict {len(valor)}".encode('utf-8'))
+        for chave, item in valor.items():
+            h.update(repr(chave).encode('utf-8'))
+            atualizar_hash(h, item)
+    elif isinstance(valor, (list, tuple)):
+        h.update(f"{type(valor).__name__} {len(valor)}".encode('utf-8'))
+        for item in valor:
+            atualizar_hash(h, item)
+    else:
+        h.update(repr(valor).encode('utf-8'))
+    h.update(b'\0')
+
+def impressao_digital(funcao, args):
+    """Hash sha256 da tarefa: função, versão do estilo, versão do matplotlib e argumentos"""
+    h = hashlib.sha256()
+    h.update(f"{funcao.__module__}.{funcao.__qualname__} {VERSAO_ESTILO} {matplotlib.__version__}".encode('utf-8'))
+    atualizar_hash(h, args)
+    return h.hexdigest()
+
+def ler_registro(arquivo):
+    """Impressões digitais gravadas ({arquivo gerado: impressão}); vazio se não houver"""
+    if arquivo is None or not os.path.exists(arquivo):
+        return {}
+    with open(arquivo, encoding='utf-8') as f:
+        return json.load(f)
+
+def criar_agendador(processos=1, registro=None, redesenhar=False):
+    """
+    Agendador serial (processos <= 1) ou com um pool de `processos` processos.
+    Com `registro` (arquivo JSON), as tarefas agendadas com `arquivos` só rodam
+    se a impressão digital mudou; `redesenhar` ignora as impressões gravadas
+    """
+    executor = None
+    if processos > 1:
+        executor = ProcessPoolExecutor(max_workers=processos, initializer=iniciar_processo)
+    return {
+        'executor': executor,
+        'pendentes': [],
+        'janela': TAREFAS_POR_PROCESSO * max(processos, 1),
+        'registro': registro,
+        'impressoes': {} if redesenhar else ler_registro(registro),
+        'renderizadas': 0,
+        'reaproveitadas': 0
+    }
+
+def agendar(agendador, funcao, *args, arquivos=()):
+    """
+    Agenda uma tarefa que gera `arquivos`. Se todos existem com a mesma
+    impressão digital registrada, ela é pulada. No modo serial roda na hora;
+    no pool, se a janela estiver cheia, espera a mais antiga (para as fatias
+    não se acumularem)
+    """
+    impressao = None
+    if agendador['registro'] is not None and arquivos:
+        impressao = impressao_digital(funcao, args)
+        if all(agendador['impressoes'].get(arquivo) == impressao and os.path.exists(arquivo)
+               for arquivo in arquivos):
+            agendador['reaproveitadas'] += 1
+            return
+
+    if agendador['executor'] is None:
+        funcao(*args)
+        registrar(agendador, arquivos, impressao)
+        return
+    pendentes = agendador['pendentes']
+    pendentes.append((agendador['executor'].submit(executar_tarefa, funcao, args), arquivos, impressao))
+    while len(pendentes) >= agendador['janela'] or (pendentes and pendentes[0][0].done()):
+        receber(agendador)
+
+def receber(agendador):
+    """Espera a tarefa pendente mais antiga, imprime a sua saída e registra os arquivos"""
+    futuro, arquivos, impressao = agendador['pendentes'].pop(0)
+    print(futuro.result(), end='')
+    registrar(agendador, arquivos, impressao)
+
+def registrar(agendador, arquivos, impressao):
+    """Anota a impressão digital dos arquivos de uma tarefa concluída"""
+    agendador['renderizadas'] += 1
+    if impressao is not None:
+        for arquivo in arquivos:
+            agendador['impressoes'][arquivo] = impressao
+
+def concluir(agendador):
+    """
+    Espera as tarefas pendentes (repassando a saída e os erros), encerra o pool
+    e grava o registro (também com as tarefas concluídas antes de um erro)
+    """
+    try:
+        while agendador['pendentes']:
+            receber(agendador)
+    finally:
+        if agendador['executor'] is not None:
+            agendador['executor'].shutdown(cancel_futures=True)
+        if agendador['registro'] is not None:
+            gravar_json_atomico(agendador['registro'], agendador['impressoes'])
+            print(f"Gráficos: {agendador['renderizadas']} tarefas renderizadas, "
+                  f"{agendador['reaproveitadas']} sem mudança nos dados (reaproveitadas)")
@@ -0,0 +1,100 @@
+"""
+Tabelas de modulação gravadas direto em SVG
+As tabelas por hora (mensais e da comparação entre anos) eram desenhadas
+com ax.table do matplotlib, célula a célula, e salvas como imagem. Aqui o
+SVG é escrito a partir da matriz de valores: as cores das células saem de
+uma classificação vetorial dos valores (as mesmas faixas de
+tabelas_modulacao.html: abaixo de 80%, entre 80% e 120% e acima de 120% da
+média diária) e o texto fica pesquisável e nítido em qualquer zoom
+"""
+from html import escape
+
+import numpy as np
+
+# Faixas de modulação (% da média diária) da coloração condicional
+LIMITE_BAIXO = 80
+LIMITE_ALTO = 120
+
+# Fundo, cor do texto e peso da fonte de cada classe de célula: sem dado, baixa, alta, intermediária
+ESTILOS_CELULA = {
+    'na': ('#f5f5f5', '#999999', 'normal'),
+    'low': ('#ffebee', '#c62828', 'bold'),
+    'high': ('#e8f5e9', '#2e7d32', 'bold'),
+    'mid': ('#fff9e6', '#555555', 'normal')
+}
+
+# Dimensões (pixels) das células e da fonte
+ALTURA_LINHA = 28
+LARGURA_ROTULO = 90
+LARGURA_VALOR = 150
+TAMANHO_FONTE = 13
+
+def classificar(valores):
+    """Classe de cada célula (matriz de strings de ESTILOS_CELULA) pelas faixas de modulação"""
+    with np.errstate(invalid='ignore'):
+        return np.select([np.isnan(valores), valores < LIMITE_BAIXO, valores > LIMITE_ALTO],
+                         ['na', 'low', 'high'], default='mid')
+
+def formatar(valores):
+    """Texto de cada célula: '12.3%' ou '-' sem dado"""
+    return np.where(np.isnan(valores), '-', np.char.mod('%.1f%%', np.nan_to_num(valores)))
+
+def celulas_svg(x, y, larguras, fundos, textos, cores_texto, pesos):
+    """Elementos <rect>/<text> de uma grade de células (todos os argumentos com a mesma forma)"""
+    modelo = ('<rect x="{0}" y="{1}" width="{2}" height="' + str(ALTURA_LINHA) + '" fill="{3}"/>'
+              '<text x="{4}" y="{5}" fill="{6}" font-weight="{7}">{8}</text>')
+    return [modelo.format(*celula) for celula in zip(
+        x.ravel(), y.ravel(), larguras.ravel(), fundos.ravel(), (x + larguras / 2).ravel(),
+        (y + ALTURA_LINHA / 2).ravel(), cores_texto.ravel(), pesos.ravel(), textos.ravel())]
+
+def gravar_tabela_svg(arquivo, cabecalho, rotulos, valores, cor_cabecalho, cor_rotulos=None):
+    """
+    Grava a tabela: `cabecalho` (título da coluna dos rótulos e de cada coluna
+    de valores) no fundo `cor_cabecalho`, uma linha por rótulo (a coluna dos
+    rótulos em `cor_rotulos`, se informada, ou em linhas alternadas) e as
+    células de `valores` (linhas × colunas, % da média diária, NaN sem dado)
+    coloridas pela faixa de modulação
+    """
+    valores = np.asarray(valores, dtype=np.float64).reshape(len(rotulos), len(cabecalho) - 1)
+    n_linhas, n_colunas = valores.shape
+    largura = LARGURA_ROTULO + n_colunas * LARGURA_VALOR
+    altura = (n_linhas + 1) * ALTURA_LINHA
+
+    # Cabeçalho
+    x_cabecalho = np.r_[0, LARGURA_ROTULO + LARGURA_VALOR * np.arange(n_colunas)]
+    larguras_cabecalho = np.r_[LARGURA_ROTULO, np.full(n_colunas, LARGURA_VALOR)]
+    n = n_colunas + 1
+    elementos = celulas_svg(x_cabecalho, np.zeros(n, dtype=np.int64), larguras_cabecalho, np.full(n, cor_cabecalho),
+                            np.array([escape(str(texto)) for texto in cabecalho]), np.full(n, 'white'),
+                            np.full(n, 'bold'))
+
+    # Coluna dos rótulos
+    y_linhas = ALTURA_LINHA * np.arange(1, n_linhas + 1)
+    rotulos = np.array([escape(str(rotulo)) for rotulo in rotulos], dtype=object)
+    if cor_rotulos is None:
+        fundos = np.where(np.arange(1, n_linhas + 1) % 2 == 0, '#f0f0f0', 'white')
+        cores_texto, pesos = np.full(n_linhas, '#333333'), np.full(n_linhas, 'bold')
+    else:
+        fundos, cores_texto, pesos = (np.full(n_linhas, cor_rotulos), np.full(n_linhas, 'white'),
+                                      np.full(n_linhas, 'bold'))
+    elementos += celulas_svg(np.zeros(n_linhas, dtype=np.int64), y_linhas, np.full(n_linhas, LARGURA_ROTULO),
+                             fundos, rotulos, cores_texto, pesos)
+
+    # Valores, coloridos pela classe
+    classes = classificar(valores)
+    estilos = {parte: np.select([classes == classe for classe in ESTILOS_CELULA],
+                                [estilo[i] for estilo in ESTILOS_CELULA.values()], default='')
+               for i, parte in enumerate(('fundo', 'texto', 'peso'))}
+    x_valores, y_valores = np.meshgrid(x_cabecalho[1:], y_linhas)
+    elementos += celulas_svg(x_valores, y_valores, np.full(valores.shape, LARGURA_VALOR), estilos['fundo'],
+                             formatar(valores), estilos['texto'], estilos['peso'])
+
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura}" height="{altura}" '
+                f'viewBox="0 0 {largura} {altura}" font-family="DejaVu Sans, Arial, sans-serif" '
+                f'font-size="{TAMANHO_FONTE}" text-anchor="middle" dominant-baseline="central">\n')
+        f.write('\n'.join(elementos))
+        # Bordas: linhas horizontais e verticais da grade
+        bordas = [f'M0 {y}H{largura}' for y in range(0, altura + 1, ALTURA_LINHA)]
+        bordas += [f'M{x} 0V{altura}' for x in np.r_[x_cabecalho, largura]]
+        f.write(f'\n<path d="{" ".join(bordas)}" stroke="#cccccc" stroke-width="1" fill="none"/>\n</svg>\n')
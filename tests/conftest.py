@@ -0,0 +1,52 @@
+"""
+Dados compartilhados pelos testes: uma réplica SQLite pequena gerada por
+gerar_dados_sinteticos.py e os resultados da análise principal sobre ela
+"""
+import os
+import sys
+from unittest import mock
+
+import matplotlib
+import pytest
+
+matplotlib.use('Agg')
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import comparacao_eolica_ne  # noqa: E402
+from fontes_dados import DIR_RESULTADOS, criar_backend  # noqa: E402
+from gerar_dados_sinteticos import gerar  # noqa: E402
+
+# Período curto, poucas usinas e mais lacunas e outliers que o padrão, para exercitar o tratamento
+PERIODO_SINTETICO = ('2023-11-01', '2024-03-01')
+SUBSISTEMAS_SINTETICOS = ['NE', 'S']
+
+@pytest.fixture(scope='session')
+def banco_sintetico(tmp_path_factory):
+    """Backend SQLite com a réplica sintética"""
+    destino = str(tmp_path_factory.mktemp('dados_locais'))
+    gerar(destino, *PERIODO_SINTETICO, SUBSISTEMAS_SINTETICOS, n_usinas=4, semente=7,
+          prob_restricao=0.15, prob_lacuna=0.05, prob_outlier=0.005)
+    return criar_backend('sqlite', destino)
+
+def executar_analise(backend, diretorio, *argumentos):
+    """Roda comparacao_eolica_ne.py sobre a réplica, com `diretorio` como diretório de trabalho"""
+    anterior = os.getcwd()
+    os.chdir(diretorio)
+    try:
+        with mock.patch.object(sys, 'argv', ['comparacao_eolica_ne.py', '--backend', 'sqlite',
+                                             '--dir-sqlite', backend['dir_sqlite'], *argumentos]):
+            comparacao_eolica_ne.main()
+    finally:
+        os.chdir(anterior)
+    return os.path.join(diretorio, DIR_RESULTADOS)
+
+@pytest.fixture(scope='session')
+def analise_principal(banco_sintetico, tmp_path_factory):
+    """Diretório de resultados da análise principal do NE (opções padrão)"""
+    return executar_analise(banco_sintetico, str(tmp_path_factory.mktemp('analise')))
+
+@pytest.fixture(scope='session')
+def dir_completos(analise_principal):
+    """Dataset da série completa gravado pela análise principal"""
+    return os.path.join(analise_principal, 'dados', 'completos')
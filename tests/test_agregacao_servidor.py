@@ -0,0 +1,42 @@
+"""Modo --agregacao-servidor contra a modulação calculada sobre a série completa gravada"""
+import os
+
+import pandas as pd
+import pytest
+
+from agregacao_servidor import modulacao_do_servidor
+from armazenamento import caminho_dataset, ler_dataset
+from conftest import executar_analise
+from fontes_dados import consultar_recorte, criar_recorte, diretorio_saida, listar_grupos
+from modulacao import SERIES, calcular_modulacao, series_com_previsao
+from outliers import LIMIAR_OUTLIER
+
+@pytest.fixture(scope='module')
+def analise_sul(banco_sintetico, tmp_path_factory):
+    """Diretório de trabalho da análise do Sul e dos seus estados"""
+    diretorio = str(tmp_path_factory.mktemp('analise_sul'))
+    executar_analise(banco_sintetico, diretorio, '--subsistemas', 'S', '--agrupamento', 'estado')
+    return diretorio
+
+def test_replica_tem_outliers_de_referencia(banco_sintetico):
+    restricao = consultar_recorte(banco_sintetico, criar_recorte())['restricao_eolica']
+    assert (restricao['geracao_referencia_total'] < LIMIAR_OUTLIER).any()
+
+def test_modulacao_do_servidor_igual_a_local(banco_sintetico, analise_principal):
+    completos = ler_dataset(caminho_dataset('completos', f"{analise_principal}/dados"), colunas=list(SERIES))
+    local = calcular_modulacao(completos)
+    servidor = modulacao_do_servidor(banco_sintetico, criar_recorte())
+    assert len(local) > 0
+    pd.testing.assert_frame_equal(servidor, local)
+
+def test_modulacao_do_servidor_igual_a_local_em_outros_recortes(banco_sintetico, analise_sul):
+    recortes = [criar_recorte('S')] + [criar_recorte('S', 'estado', grupo)
+                                       for grupo in listar_grupos(banco_sintetico, 'S', 'estado')]
+    for recorte in recortes:
+        series = series_com_previsao(recorte['coluna_previsao'])
+        dir_completos = caminho_dataset('completos', os.path.join(analise_sul, diretorio_saida(recorte), 'dados'))
+        local = calcular_modulacao(ler_dataset(dir_completos, colunas=list(series)), series=series)
+        servidor = modulacao_do_servidor(banco_sintetico, recorte)
+        assert len(local) > 0
+        assert ('pct_prev' in servidor) == (recorte['coluna_previsao'] is not None)
+        pd.testing.assert_frame_equal(servidor, local)
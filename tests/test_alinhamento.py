@@ -0,0 +1,38 @@
+"""Alinhamento de fontes em resoluções diferentes"""
+import numpy as np
+import pandas as pd
+
+from alinhamento import alinhar_fontes, juntar_asof
+
+def fonte(inicio, periodos, freq, coluna, semente):
+    """DataFrame de uma fonte com alguns instantes removidos"""
+    instantes = pd.date_range(inicio, periods=periodos, freq=freq)
+    gerador = np.random.default_rng(semente)
+    df = pd.DataFrame({'timestamp': instantes, coluna: gerador.normal(100, 10, periodos).astype(np.float32)})
+    return df.drop(index=gerador.choice(periodos, periodos // 10, replace=False)).reset_index(drop=True)
+
+def test_fontes_semi_horarias_igual_ao_merge():
+    a = fonte('2024-01-01', 500, '30min', 'a', 1)
+    b = fonte('2024-01-03 12:00', 500, '30min', 'b', 2)
+    esperado = pd.merge(a, b, on='timestamp', how='outer', sort=True)
+    pd.testing.assert_frame_equal(alinhar_fontes([a, b]), esperado, check_dtype=False)
+
+def test_fonte_mais_fina_vira_media_do_intervalo():
+    a = fonte('2024-01-01', 100, '30min', 'a', 1)
+    b = fonte('2024-01-01', 300, '10min', 'b', 2)
+    alinhado = alinhar_fontes([a, b]).set_index('timestamp')
+    esperado = b.set_index('timestamp')['b'].resample('30min').mean().dropna()
+    np.testing.assert_allclose(alinhado['b'].dropna(), esperado, rtol=1e-6)
+
+def test_fonte_horaria_repetida_nas_semi_horas():
+    a = fonte('2024-01-01', 100, '30min', 'a', 1)
+    b = pd.DataFrame({'timestamp': pd.date_range('2024-01-01', periods=50, freq='h'),
+                      'b': np.arange(50, dtype=np.float32)})
+    alinhado = alinhar_fontes([a, b]).set_index('timestamp')['b']
+    assert (alinhado[alinhado.index.minute == 30].to_numpy() == alinhado[alinhado.index.minute == 0].to_numpy()).all()
+
+def test_juntar_asof_com_tolerancia():
+    origem = np.array([0, 1800, 5400])
+    alvo = np.array([0, 900, 1800, 3600, 7200])
+    np.testing.assert_array_equal(juntar_asof(alvo, origem), [0, -1, 1, -1, -1])
+    np.testing.assert_array_equal(juntar_asof(alvo, origem, tolerancia=1800), [0, 0, 1, 1, 2])
@@ -0,0 +1,85 @@
+"""Armazenamento particionado, manifesto e decisões de cache"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from armazenamento import (ARQUIVO_MANIFESTO, atualizar_manifesto, atualizar_por_particao, avaliar_cache,
+                           caminho_particao, checksums_particoes, gravar_particoes, ler_dataset, listar_particoes,
+                           registrar_progresso, remover_particoes)
+
+def serie(inicio, periodos, valor=1.0):
+    return pd.DataFrame({'timestamp': pd.date_range(inicio, periods=periodos, freq='30min'),
+                         'valor': np.full(periodos, valor, dtype=np.float32)})
+
+def test_gravar_particoes_mescla_a_versao_nova(tmp_path):
+    diretorio = str(tmp_path / 'dataset')
+    gravar_particoes(serie('2024-01-30', 200), diretorio)
+    gravar_particoes(serie('2024-02-02', 10, valor=2.0), diretorio)
+    df = ler_dataset(diretorio)
+    assert len(df) == 200
+    assert df['timestamp'].is_monotonic_increasing
+    assert df['valor'].value_counts().to_dict() == {1.0: 190, 2.0: 10}
+
+def test_so_as_particoes_alteradas_sao_regravadas(tmp_path):
+    diretorio = str(tmp_path / 'dataset')
+    df = serie('2024-01-01', 24 * 48 * 3)
+    gravar_particoes(df, diretorio, mesclar=False)
+    arquivos = {particao: os.stat(caminho_particao(diretorio, *particao)) for particao in listar_particoes(diretorio)}
+
+    df.loc[df['timestamp'] == pd.Timestamp('2024-02-10'), 'valor'] = 5.0
+    gravar_particoes(df, diretorio, mesclar=False)
+    mantidos = {particao for particao, estado in arquivos.items()
+                if os.stat(caminho_particao(diretorio, *particao)).st_ino == estado.st_ino}
+    assert mantidos == {(2024, 1), (2024, 3)}
+
+    assert remover_particoes(diretorio, {(2024, 2), (2024, 3)}) == [(2024, 1)]
+    assert listar_particoes(diretorio) == [(2024, 2), (2024, 3)]
+    assert not os.path.exists(f"{diretorio}/ano=2024/mes=01")
+
+def test_avaliar_cache(tmp_path):
+    diretorio = str(tmp_path / 'fonte')
+    assert avaliar_cache(diretorio, 'h1', 24)[0] == 'reconstruir'
+
+    gravar_particoes(serie('2024-01-30', 200), diretorio)
+    atualizar_manifesto(diretorio, 'h1')
+    assert avaliar_cache(diretorio, 'h1', 24)[0] == 'reutilizar'
+    assert avaliar_cache(diretorio, 'h1', -1)[0] == 'incremental'
+    assert avaliar_cache(diretorio, 'h2', 24) == ('reconstruir', 'consulta de origem alterada')
+
+    gravar_particoes(serie('2024-02-01', 1, valor=9.0), diretorio)
+    assert avaliar_cache(diretorio, 'h1', 24) == ('reconstruir', 'checksum divergente na partição 2024-02')
+
+    registrar_progresso(diretorio, 'h1', 'completa', pd.Timestamp('2024-01-30'), pd.Timestamp('2024-02-01'), 1)
+    assert avaliar_cache(diretorio, 'h1', 24)[0] == 'retomar'
+
+def test_atualizar_por_particao_refaz_so_as_alteradas(tmp_path):
+    diretorio = str(tmp_path / 'dataset')
+    gravar_particoes(serie('2024-01-01', 24 * 48 * 3), diretorio)
+    atualizar_manifesto(diretorio, 'h')
+    arquivo = str(tmp_path / 'resumos.parquet')
+    resumidas = []
+
+    def resumir(particao):
+        resumidas.append(particao)
+        return len(particao)
+
+    def atualizar():
+        return atualizar_por_particao(
+            arquivo, 'teste', 1, {'parametro': 'a'}, checksums_particoes(diretorio), resumir,
+            lambda tabela, particoes: dict(zip(tabela['particao'].to_pylist(), tabela['resumo'].to_pylist())),
+            lambda resumos: pa.table({'particao': list(resumos), 'resumo': list(resumos.values())}))
+
+    resumos, refeitas = atualizar()
+    assert (list(resumos), refeitas) == (['2024-01', '2024-02', '2024-03'], 3)
+    assert atualizar()[1] == 0
+
+    gravar_particoes(serie('2024-02-10', 1, valor=5.0), diretorio)
+    atualizar_manifesto(diretorio, 'h')
+    resumidas.clear()
+    assert atualizar()[1] == 1
+    assert resumidas == ['2024-02']
+    with open(f"{diretorio}/{ARQUIVO_MANIFESTO}", encoding='utf-8') as f:
+        assert set(json.load(f)['particoes']) == {'2024-01', '2024-02', '2024-03'}
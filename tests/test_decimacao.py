@@ -0,0 +1,38 @@
+"""Decimação das séries para os gráficos"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from decimacao import decimar
+
+def serie(n=50000, semente=2):
+    gerador = np.random.default_rng(semente)
+    x = pd.date_range('2021-01-01', periods=n, freq='30min').to_numpy()
+    y = np.cumsum(gerador.normal(0, 1, n))
+    y[20000:20500] = np.nan
+    return x, y
+
+def test_min_max_preserva_os_extremos_de_cada_coluna():
+    x, y = serie()
+    xd, yd = decimar(x, y, 500, 'min_max')
+    assert len(yd) <= 2 * 500 + 1
+    assert np.nanmax(yd) == np.nanmax(y) and np.nanmin(yd) == np.nanmin(y)
+    assert np.isnan(yd).any()
+    assert (np.diff(xd.astype(np.int64)) > 0).all()
+
+def test_lttb_mantem_as_pontas_e_um_ponto_por_coluna():
+    x, y = serie()
+    xd, yd = decimar(x, y, 500, 'lttb')
+    assert xd[0] == x[0] and xd[-1] == x[-1]
+    assert len(yd[~np.isnan(yd)]) <= 500 + 2
+    assert np.isnan(yd).any()
+
+def test_serie_curta_volta_inteira():
+    x, y = serie(600)
+    xd, yd = decimar(x, y, 500)
+    assert xd is x and yd is y
+
+def test_metodo_desconhecido():
+    x, y = serie()
+    with pytest.raises(ValueError):
+        decimar(x, y, 500, 'media')
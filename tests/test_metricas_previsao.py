@@ -0,0 +1,35 @@
+"""Acumuladores das métricas de previsão mesclados por partição contra o cálculo direto"""
+import numpy as np
+import pandas as pd
+
+from metricas_previsao import acumular_particao, mesclar, metricas
+
+def dados_de_previsao(n=3000, semente=11):
+    gerador = np.random.default_rng(semente)
+    previsao = gerador.normal(5000, 800, n)
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='30min'),
+        'geracao_total': previsao + gerador.normal(-100, 300, n),
+        'geracao_referencia_total': previsao + gerador.normal(200, 500, n),
+        'NE_UEE': previsao
+    })
+    df.loc[gerador.choice(n, 100, replace=False), 'geracao_total'] = np.nan
+    df.loc[gerador.choice(n, 100, replace=False), 'NE_UEE'] = np.nan
+    return df
+
+def test_mescla_de_chan_igual_ao_calculo_direto():
+    df = dados_de_previsao()
+    partes = [df.iloc[inicio:inicio + 450] for inicio in range(0, len(df), 450)]
+    celulas = pd.concat([acumular_particao(parte, 'NE_UEE') for parte in partes], ignore_index=True)
+    resultado = metricas(mesclar(celulas, ['par'])).set_index('par')
+
+    for par, coluna in {'real': 'geracao_total', 'referencia': 'geracao_referencia_total'}.items():
+        erro = (df[coluna] - df['NE_UEE']).dropna()
+        observado = df.loc[erro.index, coluna]
+        linha = resultado.loc[par]
+        assert linha['n'] == len(erro)
+        np.testing.assert_allclose(linha['vies'], erro.mean(), rtol=1e-9)
+        np.testing.assert_allclose(linha['desvio_erro'], erro.std(ddof=1), rtol=1e-9)
+        np.testing.assert_allclose(linha['mae'], erro.abs().mean(), rtol=1e-9)
+        np.testing.assert_allclose(linha['rmse'], np.sqrt((erro ** 2).mean()), rtol=1e-9)
+        np.testing.assert_allclose(linha['nmae_pct'], 100 * erro.abs().sum() / observado.sum(), rtol=1e-9)
@@ -0,0 +1,41 @@
+"""Motor de modulação contra a fórmula com groupby e contra os caminhos particionado e por prefixos"""
+import pandas as pd
+import pytest
+
+from armazenamento import ler_dataset
+from indice_prefixos import modulacao_mensal, obter_indice_prefixos
+from modulacao import SERIES, calcular_modulacao
+from processamento_particionado import modulacao_por_particao
+
+def modulacao_groupby(df, nivel='mes', series=SERIES):
+    """
+    Fórmula anterior ao motor: média de cada dia por groupby, merge de volta,
+    percentual de cada linha e média por hora ([h, h + 1), como HORA_INT)
+    """
+    df = df.assign(ano=df['timestamp'].dt.year, mes=df['timestamp'].dt.month,
+                   data=df['timestamp'].dt.date, hora_int=df['timestamp'].dt.hour)
+    medias = df.groupby('data')[list(series)].mean().add_prefix('media_').reset_index()
+    df = df.merge(medias, on='data', how='left')
+    for coluna, chave in series.items():
+        df[chave] = df[coluna] / df[f'media_{coluna}'] * 100
+    chaves = ['ano', 'mes', 'hora_int'] if nivel == 'mes' else ['ano', 'hora_int']
+    return df.groupby(chaves)[list(series.values())].mean().reset_index()
+
+@pytest.fixture(scope='module')
+def completos(dir_completos):
+    return ler_dataset(dir_completos, colunas=list(SERIES))
+
+@pytest.mark.parametrize('nivel', ['mes', 'ano'])
+def test_motor_igual_ao_groupby(completos, nivel):
+    motor = calcular_modulacao(completos, nivel)
+    assert len(motor) > 0
+    pd.testing.assert_frame_equal(motor, modulacao_groupby(completos, nivel), check_dtype=False, rtol=1e-5)
+
+def test_particionado_igual_ao_motor(completos, dir_completos):
+    pd.testing.assert_frame_equal(modulacao_por_particao(dir_completos), calcular_modulacao(completos),
+                                  check_dtype=False)
+
+def test_indice_de_prefixos_igual_ao_motor(completos, dir_completos):
+    indice = obter_indice_prefixos(dir_completos)
+    pd.testing.assert_frame_equal(modulacao_mensal(indice), calcular_modulacao(completos),
+                                  check_dtype=False, rtol=1e-6)
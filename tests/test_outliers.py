@@ -0,0 +1,71 @@
+"""Detectores de outliers e camada esparsa de correções"""
+import numpy as np
+import pandas as pd
+
+from outliers import (aplicar_camada, calcular_camada, configurar_detectores, detectar, detectar_hampel,
+                      detectar_valor_travado, mediana_por_blocos)
+from processamento_particionado import detectar_em_partes, tratar_outliers_em_partes
+
+def serie_com_defeitos(n=2000, semente=3):
+    """Série diária suave com lacunas, picos, quedas e um trecho travado"""
+    gerador = np.random.default_rng(semente)
+    valores = (5000 + 500 * np.sin(np.arange(n) * 2 * np.pi / 48)
+               + gerador.normal(0, 50, n)).astype(np.float32)
+    valores[gerador.choice(n, 40, replace=False)] = np.nan
+    valores[gerador.choice(n, 10, replace=False)] = 200
+    valores[gerador.choice(n, 10, replace=False)] = 20000
+    valores[700:710] = valores[699]
+    return valores
+
+def test_hampel_marca_picos_e_ignora_a_serie_suave():
+    valores = serie_com_defeitos()
+    marcados = detectar_hampel(valores)
+    assert marcados[valores == 20000].all()
+    assert marcados[valores == 200].all()
+    assert marcados.sum() < 40
+
+def test_mediana_por_blocos_igual_ao_groupby():
+    valores = serie_com_defeitos(1000)
+    blocos = np.arange(len(valores)) // 48
+    np.testing.assert_allclose(mediana_por_blocos(valores, 48),
+                               pd.Series(valores).groupby(blocos).transform('median'), rtol=1e-6)
+
+def test_valor_travado():
+    valores = serie_com_defeitos()
+    marcados = detectar_valor_travado(valores)
+    assert marcados[699:710].all()
+    assert marcados.sum() == 11
+
+def test_camada_interpola_como_pandas():
+    valores = serie_com_defeitos()
+    camada = calcular_camada(valores, configurar_detectores(['limiar']))
+    esperado = pd.Series(np.where(valores < 1000, np.nan, valores)).interpolate(limit_direction='both')
+    np.testing.assert_allclose(aplicar_camada(valores, camada), esperado, rtol=1e-6)
+
+def test_camada_incremental_igual_a_completa():
+    valores = serie_com_defeitos()
+    detectores = configurar_detectores(['limiar', 'hampel', 'travado'])
+    completa = calcular_camada(valores, detectores)
+    for corte in (500, 705, 1500):
+        anterior = calcular_camada(valores[:corte], detectores)
+        incremental = calcular_camada(valores, detectores, anterior, inicio=corte)
+        for campo in ('posicoes', 'codigos', 'original', 'corrigido'):
+            np.testing.assert_array_equal(incremental[campo], completa[campo])
+
+def partes_da_serie(valores, tamanhos):
+    """Série dividida em partes (ano, mes, DataFrame) dos tamanhos dados"""
+    cortes = np.cumsum([0] + tamanhos)
+    return [(2024, numero, pd.DataFrame({'geracao_referencia_total': valores[inicio:fim].copy()}))
+            for numero, (inicio, fim) in enumerate(zip(cortes[:-1], cortes[1:]), start=1)]
+
+def test_deteccao_e_tratamento_em_partes_iguais_aos_da_serie_inteira():
+    valores = serie_com_defeitos()
+    detectores = configurar_detectores(['limiar', 'hampel', 'travado'])
+    marcados = detectar(valores, detectores) > 0
+    corrigidos = aplicar_camada(valores, calcular_camada(valores, detectores))
+    for tamanhos in ([700, 700, 600], [30] * 66 + [20], [10, 3, 1987]):
+        em_partes = detectar_em_partes(partes_da_serie(valores, tamanhos), detectores)
+        np.testing.assert_array_equal(np.concatenate([parte[3] for parte in em_partes]), marcados)
+        tratadas = tratar_outliers_em_partes(partes_da_serie(valores, tamanhos), detectores)
+        np.testing.assert_allclose(np.concatenate([df['geracao_referencia_total'] for _, _, df in tratadas]),
+                                   corrigidos, rtol=1e-6)
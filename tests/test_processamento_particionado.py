@@ -0,0 +1,28 @@
+"""Análise fora da memória (mês a mês) contra a análise com a série inteira"""
+import os
+
+import pandas as pd
+
+from armazenamento import ler_dataset
+from conftest import executar_analise
+
+def comparar_resultados(resultados, esperados):
+    """Série completa gravada e médias diárias iguais nos dois diretórios de resultados"""
+    pd.testing.assert_frame_equal(ler_dataset(os.path.join(resultados, 'dados', 'completos')),
+                                  ler_dataset(os.path.join(esperados, 'dados', 'completos')))
+    diarios = [pd.read_csv(os.path.join(diretorio, 'dados_diarios.csv'))
+               for diretorio in (resultados, esperados)]
+    pd.testing.assert_frame_equal(*diarios)
+
+def test_fora_da_memoria_igual_a_analise_completa(banco_sintetico, analise_principal, tmp_path):
+    resultados = executar_analise(banco_sintetico, str(tmp_path), '--fora-da-memoria')
+    comparar_resultados(resultados, analise_principal)
+
+def test_fora_da_memoria_com_todos_os_detectores(banco_sintetico, tmp_path):
+    detectores = ('--detectores', 'limiar', 'hampel', 'travado')
+    (tmp_path / 'completa').mkdir()
+    (tmp_path / 'particionada').mkdir()
+    completa = executar_analise(banco_sintetico, str(tmp_path / 'completa'), *detectores)
+    particionada = executar_analise(banco_sintetico, str(tmp_path / 'particionada'), '--fora-da-memoria',
+                                    *detectores)
+    comparar_resultados(particionada, completa)
@@ -0,0 +1,33 @@
+"""Sketch de quantis (t-digest) contra os quantis exatos"""
+import numpy as np
+
+from quantis import digest_de_valores, mesclar_digests, quantis
+
+PROBABILIDADES = (0.01, 0.1, 0.5, 0.9, 0.99)
+
+def valores_de_teste(n=20000, semente=5):
+    gerador = np.random.default_rng(semente)
+    return np.r_[gerador.normal(100, 15, n // 2), gerador.lognormal(4.5, 0.5, n // 2)]
+
+def erro_de_posto(valores, estimados, probabilidades):
+    """Distância, em probabilidade, entre o posto de cada quantil estimado e o pedido"""
+    ordenados = np.sort(valores)
+    return np.abs(np.searchsorted(ordenados, estimados) / len(ordenados) - np.asarray(probabilidades))
+
+def test_quantis_proximos_dos_exatos():
+    valores = valores_de_teste()
+    digest = digest_de_valores(valores)
+    assert len(digest['pesos']) < 200
+    assert erro_de_posto(valores, quantis(digest, PROBABILIDADES), PROBABILIDADES).max() < 0.005
+
+def test_mescla_de_partes_equivale_ao_todo():
+    valores = valores_de_teste()
+    mesclado = mesclar_digests([digest_de_valores(parte) for parte in np.array_split(valores, 12)])
+    assert mesclado['pesos'].sum() == len(valores)
+    assert (mesclado['minimo'], mesclado['maximo']) == (valores.min(), valores.max())
+    assert erro_de_posto(valores, quantis(mesclado, PROBABILIDADES), PROBABILIDADES).max() < 0.005
+
+def test_ignora_nan_e_digest_vazio():
+    assert np.isnan(quantis(digest_de_valores([np.nan, np.nan]))).all()
+    digest = digest_de_valores([1.0, np.nan, 3.0])
+    assert digest['pesos'].sum() == 2
@@ -0,0 +1,27 @@
+"""
+Funções auxiliares compartilhadas pelos scripts da análise
+"""
+import sys
+
+def memoria_pico_mb():
+    """
+    Pico de memória residente (RSS) do processo em MB, ou None onde o
+    módulo resource não existe (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em bytes no macOS e em KB no Linux
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+def relatar_memoria(etapa):
+    """Imprime o pico de RSS atingido até a etapa"""
+    pico = memoria_pico_mb()
+    if pico is not None:
+        print(f"  Memória (pico RSS) após {etapa}: {pico:.0f} MB")
+
+def memoria_dataframe_mb(df):
+    """Memória ocupada pelo DataFrame (inclusive objetos Python) em MB"""
+    return df.memory_usage(deep=True).sum() / 1024 / 1024